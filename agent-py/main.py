@@ -1,13 +1,36 @@
 """CLI interface for Neuronpedia Attribution Graph Cleanup Automation Agent"""
 
 import click
+import csv
+import os
+import time
 from pathlib import Path
-import json
+from neuronpedia_agent.analysis.centrality import MODES as CENTRALITY_MODES
 from neuronpedia_agent.analysis.graph_analyzer import GraphAnalyzer
-from neuronpedia_agent.analysis.node_selector import NodeSelector
-from neuronpedia_agent.analysis.grouping_engine import GroupingEngine
+from neuronpedia_agent.analysis.pruning import (
+    DEFAULT_EDGE_THRESHOLDS, DEFAULT_NODE_THRESHOLDS, prune_graph, threshold_sweep
+)
+from neuronpedia_agent.benchmark import (
+    DEFAULT_GROUPINGS, DEFAULT_SIZES, DEFAULT_STRATEGIES, parse_sizes, run_benchmarks, synthetic_graph, write_graph_json
+)
+from neuronpedia_agent.embeddings import DEFAULT_EMBEDDING_MODEL, DEFAULT_VECTOR_CACHE_PATH
+from neuronpedia_agent.index import (
+    DEFAULT_INDEX_PATH, DEFAULT_SIMILARITY_PATH, CooccurrenceMatrix, FeatureIndex, SimilarityIndex, merge_shards
+)
+from neuronpedia_agent.index.cooccurrence import SCORES
 from neuronpedia_agent.labeling.auto_labeler import AutoLabeler
-from neuronpedia_agent.optimization.metrics import MetricsCalculator
+from neuronpedia_agent.labeling.label_cache import LabelCache
+from neuronpedia_agent.pipeline import (
+    CleanupOptions, autotune as run_autotune, build_output, centrality_settings, cleanup_graph, find_graph_files,
+    grouping_settings, label_cache_settings, labeling_settings, run_batch, selection_settings, write_json_atomic,
+    write_output
+)
+from neuronpedia_agent.pipeline.autotune import GROUPINGS, STRATEGIES
+from neuronpedia_agent.pipeline.batch import MANIFEST_FILE
+from neuronpedia_agent.storage import (
+    COMPRESSIONS, ORIGINAL_MODES, convert_graph, get_graph, write_cleaned_graph
+)
+from neuronpedia_agent.utils import load_config, profiling
 
 
 @click.group()
@@ -20,7 +43,7 @@ def cli():
 @click.option('--prompt', required=True, help='Input prompt for graph generation')
 @click.option('--model', default='gemma-2-2b', help='Model to use')
 @click.option('--output', default='cleaned_graph.json', help='Output file path')
-@click.option('--strategy', default='pathway', type=click.Choice(['pathway', 'importance', 'balanced']))
+@click.option('--strategy', default='pathway', type=click.Choice(['pathway', 'importance', 'balanced', 'optimize']))
 @click.option('--max-nodes', default=30, type=int, help='Maximum nodes to pin')
 @click.option('--grouping', default='functional', type=click.Choice(['functional', 'semantic', 'layer', 'hybrid']))
 def cleanup(prompt, model, output, strategy, max_nodes, grouping):
@@ -40,73 +63,488 @@ def cleanup(prompt, model, output, strategy, max_nodes, grouping):
 
 
 @cli.command()
-@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON')
+@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON (plain, gzip or zstd)')
 @click.option('--output', default='cleaned_graph.json', help='Output file path')
 @click.option('--strategy', default='pathway')
 @click.option('--max-nodes', default=30, type=int)
 @click.option('--grouping', default='functional')
+@click.option('--importance', default=None, type=click.Choice(['influence', 'centrality']), help='Node importance for the importance/balanced strategies (default: config node_selection.importance)')
 @click.option('--api-key', envvar='ANTHROPIC_API_KEY', help='Anthropic API key for labeling')
-def cleanup_existing(graph_file, output, strategy, max_nodes, grouping, api_key):
+@click.option('--centrality', default=None, type=click.Choice(CENTRALITY_MODES), help='Betweenness centrality mode (default: config centrality.mode; auto = exact on small graphs only)')
+@click.option('--centrality-samples', default=None, type=int, help='Source pivots for approximate centrality (default: config centrality.num_samples)')
+@click.option('--workers', default=None, type=int, help='Processes for centrality computation (default: config centrality.workers)')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+@click.option('--label-concurrency', default=None, type=int, help='Labeling requests in flight at once (default: config labeling.max_concurrency)')
+@click.option('--label-rpm', default=None, type=float, help='Labeling requests per minute limit (default: config labeling.requests_per_minute)')
+@click.option('--label-tpm', default=None, type=float, help='Labeling tokens per minute limit (default: config labeling.tokens_per_minute)')
+@click.option('--label-retries', default=None, type=int, help='Retries per labeling request on 429 / 5xx (default: config labeling.max_retries)')
+@click.option('--label-cache', default=None, help='SQLite label cache path (default: config labeling.cache_path)')
+@click.option('--label-cache-ttl', default=None, type=float, help='Expire cached labels after this many days (default: config labeling.cache_ttl_days)')
+@click.option('--no-label-cache', is_flag=True, help='Always request fresh labels')
+@click.option('--embedding-model', default=DEFAULT_EMBEDDING_MODEL, help='Embedding model for semantic/hybrid grouping ("hashing" = offline)')
+@click.option('--embedding-cache', default=str(DEFAULT_VECTOR_CACHE_PATH), help='SQLite feature-vector cache path')
+@click.option('--no-embedding-cache', is_flag=True, help='Do not persist feature vectors')
+@click.option('--prune', is_flag=True, help='Prune by cumulative influence before analysis')
+@click.option('--node-threshold', default=None, type=float, help='Pruning: influence share of kept nodes (default: config graph_generation)')
+@click.option('--edge-threshold', default=None, type=float, help='Pruning: influence share of kept edges (default: config graph_generation)')
+@click.option('--original', default='reference', type=click.Choice(ORIGINAL_MODES), help='How the output stores the source graph: hashed reference, embedded copy, columnar sidecar or none')
+@click.option('--compress', default=None, type=click.Choice(COMPRESSIONS), help='Compress the output (default: from a .gz / .zst suffix)')
+@click.option('--pretty', is_flag=True, help='Indent the cleanup sections of the output')
+@click.option('--profile', 'profile_run', is_flag=True, help='Record per-stage time, CPU, memory and token usage')
+@click.option('--profile-output', default=None, help='Chrome trace JSON path (default: <output>.trace.json)')
+@click.option('--profile-memory/--no-profile-memory', default=True, help='Trace peak memory per stage (slows pure-Python stages)')
+def cleanup_existing(graph_file, output, strategy, max_nodes, grouping, importance, api_key, centrality, centrality_samples, workers, cache,
+                     label_concurrency, label_rpm, label_tpm, label_retries, label_cache, label_cache_ttl, no_label_cache,
+                     embedding_model, embedding_cache, no_embedding_cache, prune, node_threshold, edge_threshold, original,
+                     compress, pretty, profile_run, profile_output, profile_memory):
     """
     Cleanup an existing graph JSON file
 
+    The output references the source graph by path and SHA-256 instead of copying it
+    (--original embed restores the copy); graph-analysis loaders resolve either form.
+
+    With --profile, a per-stage summary is printed and a Chrome trace (chrome://tracing,
+    ui.perfetto.dev) is written next to the output.
+
     Example:
     python main.py cleanup-existing --graph-file my_graph.json --strategy balanced
     """
     click.echo(f"Loading graph from: {graph_file}")
 
     try:
-        with open(graph_file, 'r') as f:
-            graph_data = json.load(f)
-
-        # Analyze graph
-        analyzer = GraphAnalyzer(graph_data)
-        click.echo(f"Graph loaded: {len(graph_data.get('nodes', []))} nodes, {len(graph_data.get('edges', []))} edges")
-
-        # Select nodes
-        selector = NodeSelector(analyzer, max_nodes=max_nodes)
-        pinned_nodes = selector.select_nodes_for_pinning(strategy=strategy)
-        click.echo(f"Selected {len(pinned_nodes)} nodes using {strategy} strategy")
-
-        # Group into supernodes
-        grouper = GroupingEngine(analyzer, pinned_nodes)
-        supernodes = grouper.create_supernodes(strategy=grouping)
-        click.echo(f"Created {len(supernodes)} supernodes using {grouping} grouping")
-
-        # Generate labels if API key provided
-        if api_key:
-            labeler = AutoLabeler(api_key=api_key)
-            for snode in supernodes:
-                label = labeler.generate_label(snode, graph_data, prompt="", target_logit="")
-                snode.label = label
-                click.echo(f"  - {label} ({len(snode.node_ids)} nodes, layers {snode.layer_range[0]}-{snode.layer_range[1]})")
-
-        # Save output
-        output_data = {
-            'pinned_node_ids': pinned_nodes,
-            'supernodes': [
-                {
-                    'label': snode.label,
-                    'node_ids': snode.node_ids,
-                    'layer_range': snode.layer_range,
-                    'functional_role': snode.functional_role,
-                    'total_influence': snode.total_influence
-                }
-                for snode in supernodes
-            ],
-            'original_graph': graph_data
-        }
-
-        with open(output, 'w') as f:
-            json.dump(output_data, f, indent=2)
-
+        with profiling.profile(enabled=profile_run, memory=profile_memory) as profiler, profiling.span('cleanup-existing'):
+            config = load_config()
+            node_threshold, edge_threshold = _pruning_thresholds(config, node_threshold, edge_threshold)
+            centrality_options = _centrality_settings(config, centrality, centrality_samples, workers)
+            options = CleanupOptions(strategy=strategy, max_nodes=max_nodes, grouping=grouping,
+                                     importance=_importance(config, importance),
+                                     selection_settings=selection_settings(config),
+                                     centrality=centrality_options.pop('mode', 'auto'),
+                                     centrality_samples=centrality_options.pop('num_samples', 256),
+                                     workers=centrality_options.pop('workers', 1),
+                                     centrality_settings=centrality_options, cache=cache, embedding_model=embedding_model,
+                                     embedding_cache=None if no_embedding_cache else embedding_cache,
+                                     grouping_settings=grouping_settings(config), prune=prune,
+                                     node_threshold=node_threshold, edge_threshold=edge_threshold,
+                                     original=original, compression=compress)
+
+            # Label supernodes if API key provided
+            labeler = labels_cache = None
+            if api_key:
+                labels_cache = None if no_label_cache else LabelCache(
+                    **_label_cache_settings(config, label_cache, label_cache_ttl))
+                labeler = AutoLabeler(api_key=api_key, cache=labels_cache, **_labeler_settings(
+                    config, label_concurrency, label_rpm, label_tpm, label_retries))
+
+            result = cleanup_graph(graph_file, options, labeler=labeler, log=click.echo)
+            if labels_cache is not None:
+                stats = labels_cache.stats()
+                click.echo(f"Label cache: {stats['hits']} hits, {stats['misses']} misses ({stats['entries']} entries)")
+
+            with profiling.span('write'):
+                write_output(result, output, original, compress, indent=2 if pretty else None)
         click.echo(f"✓ Saved cleaned graph to: {output}")
 
+        if profiler is not None:
+            trace_path = profiler.write_trace(profile_output or Path(output).with_suffix('.trace.json'))
+            click.echo()
+            click.echo(profiler.format_summary())
+            click.echo(f"✓ Saved profile trace to: {trace_path}")
+
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
         raise
 
 
+@cli.command()
+@click.argument('source')
+@click.option('--output-dir', required=True, help='Directory for cleaned graphs and the manifest')
+@click.option('--strategy', default='pathway')
+@click.option('--max-nodes', default=30, type=int)
+@click.option('--grouping', default='functional')
+@click.option('--importance', default=None, type=click.Choice(['influence', 'centrality']), help='Node importance for the importance/balanced strategies (default: config node_selection.importance)')
+@click.option('--processes', default=os.cpu_count() or 1, type=int, help='Worker processes')
+@click.option('--resume/--no-resume', default=True, help='Skip graphs the manifest records as done')
+@click.option('--centrality', default=None, type=click.Choice(CENTRALITY_MODES), help='Betweenness centrality mode (default: config centrality.mode; auto = exact on small graphs only)')
+@click.option('--centrality-samples', default=None, type=int, help='Source pivots for approximate centrality (default: config centrality.num_samples)')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+@click.option('--api-key', envvar='ANTHROPIC_API_KEY', help='Anthropic API key for labeling')
+@click.option('--label-concurrency', default=None, type=int, help='Labeling requests in flight per worker (default: config labeling.max_concurrency)')
+@click.option('--label-rpm', default=None, type=float, help='Labeling requests per minute limit per worker (default: config labeling.requests_per_minute)')
+@click.option('--label-tpm', default=None, type=float, help='Labeling tokens per minute limit per worker (default: config labeling.tokens_per_minute)')
+@click.option('--label-retries', default=None, type=int, help='Retries per labeling request on 429 / 5xx (default: config labeling.max_retries)')
+@click.option('--label-cache', default=None, help='SQLite label cache path (default: config labeling.cache_path)')
+@click.option('--label-cache-ttl', default=None, type=float, help='Expire cached labels after this many days (default: config labeling.cache_ttl_days)')
+@click.option('--no-label-cache', is_flag=True, help='Always request fresh labels')
+@click.option('--embedding-model', default=DEFAULT_EMBEDDING_MODEL, help='Embedding model for semantic/hybrid grouping ("hashing" = offline)')
+@click.option('--embedding-cache', default=str(DEFAULT_VECTOR_CACHE_PATH), help='SQLite feature-vector cache path')
+@click.option('--no-embedding-cache', is_flag=True, help='Do not persist feature vectors')
+@click.option('--index', 'index_path', default=None, help='Also add each cleaned graph to this feature index')
+@click.option('--original', default='reference', type=click.Choice(ORIGINAL_MODES), help='How the output stores the source graph: hashed reference, embedded copy, columnar sidecar or none')
+@click.option('--compress', default=None, type=click.Choice(COMPRESSIONS), help='Compress the output (default: from a .gz / .zst suffix)')
+def cleanup_batch(source, output_dir, strategy, max_nodes, grouping, importance, processes, resume, centrality, centrality_samples,
+                  cache, api_key, label_concurrency, label_rpm, label_tpm, label_retries, label_cache, label_cache_ttl, no_label_cache,
+                  embedding_model, embedding_cache, no_embedding_cache, index_path, original, compress):
+    """
+    Cleanup every graph in a directory or glob with a pool of worker processes
+
+    Outputs are written atomically as <output-dir>/<name>.cleaned.json (plus .gz / .zst
+    with --compress) and recorded in <output-dir>/manifest.jsonl, so an interrupted run picks up where it stopped.
+
+    Example:
+    python main.py cleanup-batch graphs/ --output-dir cleaned/ --processes 8
+    python main.py cleanup-batch "graphs/**/*.json" --output-dir cleaned/
+    """
+    graph_files = find_graph_files(source)
+    if not graph_files:
+        raise click.ClickException(f"No graph files found for: {source}")
+    click.echo(f"Found {len(graph_files)} graphs; processing with {processes} workers")
+
+    config = load_config()
+    # Graphs already run in parallel, so centrality stays in each worker's process
+    centrality_options = _centrality_settings(config, centrality, centrality_samples, workers=1)
+    options = CleanupOptions(strategy=strategy, max_nodes=max_nodes, grouping=grouping,
+                             importance=_importance(config, importance),
+                             selection_settings=selection_settings(config),
+                             centrality=centrality_options.pop('mode', 'auto'),
+                             centrality_samples=centrality_options.pop('num_samples', 256),
+                             workers=centrality_options.pop('workers'), centrality_settings=centrality_options,
+                             cache=cache, embedding_model=embedding_model,
+                             embedding_cache=None if no_embedding_cache else embedding_cache,
+                             grouping_settings=grouping_settings(config), original=original,
+                             compression=compress)
+    labeler_settings = None
+    if api_key:
+        labeler_settings = {
+            'api_key': api_key,
+            **_labeler_settings(config, label_concurrency, label_rpm, label_tpm, label_retries),
+            'cache': None if no_label_cache else _label_cache_settings(config, label_cache, label_cache_ttl)
+        }
+
+    index = FeatureIndex(index_path) if index_path else None
+
+    def report(record):
+        if record.status == 'done':
+            if index is not None:
+                index.add_graph(record.graph_file, cache=cache)
+            rate = record.num_edges / record.seconds if record.seconds > 0 else 0.0
+            click.echo(f"  ✓ {record.graph_file}: {record.num_nodes} nodes, {record.num_edges} edges "
+                       f"in {record.seconds:.2f}s ({rate:,.0f} edges/s) "
+                       f"replacement={record.replacement_score:.3f} completeness={record.completeness_score:.3f}")
+        else:
+            click.echo(f"  ✗ {record.graph_file}: {record.error}", err=True)
+
+    summary, records = run_batch(graph_files, output_dir, options, processes=processes, resume=resume,
+                                 labeler_settings=labeler_settings, on_record=report)
+
+    click.echo(f"\nBatch Summary:")
+    click.echo(f"  Processed: {summary.processed}, failed: {summary.failed}, skipped (already done): {summary.skipped}")
+    click.echo(f"  Wall time: {summary.wall_seconds:.2f}s, graph time: {summary.graph_seconds:.2f}s "
+               f"(speedup {summary.parallel_speedup:.1f}x)")
+    click.echo(f"  Throughput: {summary.graphs_per_second:.2f} graphs/s, {summary.edges_per_second:,.0f} edges/s")
+
+    # Stage breakdown across graphs
+    stages = {}
+    for record in records:
+        for stage, seconds in record.timings.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    if stages:
+        click.echo("  Time per stage: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items()))
+    click.echo(f"✓ Manifest: {Path(output_dir) / MANIFEST_FILE}")
+    if summary.failed:
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.argument('source')
+@click.option('--index', 'index_path', default=str(DEFAULT_INDEX_PATH), help='SQLite feature index path')
+@click.option('--processes', default=os.cpu_count() or 1, type=int, help='Processes parsing graphs')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+@click.option('--similarity-index', 'similarity_path', default=str(DEFAULT_SIMILARITY_PATH), help='SQLite MinHash/LSH index path')
+@click.option('--no-similarity', is_flag=True, help='Only update the feature index')
+def index(source, index_path, processes, cache, similarity_path, no_similarity):
+    """
+    Add every graph in a directory or glob to the cross-graph feature and similarity indexes
+
+    The feature index maps (model, layer, feature) to the graphs, positions, influence and
+    activation where the feature occurs; the similarity index stores MinHash signatures of
+    each graph's features and edges for `similar` queries. Graphs already indexed and
+    unchanged are skipped, so the command can be rerun as new graphs arrive.
+
+    Example:
+    python main.py index graphs/ --processes 8
+    """
+    graph_files = find_graph_files(source)
+    if not graph_files:
+        raise click.ClickException(f"No graph files found for: {source}")
+
+    def report(path, error):
+        if error is not None:
+            click.echo(f"  ✗ {path}: {type(error).__name__}: {error}", err=True)
+
+    feature_index = FeatureIndex(index_path)
+    counts = feature_index.update(graph_files, processes=processes, cache=cache, on_graph=report)
+    stats = feature_index.stats()
+    click.echo(f"Indexed {counts['indexed']}, skipped {counts['skipped']} unchanged, failed {counts['failed']}")
+    click.echo(f"✓ {index_path}: {stats['graphs']} graphs, {stats['features']} distinct features, "
+               f"{stats['postings']} postings")
+
+    if not no_similarity:
+        similarity_index = SimilarityIndex(similarity_path)
+        counts = similarity_index.update(graph_files, processes=processes, cache=cache, on_graph=report)
+        stats = similarity_index.stats()
+        click.echo(f"Sketched {counts['indexed']}, skipped {counts['skipped']} unchanged, failed {counts['failed']}")
+        click.echo(f"✓ {similarity_path}: {stats['graphs']} graphs in {stats['buckets']} LSH buckets")
+
+
+@cli.command()
+@click.argument('graph_file', type=click.Path(exists=True))
+@click.option('--similarity-index', 'similarity_path', default=str(DEFAULT_SIMILARITY_PATH), type=click.Path(exists=True), help='SQLite MinHash/LSH index path')
+@click.option('--k', default=10, type=int, help='Graphs to list')
+@click.option('--rerank', default='weighted', type=click.Choice(['weighted', 'jaccard', 'none']), help='Exact similarity for the top candidates')
+@click.option('--edge-weight', default=0.5, type=float, help='Weight of edge similarity against feature similarity')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+def similar(graph_file, similarity_path, k, rerank, edge_weight, cache):
+    """
+    List indexed graphs most similar to a graph
+
+    Candidates come from the LSH buckets the graph's signatures fall into, so only
+    graphs with substantial feature or edge overlap are returned.
+
+    Example:
+    python main.py similar my_graph.json --k 5
+    """
+    start = time.perf_counter()
+    results = SimilarityIndex(similarity_path).query(graph_file, k=k, rerank=None if rerank == 'none' else rerank,
+                                                     edge_weight=edge_weight, cache=cache)
+    elapsed = time.perf_counter() - start
+
+    click.echo(f"{len(results)} similar graphs in {elapsed * 1000:.1f} ms")
+    for result in results:
+        kind = 'exact' if result.exact else 'estimate'
+        click.echo(f"  {result.score:.3f} ({kind}: features {result.feature_similarity:.3f}, "
+                   f"edges {result.edge_similarity:.3f})  {result.graph}")
+
+
+def _feature_key(value: str):
+    """Parse layer:feature or model:layer:feature"""
+    parts = value.split(':')
+    try:
+        if len(parts) == 2:
+            return int(parts[0]), int(parts[1])
+        if len(parts) == 3:
+            return parts[0], int(parts[1]), int(parts[2])
+    except ValueError:
+        pass
+    raise click.BadParameter(f"expected LAYER:FEATURE or MODEL:LAYER:FEATURE, got {value!r}")
+
+
+@cli.command()
+@click.argument('features', nargs=-1, required=True)
+@click.option('--index', 'index_path', default=str(DEFAULT_INDEX_PATH), type=click.Path(exists=True), help='SQLite feature index path')
+@click.option('--model', default=None, help='Only match features of this model')
+@click.option('--min-shared', default=None, type=int, help='Minimum number of the features a graph must contain (default: all)')
+@click.option('--limit', default=20, type=int, help='Graphs to list')
+def query_index(features, index_path, model, min_shared, limit):
+    """
+    List indexed graphs that share the given features
+
+    Example:
+    python main.py query-index 12:4031 14:877 --model gemma-2-2b --min-shared 2
+    """
+    keys = [_feature_key(value) for value in features]
+    start = time.perf_counter()
+    matches = FeatureIndex(index_path).graphs_sharing(keys, model=model, min_shared=min_shared, limit=limit)
+    elapsed = time.perf_counter() - start
+
+    click.echo(f"{len(matches)} graphs in {elapsed * 1000:.1f} ms")
+    for match in matches:
+        shared = ' '.join(f"{layer}:{feature}" for layer, feature in match.features)
+        click.echo(f"  {match.shared:3d}  influence={match.influence:.3f}  {match.graph}  [{shared}]")
+
+
+@cli.command()
+@click.argument('source')
+@click.option('--output', required=True, help='Matrix directory (extended in place if it exists)')
+@click.option('--max-features', default=200, type=int, help='Most influential features taken from each graph')
+@click.option('--influence-threshold', default=None, type=float, help='Only features with cumulative influence at or below this')
+@click.option('--processes', default=os.cpu_count() or 1, type=int, help='Processes parsing graphs')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+def cooccurrence(source, output, max_features, influence_threshold, processes, cache):
+    """
+    Accumulate feature co-occurrence and edge-weight matrices over a set of graphs
+
+    Each graph contributes its most influential features: every pair of them counts one
+    co-occurrence, and the edges between them add to the influence matrix. Graphs already
+    in the matrix are skipped, so the command can be rerun as graphs arrive.
+
+    Example:
+    python main.py cooccurrence graphs/ --output corpus.cooc --max-features 200
+    """
+    graph_files = find_graph_files(source)
+    if not graph_files:
+        raise click.ClickException(f"No graph files found for: {source}")
+
+    def report(path, error):
+        if error is not None:
+            click.echo(f"  ✗ {path}: {type(error).__name__}: {error}", err=True)
+
+    matrix = CooccurrenceMatrix.load(output) if Path(output).exists() else CooccurrenceMatrix()
+    counts = matrix.update(graph_files, processes=processes, cache=cache, influence_threshold=influence_threshold,
+                           max_features=max_features, on_graph=report)
+    if counts['added']:
+        matrix.save(output)
+    stats = matrix.stats()
+    click.echo(f"Added {counts['added']}, skipped {counts['skipped']} already counted, failed {counts['failed']}")
+    click.echo(f"✓ {output}: {stats['graphs']} graphs, {stats['features']} features, {stats['pairs']} pairs, "
+               f"{stats['influence_edges']} influence edges")
+
+
+@cli.command()
+@click.argument('shards', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--output', required=True, help='Directory for the merged matrix')
+def merge_cooccurrence(shards, output):
+    """
+    Merge co-occurrence matrices built on disjoint sets of graphs
+
+    Example:
+    python main.py merge-cooccurrence shard0.cooc shard1.cooc --output corpus.cooc
+    """
+    try:
+        stats = merge_shards(shards, output).stats()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✓ {output}: {stats['graphs']} graphs, {stats['features']} features, {stats['pairs']} pairs")
+
+
+@cli.command()
+@click.argument('feature')
+@click.option('--matrix', 'matrix_path', required=True, type=click.Path(exists=True), help='Co-occurrence matrix directory')
+@click.option('--model', default=None, help='Model of the feature (required when FEATURE is LAYER:FEATURE)')
+@click.option('--k', default=10, type=int, help='Partners to list')
+@click.option('--score', default='count', type=click.Choice(SCORES), help='Co-occurrence ranking')
+@click.option('--influence', 'by_influence', is_flag=True, help='Rank by accumulated edge weight instead')
+def partners(feature, matrix_path, model, k, score, by_influence):
+    """
+    Features that most often appear, or are most strongly connected, with a feature
+
+    Example:
+    python main.py partners gemma-2-2b:12:4031 --matrix corpus.cooc --score npmi
+    """
+    key = _feature_key(feature)
+    if len(key) == 2:
+        if model is None:
+            raise click.BadParameter("pass MODEL:LAYER:FEATURE or --model", param_hint='FEATURE')
+        key = (model, *key)
+    matrix = CooccurrenceMatrix.load(matrix_path)
+    found = matrix.influence_partners(*key, k=k) if by_influence else matrix.partners(*key, k=k, score=score)
+    click.echo(f"{feature}: in {matrix.graph_count(*key)} of {matrix.num_graphs} graphs")
+    for partner in found:
+        click.echo(f"  {partner.model}:{partner.layer}:{partner.feature}  score={partner.score:.4f}  "
+                   f"together in {partner.count} graphs")
+
+
+def _csv(value: str):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+@cli.command()
+@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON (plain, gzip or zstd)')
+@click.option('--strategies', default=','.join(STRATEGIES), help='Comma-separated node selection strategies')
+@click.option('--groupings', default=','.join(GROUPINGS), help='Comma-separated grouping strategies')
+@click.option('--max-nodes', default='10,20,30,40,50', help='Comma-separated pin budgets')
+@click.option('--importance', default=None, type=click.Choice(['influence', 'centrality']), help='Node importance for the importance/balanced strategies (default: config node_selection.importance)')
+@click.option('--threads', default=os.cpu_count() or 1, type=int, help='Configurations evaluated concurrently')
+@click.option('--early-stop/--exhaustive', default=True, help='Stop at the first configuration that passes the thresholds')
+@click.option('--config', 'config_path', default=None, type=click.Path(exists=True), help='Config file with the metrics thresholds')
+@click.option('--centrality', default=None, type=click.Choice(CENTRALITY_MODES), help='Betweenness centrality mode (default: config centrality.mode; auto = exact on small graphs only)')
+@click.option('--centrality-samples', default=None, type=int, help='Source pivots for approximate centrality (default: config centrality.num_samples)')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+@click.option('--report', default=None, help='Write the sweep results and Pareto frontier as JSON')
+@click.option('--output', default=None, help='Write the cleaned graph for the best configuration')
+@click.option('--embedding-model', default=DEFAULT_EMBEDDING_MODEL, help='Embedding model for semantic/hybrid grouping ("hashing" = offline)')
+@click.option('--embedding-cache', default=str(DEFAULT_VECTOR_CACHE_PATH), help='SQLite feature-vector cache path')
+@click.option('--no-embedding-cache', is_flag=True, help='Do not persist feature vectors')
+@click.option('--original', default='reference', type=click.Choice(ORIGINAL_MODES), help='How the output stores the source graph: hashed reference, embedded copy, columnar sidecar or none')
+@click.option('--compress', default=None, type=click.Choice(COMPRESSIONS), help='Compress the output (default: from a .gz / .zst suffix)')
+def autotune(graph_file, strategies, groupings, max_nodes, importance, threads, early_stop, config_path, centrality,
+             centrality_samples, cache, report, output, embedding_model, embedding_cache, no_embedding_cache, original,
+             compress):
+    """
+    Search strategy × grouping × max-nodes for a subgraph that passes the metrics thresholds
+
+    The thresholds and ideal supernode range come from the `metrics` section of config.yaml.
+
+    Example:
+    python main.py autotune --graph-file my_graph.json --max-nodes 10,20,30 --output cleaned.json
+    """
+    config = load_config(config_path)
+    metrics_config = config.get('metrics', {})
+    min_replacement = metrics_config.get('min_replacement_score', 0.5)
+    min_completeness = metrics_config.get('min_completeness_score', 0.7)
+    ideal_range = metrics_config.get('ideal_num_supernodes', [3, 7])
+
+    def report_result(result):
+        mark = '✓' if result.passed else ' '
+        click.echo(f"  {mark} {result.strategy:<10} {result.grouping:<10} max_nodes={result.max_nodes:<4} "
+                   f"replacement={result.replacement_score:.3f} completeness={result.completeness_score:.3f} "
+                   f"supernodes={result.num_supernodes}")
+
+    click.echo(f"Tuning {graph_file} (replacement >= {min_replacement}, completeness >= {min_completeness})")
+    result = run_autotune(
+        graph_file, strategies=_csv(strategies), groupings=_csv(groupings),
+        max_nodes_values=[int(n) for n in _csv(max_nodes)], min_replacement=min_replacement,
+        min_completeness=min_completeness, ideal_num_supernodes=ideal_range,
+        importance=_importance(config, importance), selection_settings=selection_settings(config),
+        centrality=_centrality_settings(config, centrality, centrality_samples), threads=threads,
+        early_stop=early_stop, cache=cache, embedding_model=embedding_model,
+        embedding_cache=None if no_embedding_cache else embedding_cache, grouping_settings=grouping_settings(config),
+        on_result=report_result
+    )
+
+    click.echo(f"\nEvaluated {len(result.results)}/{result.num_configs} configurations"
+               + (" (stopped early)" if result.stopped_early else "")
+               + f" in {sum(result.timings.values()):.2f}s "
+               + "(" + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result.timings.items()) + ")")
+    click.echo("\nPareto frontier (replacement, completeness, supernode count):")
+    for r in result.frontier:
+        click.echo(f"  {r.strategy:<10} {r.grouping:<10} max_nodes={r.max_nodes:<4} "
+                   f"{r.replacement_score:.3f}  {r.completeness_score:.3f}  {r.num_supernodes}")
+    if result.best is not None:
+        best = result.best
+        status = "passes" if best.passed else "best available (no configuration passed)"
+        click.echo(f"\nBest: --strategy {best.strategy} --grouping {best.grouping} --max-nodes {best.max_nodes} ({status})")
+
+    if report:
+        write_json_atomic(result.to_dict(), report)
+        click.echo(f"✓ Saved sweep report to: {report}")
+    if output and result.best is not None:
+        graph_data = None
+        if original in ('embed', 'sidecar'):
+            graph_data = get_graph(graph_file, cache=cache)
+        write_cleaned_graph(build_output(result.best.pinned_node_ids, result.best.supernodes), output, graph=graph_data,
+                            source=graph_file, original=original, compression=compress)
+        click.echo(f"✓ Saved cleaned graph to: {output}")
+
+
+@cli.command()
+@click.argument('cleaned_files', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--label-cache', default=None, help='SQLite label cache path (default: config labeling.cache_path)')
+@click.option('--model', default='claude-sonnet-4-20250514', help='Labeling model the labels came from')
+@click.option('--prompt', default='', help='Prompt the labels were generated with')
+@click.option('--target-logit', default='', help='Target logit the labels were generated with')
+def warm_label_cache(cleaned_files, label_cache, model, prompt, target_logit):
+    """
+    Seed the label cache from previous cleanup outputs
+
+    Example:
+    python main.py warm-label-cache outputs/*.json
+    """
+    cache = LabelCache(**_label_cache_settings(load_config(), label_cache, None))
+    added = cache.warm(cleaned_files, model=model, prompt=prompt, target_logit=target_logit)
+    click.echo(f"Stored {added} labels from {len(cleaned_files)} files ({len(cache)} entries in {cache.path})")
+
+
 @cli.command()
 @click.option('--prompt', required=True)
 @click.option('--model', default='gemma-2-2b')
@@ -124,7 +562,12 @@ def generate_only(prompt, model):
 
 @cli.command()
 @click.option('--graph-file', required=True, type=click.Path(exists=True))
-def analyze(graph_file):
+@click.option('--centrality', default=None, type=click.Choice(CENTRALITY_MODES), help='Betweenness centrality mode (default: config centrality.mode; auto = exact on small graphs only)')
+@click.option('--centrality-samples', default=None, type=int, help='Source pivots for approximate centrality (default: config centrality.num_samples)')
+@click.option('--workers', default=None, type=int, help='Processes for centrality computation (default: config centrality.workers)')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+@click.option('--importance', default=None, type=click.Choice(['influence', 'centrality']), help='Node importance method (default: config node_selection.importance)')
+def analyze(graph_file, centrality, centrality_samples, workers, cache, importance):
     """
     Analyze a graph and print statistics without cleanup
 
@@ -140,31 +583,40 @@ def analyze(graph_file):
     click.echo(f"Analyzing graph from: {graph_file}")
 
     try:
-        with open(graph_file, 'r') as f:
-            graph_data = json.load(f)
+        graph_data = get_graph(graph_file, cache=cache)
 
-        analyzer = GraphAnalyzer(graph_data)
+        config = load_config()
+        importance = _importance(config, importance)
+        analyzer = GraphAnalyzer.from_arrays(
+            graph_data, centrality=_centrality_settings(config, centrality, centrality_samples, workers)
+        )
 
         # Basic statistics
-        num_nodes = len(graph_data.get('nodes', []))
-        num_edges = len(graph_data.get('edges', []))
+        num_nodes = len(graph_data['nodes'])
+        num_edges = graph_data.num_links
         click.echo(f"\nGraph Statistics:")
         click.echo(f"  Nodes: {num_nodes}")
         click.echo(f"  Edges: {num_edges}")
 
         # Layer distribution
-        layers = [node.get('layer', 0) for node in graph_data.get('nodes', [])]
-        if layers:
-            click.echo(f"  Layers: {min(layers)}-{max(layers)}")
+        layers = analyzer.layers[analyzer.has_node_data]
+        if len(layers):
+            click.echo(f"  Layers: {layers.min()}-{layers.max()}")
 
         # Top influential nodes
-        importance = analyzer.compute_node_importance()
-        top_nodes = sorted(importance.items(), key=lambda x: x[1], reverse=True)[:10]
+        importance_scores = analyzer.compute_node_importance(importance)
+        top_nodes = sorted(importance_scores.items(), key=lambda x: x[1], reverse=True)[:10]
+
+        if importance == 'centrality':
+            result = analyzer.centrality.betweenness()
+            if result.mode == 'approximate':
+                click.echo(f"\nCentrality: approximate ({result.num_pivots} pivots, "
+                           f"error <= {result.error_bound:.3f} at {result.confidence:.0%} confidence)")
 
         click.echo(f"\nTop 10 Most Important Nodes:")
         for i, (node_id, score) in enumerate(top_nodes, 1):
             node = analyzer.get_node(node_id)
-            explanation = node.get('explanation', 'No explanation') if node else 'Unknown'
+            explanation = (node.get('explanation') or node.get('clerp') or 'No explanation') if node else 'Unknown'
             click.echo(f"  {i}. {node_id} (influence: {score:.3f}) - {explanation[:50]}")
 
         click.echo(f"\nSuggested Strategy:")
@@ -176,5 +628,204 @@ def analyze(graph_file):
         raise
 
 
+def _labeler_settings(config, max_concurrency, requests_per_minute, tokens_per_minute, max_retries):
+    """AutoLabeler arguments: explicit options over config.yaml's labeling section"""
+    settings = labeling_settings(config)
+    for key, value in (('max_concurrency', max_concurrency), ('requests_per_minute', requests_per_minute),
+                       ('tokens_per_minute', tokens_per_minute), ('max_retries', max_retries)):
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+def _label_cache_settings(config, path, ttl_days):
+    """LabelCache arguments: explicit options over config.yaml's labeling section"""
+    settings = label_cache_settings(config)
+    if path is not None:
+        settings['path'] = path
+    if ttl_days is not None:
+        settings['ttl'] = ttl_days * 86400
+    return settings
+
+
+def _importance(config, importance):
+    """Node importance method: explicit option, else config.yaml's node_selection.importance"""
+    if importance is not None:
+        return importance
+    return (config.get('node_selection') or {}).get('importance') or 'influence'
+
+
+def _centrality_settings(config, mode, num_samples, workers=None):
+    """CentralityService arguments: explicit options over config.yaml's centrality section"""
+    settings = centrality_settings(config)
+    for key, value in (('mode', mode), ('num_samples', num_samples), ('workers', workers)):
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+def _pruning_thresholds(config, node_threshold, edge_threshold):
+    """Explicit thresholds, else config.yaml's graph_generation section, else circuit-tracer's defaults"""
+    section = config.get('graph_generation') or {}
+    if node_threshold is None:
+        node_threshold = section.get('node_threshold', 0.8)
+    if edge_threshold is None:
+        edge_threshold = section.get('edge_threshold', 0.98)
+    return node_threshold, edge_threshold
+
+
+@cli.command()
+@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON (plain, gzip or zstd)')
+@click.option('--output', required=True, help='Pruned graph JSON path')
+@click.option('--node-threshold', default=None, type=float, help='Influence share of kept nodes (default: config graph_generation)')
+@click.option('--edge-threshold', default=None, type=float, help='Influence share of kept edges (default: config graph_generation)')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+def prune(graph_file, output, node_threshold, edge_threshold, cache):
+    """
+    Prune a graph locally by cumulative logit influence
+
+    Keeps the most influential nodes and edges covering the threshold shares of total
+    influence (plus all embeddings and logits), as circuit-tracer does before upload.
+    The output is an ordinary graph JSON for every other command.
+
+    Example:
+    python main.py prune --graph-file big_graph.json --output pruned.json --node-threshold 0.8
+    """
+    node_threshold, edge_threshold = _pruning_thresholds(load_config(), node_threshold, edge_threshold)
+    graph = get_graph(graph_file, cache=cache)
+    start = time.perf_counter()
+    result = prune_graph(graph, node_threshold, edge_threshold)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Kept {result.graph.num_nodes} of {graph.num_nodes} nodes ({result.node_ratio:.1%}), "
+               f"{result.graph.num_links} of {graph.num_links} edges ({result.edge_ratio:.1%}) in {elapsed:.2f}s")
+    write_json_atomic(result.graph.to_dict(), output, indent=None)
+    click.echo(f"✓ Saved pruned graph to: {output}")
+
+
+@cli.command('threshold-sweep')
+@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON (plain, gzip or zstd)')
+@click.option('--node-thresholds', default=','.join(map(str, DEFAULT_NODE_THRESHOLDS)), help='Comma-separated node thresholds')
+@click.option('--edge-thresholds', default=','.join(map(str, DEFAULT_EDGE_THRESHOLDS)), help='Comma-separated edge thresholds')
+@click.option('--output', default=None, help='Write the curve as CSV (.csv) or JSON')
+@click.option('--cache/--no-cache', default=True, help='Load through the memory-mapped columnar cache')
+def sweep_thresholds(graph_file, node_thresholds, edge_thresholds, output, cache):
+    """
+    Replacement and completeness of the pruned graph across pruning thresholds
+
+    Every (node, edge) threshold pair gets exactly the graph `prune` produces, with edges
+    rescored once per node threshold rather than once per pair.
+
+    Example:
+    python main.py threshold-sweep --graph-file my_graph.json --node-thresholds 0.6,0.7,0.8,0.9 --output curve.csv
+    """
+    try:
+        node_values = [float(value) for value in _csv(node_thresholds)]
+        edge_values = [float(value) for value in _csv(edge_thresholds)]
+    except ValueError:
+        raise click.BadParameter("expected comma-separated numbers")
+
+    graph = get_graph(graph_file, cache=cache)
+    start = time.perf_counter()
+    sweep = threshold_sweep(graph, node_values, edge_values)
+    elapsed = time.perf_counter() - start
+    rows = sweep.rows()
+
+    click.echo(f"{len(rows)} threshold pairs in {elapsed:.2f}s")
+    click.echo(f"{'node':>6}{'edge':>7}{'nodes':>9}{'edges':>10}{'replacement':>13}{'completeness':>14}")
+    for row in rows:
+        click.echo(f"{row['node_threshold']:>6.2f}{row['edge_threshold']:>7.2f}{row['num_nodes']:>9}{row['num_edges']:>10}"
+                   f"{row['replacement_score']:>13.3f}{row['completeness_score']:>14.3f}")
+
+    if output:
+        if output.endswith('.csv'):
+            with open(output, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            write_json_atomic({'graph_file': graph_file, 'thresholds': rows}, output)
+        click.echo(f"✓ Saved sweep to: {output}")
+
+
+@cli.command()
+@click.option('--graph-file', required=True, type=click.Path(exists=True), help='Path to graph JSON (plain, gzip or zstd)')
+@click.option('--cache-dir', default=None, help='Output directory (default: under ~/.cache/neuronpedia_agent/graphs)')
+def convert(graph_file, cache_dir):
+    """
+    Convert a graph JSON file into the columnar binary cache
+
+    Later analyze/cleanup-existing runs memory-map the cache instead of re-parsing
+    the JSON; the cache is rebuilt automatically when the JSON content changes.
+
+    Example:
+    python main.py convert --graph-file my_graph.json
+    """
+    click.echo(f"Converting graph from: {graph_file}")
+    output_dir = convert_graph(graph_file, cache_dir)
+    click.echo(f"✓ Saved columnar cache to: {output_dir}")
+
+
+@cli.command('synthetic-graph')
+@click.option('--nodes', default=1000, type=int, help='Number of nodes')
+@click.option('--edges', default=10000, type=int, help='Number of edges')
+@click.option('--seed', default=0, type=int, help='Random seed')
+@click.option('--output', default='synthetic_graph.json', help='Output file path')
+def generate_synthetic_graph(nodes, edges, seed, output):
+    """
+    Generate a random graph in the Neuronpedia schema
+
+    Layers 0-25 plus embeddings and logits, heavy-tailed hub structure and
+    log-normal edge weights; useful for benchmarks and reproducing scaling issues.
+
+    Example:
+    python main.py synthetic-graph --nodes 10000 --edges 1000000 --output big.json
+    """
+    graph = synthetic_graph(nodes, edges, seed=seed)
+    write_graph_json(graph, output)
+    click.echo(f"✓ Wrote {graph.num_nodes} nodes, {graph.num_links} edges to: {output}")
+
+
+@cli.command()
+@click.option('--sizes', default=','.join(f"{n}x{e}" for n, e in DEFAULT_SIZES), help='Comma-separated NODESxEDGES sizes (k/M suffixes allowed)')
+@click.option('--strategies', default=','.join(DEFAULT_STRATEGIES), help='Comma-separated selection strategies')
+@click.option('--groupings', default=','.join(DEFAULT_GROUPINGS), help='Comma-separated grouping strategies')
+@click.option('--max-nodes', default=30, type=int, help='Maximum nodes to pin')
+@click.option('--centrality', default=None, type=click.Choice(CENTRALITY_MODES), help='Betweenness mode (default: config centrality.mode)')
+@click.option('--centrality-samples', default=None, type=int, help='Betweenness pivots in approximate mode (default: config centrality.num_samples)')
+@click.option('--memory/--no-memory', default=True, help='Also profile per-stage peak memory (a second, traced pass)')
+@click.option('--seed', default=0, type=int, help='Random seed for the synthetic graphs')
+@click.option('--workdir', default=None, type=click.Path(), help='Keep generated graphs here (default: a temporary directory)')
+@click.option('--report', default=None, help='Write the full report as JSON to this path')
+def benchmark(sizes, strategies, groupings, max_nodes, centrality, centrality_samples, memory, seed, workdir, report):
+    """
+    Time and memory-profile every pipeline stage on synthetic graphs
+
+    Prints seconds (and peak MB) per stage and size, with each stage's scaling
+    exponent against nodes + edges. Centrality runs with the same settings as
+    cleanup-existing (config.yaml, overridable here); the table notes the mode used.
+
+    Example:
+    python main.py benchmark --sizes 1kx10k,10kx1M --no-memory --report bench.json
+    """
+    try:
+        size_list = parse_sizes(sizes)
+    except ValueError:
+        raise click.BadParameter(f"expected NODESxEDGES[,...], got {sizes!r}", param_hint='--sizes')
+
+    def on_run(run):
+        total = sum(stage.seconds for stage in run.stages.values())
+        click.echo(f"  {run.num_nodes:,} nodes, {run.num_edges:,} edges: {total:.2f}s")
+
+    click.echo(f"Benchmarking {len(size_list)} sizes{' (with memory profiling)' if memory else ''}")
+    result = run_benchmarks(size_list, strategies=_csv(strategies), groupings=_csv(groupings), max_nodes=max_nodes,
+                            centrality=_centrality_settings(load_config(), centrality, centrality_samples), memory=memory,
+                            seed=seed, workdir=workdir, on_run=on_run)
+    click.echo()
+    click.echo(result.format_table())
+    if report:
+        write_json_atomic(result.to_dict(), report)
+        click.echo(f"\n✓ Saved report to: {report}")
+
+
 if __name__ == '__main__':
     cli()
@@ -1,13 +1,26 @@
 """Analysis modules for graph processing"""
 
 from .graph_analyzer import GraphAnalyzer, Path
+from .centrality import CentralityService, CentralityResult
+from .influence import InfluencePropagator
+from .path_engine import PathEngine
 from .node_selector import NodeSelector
 from .grouping_engine import GroupingEngine, Supernode
+from .pruning import PruneResult, ThresholdSweep, cumulative_mask, prune_graph, threshold_sweep
 
 __all__ = [
     'GraphAnalyzer',
     'Path',
+    'CentralityService',
+    'CentralityResult',
+    'InfluencePropagator',
+    'PathEngine',
     'NodeSelector',
     'GroupingEngine',
-    'Supernode'
+    'Supernode',
+    'PruneResult',
+    'cumulative_mask',
+    'prune_graph',
+    'ThresholdSweep',
+    'threshold_sweep'
 ]
@@ -1,7 +1,15 @@
 """Graph analysis module for attribution graphs"""
 
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from .centrality import CentralityService
+from .influence import InfluencePropagator
+from .path_engine import PathEngine
+from ..storage.arrays import GraphArrays
+from ..storage.stream import as_graph
+from ..utils.profiling import profiled
 
 
 class Path:
@@ -15,46 +23,201 @@ class Path:
 class GraphAnalyzer:
     """Analyze raw attribution graph structure to identify important computational patterns"""
 
-    def __init__(self, graph_data: Dict):
-        """Initialize with graph JSON data"""
-        self.nodes = graph_data['nodes']
-        self.edges = graph_data['edges']
-        self.logit_nodes = graph_data.get('logit_nodes', [])
+    @profiled('analysis.build_adjacency')
+    def __init__(self, graph_data: Union[GraphArrays, Dict], centrality: Optional[Dict] = None):
+        """
+        Initialize with a graph: GraphArrays, or a JSON-style dict in either layout
+        (node_id/links or id/edges), normalized through storage.as_graph
+
+        centrality: Keyword arguments for the CentralityService
+        (mode, num_samples, workers, seed, confidence)
 
-    def compute_node_importance(self) -> Dict[str, float]:
+        self.nodes / self.edges are lazy views; get_node builds one dict on demand.
+        Adjacency comes from the graph's cached views, so analyzers over the same
+        GraphArrays share it.
         """
-        Compute importance score for each node based on:
-        - Direct influence on target logits
-        - Betweenness centrality (how many paths flow through this node)
-        - Downstream influence (how much this node affects other important nodes)
+        graph = as_graph(graph_data)
+        self.nodes = graph['nodes']
+        self.edges = graph['links']
+        self.logit_nodes = graph.get('logit_nodes', [])
+        self.graph_arrays = graph
 
-        Returns: {node_id: importance_score}
+        self.node_ids = graph.node_ids
+        self.node_index = graph.index
+        self.has_node_data = graph.has_data
+        self.layers = graph.layer.astype(np.int64)
+        self.ctx_idx = graph.ctx_idx.astype(np.int64)
+        self.is_logit = graph.logit_mask()
+        self._build_adjacency(graph)
+        self.centrality = CentralityService(self, **(centrality or {}))
+        self._importance = {}
+        self._path_engine = None
+        self._influence_propagator = None
+
+    @classmethod
+    def from_arrays(cls, graph: GraphArrays, centrality: Optional[Dict] = None) -> 'GraphAnalyzer':
+        """Initialize from a streamed GraphArrays (same as GraphAnalyzer(graph))"""
+        return cls(graph, centrality)
+
+    def _build_adjacency(self, graph: GraphArrays):
+        """CSR-style out/in adjacency and per-node aggregates from the graph's link columns"""
+        n = graph.num_nodes
+        sources = graph.link_source.astype(np.int64)
+        targets = graph.link_target.astype(np.int64)
+        weights = graph.link_weight.astype(np.float64)
+
+        # Outgoing adjacency: edges grouped by source, targets sorted within a row
+        self.out_indptr, order = graph.adjacency('out')
+        self.out_indices = targets[order]
+        self.out_weights = weights[order]
+
+        # Incoming adjacency: edges grouped by target, sources sorted within a row
+        self.in_indptr, order = graph.adjacency('in')
+        self.in_indices = sources[order]
+        self.in_weights = weights[order]
+
+        # Per-node aggregates used throughout analysis and grouping
+        self.out_strength = np.bincount(sources, weights=weights, minlength=n)
+        to_logit = self.is_logit[targets]
+        self.logit_influence = np.bincount(sources[to_logit], weights=weights[to_logit], minlength=n)
+        self._adjacency = None
+        self._normalized_adjacency = None
+
+    def index_of(self, node_id: str) -> Optional[int]:
+        """Get the dense index of a node ID (None if unknown)"""
+        return self.node_index.get(node_id)
+
+    def successors(self, node_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (target indices, weights) of a node's outgoing edges in O(out-degree)"""
+        idx = self.node_index.get(node_id)
+        if idx is None:
+            return self.out_indices[:0], self.out_weights[:0]
+        start, end = self.out_indptr[idx], self.out_indptr[idx + 1]
+        return self.out_indices[start:end], self.out_weights[start:end]
+
+    def predecessors(self, node_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (source indices, weights) of a node's incoming edges in O(in-degree)"""
+        idx = self.node_index.get(node_id)
+        if idx is None:
+            return self.in_indices[:0], self.in_weights[:0]
+        start, end = self.in_indptr[idx], self.in_indptr[idx + 1]
+        return self.in_indices[start:end], self.in_weights[start:end]
+
+    def out_degree(self, node_id: str) -> int:
+        """Number of outgoing edges of a node"""
+        idx = self.node_index.get(node_id)
+        return 0 if idx is None else int(self.out_indptr[idx + 1] - self.out_indptr[idx])
+
+    def in_degree(self, node_id: str) -> int:
+        """Number of incoming edges of a node"""
+        idx = self.node_index.get(node_id)
+        return 0 if idx is None else int(self.in_indptr[idx + 1] - self.in_indptr[idx])
+
+    def total_out_weight(self, node_id: str) -> float:
+        """Sum of a node's outgoing edge weights"""
+        idx = self.node_index.get(node_id)
+        return 0.0 if idx is None else float(self.out_strength[idx])
+
+    def direct_logit_influence(self, node_id: str) -> float:
+        """Sum of a node's edge weights into logit nodes"""
+        idx = self.node_index.get(node_id)
+        return 0.0 if idx is None else float(self.logit_influence[idx])
+
+    def edge_weight_between(self, source_ids: Iterable[str], target_ids: Iterable[str]) -> float:
+        """Total weight of edges from any node in source_ids to any node in target_ids"""
+        target_mask = np.zeros(len(self.node_ids), dtype=bool)
+        target_idx = [self.node_index[t] for t in target_ids if t in self.node_index]
+        target_mask[target_idx] = True
+
+        total = 0.0
+        for source in source_ids:
+            indices, weights = self.successors(source)
+            total += float(weights[target_mask[indices]].sum())
+        return total
+
+    def layer_of(self, node_id: str) -> int:
+        """Get the integer layer of a node (0 if unknown)"""
+        idx = self.node_index.get(node_id)
+        return 0 if idx is None else int(self.layers[idx])
+
+    def adjacency_matrix(self) -> sp.csr_matrix:
         """
-        importance = {}
-
-        # 1. Direct logit influence
-        for node in self.nodes:
-            direct_influence = sum(
-                edge['weight']
-                for edge in self.edges
-                if edge['source'] == node['id'] and edge['target'].startswith('logit_')
+        Sparse (source x target) matrix of absolute edge weights, built once from the CSR arrays.
+
+        Parallel edges are summed.
+        """
+        if self._adjacency is None:
+            n = len(self.node_ids)
+            self._adjacency = sp.csr_matrix(
+                (np.abs(self.out_weights), self.out_indices, self.out_indptr),
+                shape=(n, n)
             )
-            importance[node['id']] = direct_influence
+            self._adjacency.sum_duplicates()
+        return self._adjacency
+
+    def normalized_adjacency(self) -> sp.csr_matrix:
+        """
+        Adjacency with each column divided by its total, so entry (s, t) is the fraction of
+        t's incoming absolute weight that comes from s (circuit-tracer's influence weighting).
+
+        Explicit zeros are dropped.
+        """
+        if self._normalized_adjacency is None:
+            adjacency = self.adjacency_matrix()
+            incoming = np.asarray(adjacency.sum(axis=0)).ravel()
+            scale = np.divide(1.0, incoming, out=np.zeros_like(incoming), where=incoming > 0)
+            normalized = adjacency.multiply(scale[None, :]).tocsr()
+            normalized.eliminate_zeros()
+            self._normalized_adjacency = normalized
+        return self._normalized_adjacency
 
-        # 2. Add betweenness centrality
+    def _to_networkx(self) -> nx.DiGraph:
+        """Build a weighted networkx view of the graph from the CSR arrays"""
         graph = nx.DiGraph()
-        graph.add_edges_from([
-            (e['source'], e['target'], {'weight': e['weight']})
-            for e in self.edges
-        ])
-        centrality = nx.betweenness_centrality(graph, weight='weight')
+        sources = np.repeat(np.arange(len(self.node_ids)), np.diff(self.out_indptr))
+        graph.add_weighted_edges_from(
+            (self.node_ids[s], self.node_ids[t], w)
+            for s, t, w in zip(sources.tolist(), self.out_indices.tolist(), self.out_weights.tolist())
+        )
+        return graph
+
+    @profiled('analysis.importance')
+    def compute_node_importance(self, method: str = "influence") -> Dict[str, float]:
+        """
+        Compute importance score for each node, normalized so the top node scores 1
 
-        for node_id, cent_score in centrality.items():
-            importance[node_id] = importance.get(node_id, 0) + cent_score * 0.5
+        - "influence": Total (direct + indirect) influence on the logits, weighted by
+          token probability, from one backward sweep over the DAG
+        - "centrality": Direct influence on target logits plus 0.5 * betweenness centrality
+          (how many paths flow through this node)
 
-        # 3. Normalize
-        max_score = max(importance.values()) if importance else 1.0
-        return {k: v/max_score for k, v in importance.items()}
+        Returns: {node_id: importance_score}
+        """
+        if method not in self._importance:
+            if method == "influence":
+                influence = self.influence_propagator.total_influence()
+                # Logits seed the sweep; only the nodes feeding them are ranked
+                influence[self.is_logit] = 0.0
+                importance = dict(zip(self.node_ids, influence.tolist()))
+            elif method == "centrality":
+                # 1. Direct logit influence
+                importance = dict(zip(self.node_ids, self.logit_influence.tolist()))
+
+                # 2. Add betweenness centrality
+                centrality = self.centrality.betweenness().scores
+
+                for node_id, cent_score in centrality.items():
+                    importance[node_id] = importance.get(node_id, 0) + cent_score * 0.5
+            else:
+                raise ValueError(f"Unknown importance method: {method}")
+
+            # 3. Normalize
+            max_score = max(importance.values()) if importance else 1.0
+            if max_score <= 0:
+                max_score = 1.0
+            self._importance[method] = {k: v/max_score for k, v in importance.items()}
+
+        return dict(self._importance[method])
 
     def identify_input_features(self, layer_threshold: int = 5) -> List[str]:
         """
@@ -63,11 +226,8 @@ class GraphAnalyzer:
 
         Returns: List of node IDs
         """
-        input_features = []
-        for node in self.nodes:
-            if node.get('layer', 0) <= layer_threshold:
-                input_features.append(node['id'])
-        return input_features
+        indices = np.flatnonzero(self.has_node_data & (self.layers <= layer_threshold))
+        return [self.node_ids[i] for i in indices]
 
     def identify_output_features(self, layer_threshold: int = 16) -> List[str]:
         """
@@ -76,66 +236,61 @@ class GraphAnalyzer:
 
         Returns: List of node IDs
         """
-        output_features = []
-        for node in self.nodes:
-            if node.get('layer', 0) >= layer_threshold:
-                output_features.append(node['id'])
-        return output_features
+        indices = np.flatnonzero(self.has_node_data & (self.layers >= layer_threshold))
+        return [self.node_ids[i] for i in indices]
+
+    @property
+    def influence_propagator(self) -> InfluencePropagator:
+        """Backward influence sweep over this graph (levelled once, reused across calls)"""
+        if self._influence_propagator is None:
+            self._influence_propagator = InfluencePropagator(self)
+        return self._influence_propagator
 
-    def trace_pathways(self, source_nodes: List[str], target_nodes: List[str]) -> List[Path]:
+    @property
+    def path_engine(self) -> PathEngine:
+        """Top-k path search over this graph (levelled once, reused across calls)"""
+        if self._path_engine is None:
+            self._path_engine = PathEngine(self)
+        return self._path_engine
+
+    def trace_pathways(self, source_nodes: Optional[List[str]] = None, target_nodes: Optional[List[str]] = None,
+                       k: int = 5, bottleneck_share: float = 0.5) -> List[Path]:
         """
-        Find strongest paths from source nodes (inputs) to target nodes (outputs)
+        Find the k strongest paths into each target node from any of the source nodes
 
         Path = {
             'nodes': [node_id1, node_id2, ...],
-            'total_influence': float,
-            'bottleneck_nodes': [nodes with high centrality]
+            'total_influence': float,  # product of normalized edge weights along the path
+            'bottleneck_nodes': [intermediate nodes carrying most of the target's path flow]
         }
 
+        All sources are searched at once (defaults: nodes without incoming edges as
+        sources, logit nodes as targets). A bottleneck is an intermediate node on more than
+        `bottleneck_share` of the total influence of its target's top-k paths, which is
+        read off the paths themselves rather than a separate betweenness pass.
+
         Returns: List of paths sorted by total_influence
         """
-        # Build graph
-        graph = nx.DiGraph()
-        graph.add_edges_from([
-            (e['source'], e['target'], {'weight': e['weight']})
-            for e in self.edges
-        ])
+        top_paths = self.path_engine.top_paths(source_nodes, target_nodes, k=k)
 
         paths = []
-        centrality = nx.betweenness_centrality(graph, weight='weight')
-
-        # Find paths between each source-target pair
-        for source in source_nodes:
-            for target in target_nodes:
-                if source in graph and target in graph:
-                    try:
-                        # Get shortest weighted path
-                        path_nodes = nx.shortest_path(
-                            graph,
-                            source,
-                            target,
-                            weight=lambda u, v, d: 1.0 / (d['weight'] + 1e-10)
-                        )
-
-                        # Calculate total influence along path
-                        total_influence = sum(
-                            graph[path_nodes[i]][path_nodes[i+1]]['weight']
-                            for i in range(len(path_nodes) - 1)
-                        )
-
-                        # Identify bottleneck nodes (high centrality nodes in path)
-                        bottlenecks = [
-                            node for node in path_nodes
-                            if centrality.get(node, 0) > 0.5
-                        ]
-
-                        paths.append(Path(
-                            nodes=path_nodes,
-                            total_influence=total_influence,
-                            bottleneck_nodes=bottlenecks
-                        ))
-                    except nx.NetworkXNoPath:
-                        continue
+        for target_paths in top_paths.values():
+            total = sum(strength for _, strength in target_paths)
+            flow: Dict[str, float] = {}
+            for path_nodes, strength in target_paths:
+                for node in path_nodes[1:-1]:
+                    flow[node] = flow.get(node, 0.0) + strength
+
+            for path_nodes, strength in target_paths:
+                bottlenecks = [
+                    node for node in path_nodes[1:-1]
+                    if total > 0 and flow[node] / total > bottleneck_share
+                ]
+                paths.append(Path(
+                    nodes=path_nodes,
+                    total_influence=strength,
+                    bottleneck_nodes=bottlenecks
+                ))
 
         # Sort by total influence
         paths.sort(key=lambda p: p.total_influence, reverse=True)
@@ -143,7 +298,7 @@ class GraphAnalyzer:
 
     def get_node(self, node_id: str) -> Dict:
         """Get node data by ID"""
-        for node in self.nodes:
-            if node['id'] == node_id:
-                return node
-        return None
+        idx = self.node_index.get(node_id)
+        if idx is None or not self.has_node_data[idx]:
+            return None
+        return self.graph_arrays.node(idx)
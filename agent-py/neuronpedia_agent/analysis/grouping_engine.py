@@ -1,8 +1,22 @@
 """Grouping module for creating supernodes from pinned nodes"""
 
+from collections import Counter
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
 from .graph_analyzer import GraphAnalyzer
+from ..embeddings import CachedEmbedder, DEFAULT_EMBEDDING_MODEL, VectorCache, get_embedder, normalize_rows
+from ..utils.profiling import profiled
+
+try:
+    import hdbscan
+except ImportError:  # pragma: no cover - optional dependency
+    hdbscan = None
+
+
+ROLES = ('input_detector', 'relational_processor', 'output_promoter')
 
 
 @dataclass
@@ -15,13 +29,116 @@ class Supernode:
     total_influence: float
 
 
+def cluster_vectors(vectors: np.ndarray, similarity_threshold: float = 0.7, method: str = "agglomerative",
+                    min_cluster_size: int = 2) -> np.ndarray:
+    """
+    Cluster unit-length row vectors by cosine similarity
+
+    - "agglomerative": Average-linkage clustering of the cosine distance matrix (one
+      matrix product), cut where clusters stop averaging similarity_threshold
+    - "hdbscan": HDBSCAN on the unit vectors (Euclidean distance is monotone in cosine);
+      noise points become singleton clusters
+
+    Returns: Cluster label per row (0-based, in order of first appearance)
+    """
+    n = len(vectors)
+    if n <= 1:
+        return np.zeros(n, dtype=np.int64)
+
+    if method == "hdbscan":
+        if hdbscan is None:
+            raise ImportError("hdbscan is required for HDBSCAN clustering")
+        labels = hdbscan.HDBSCAN(min_cluster_size=max(min_cluster_size, 2)).fit_predict(vectors)
+        noise = labels < 0
+        labels[noise] = labels.max() + 1 + np.arange(noise.sum())
+    elif method == "agglomerative":
+        distance = np.clip(1.0 - vectors @ vectors.T, 0.0, 2.0)
+        np.fill_diagonal(distance, 0.0)
+        tree = linkage(squareform(distance, checks=False), method='average')
+        labels = fcluster(tree, t=1.0 - similarity_threshold, criterion='distance')
+    else:
+        raise ValueError(f"Unknown clustering method: {method}")
+
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    return rank[inverse]
+
+
+def segment_layers(values: np.ndarray, num_groups: int, min_size: int = 1,
+                   max_size: Optional[int] = None) -> np.ndarray:
+    """
+    Optimal contiguous segmentation of sorted values (1-D k-means by dynamic programming)
+
+    Minimizes the total within-segment sum of squared deviations over segmentations into
+    num_groups segments of min_size..max_size values. When that count is infeasible the
+    nearest feasible count is used; when no count satisfies both bounds, min_size is
+    relaxed. Segment costs come from prefix sums, and each (group count, segment length)
+    step is one vectorized relaxation, so the DP is O(num_groups * n * (max_size - min_size)).
+
+    Returns: Segment boundaries [0, b1, ..., n]
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    max_size = n if max_size is None else max(min(max_size, n), 1)
+    min_size = max(min(min_size, max_size), 1)
+    fewest, most = -(-n // max_size), n // min_size
+    if fewest > most:
+        min_size, most = 1, n
+    k_total = int(np.clip(num_groups, fewest, most))
+
+    s1 = np.concatenate([[0.0], np.cumsum(values)])
+    s2 = np.concatenate([[0.0], np.cumsum(values * values)])
+
+    cost = np.full((k_total + 1, n + 1), np.inf)
+    back = np.zeros((k_total + 1, n + 1), dtype=np.int64)
+    cost[0, 0] = 0.0
+    for k in range(1, k_total + 1):
+        for length in range(min_size, max_size + 1):
+            end = np.arange(length, n + 1)
+            start = end - length
+            spread = s2[end] - s2[start] - (s1[end] - s1[start]) ** 2 / length
+            candidate = cost[k - 1, start] + spread
+            better = candidate < cost[k, end]
+            cost[k, end[better]] = candidate[better]
+            back[k, end[better]] = start[better]
+
+    bounds = [n]
+    for k in range(k_total, 0, -1):
+        bounds.append(int(back[k, bounds[-1]]))
+    return np.array(bounds[::-1], dtype=np.int64)
+
+
 class GroupingEngine:
     """Group pinned nodes into supernodes representing functional modules"""
 
-    def __init__(self, analyzer: GraphAnalyzer, pinned_nodes: List[str]):
+    def __init__(self, analyzer: GraphAnalyzer, pinned_nodes: List[str], embedder=None,
+                 vector_cache: Optional[VectorCache] = None, similarity_threshold: float = 0.7,
+                 min_group_size: int = 2, max_group_size: int = 8, clustering: str = "agglomerative",
+                 target_num_groups: int = 5):
+        """
+        Semantic, hybrid and layer grouping settings:
+
+        - embedder: Embedder for feature explanations (default: the configured
+          sentence-transformers model, or the offline hashing embedder when it is missing)
+        - vector_cache: Persistent per-feature vector store shared across graphs
+        - similarity_threshold: Average cosine similarity for features to share a supernode
+        - min_group_size / max_group_size: Smaller clusters are regrouped functionally,
+          larger ones split in layer order; hard bounds for layer grouping
+        - clustering: "agglomerative" or "hdbscan"
+        - target_num_groups: Number of layer-grouping supernodes (nearest feasible count)
+        """
         self.analyzer = analyzer
         self.pinned_nodes = pinned_nodes
+        self.embedder = embedder
+        self.vector_cache = vector_cache
+        self.similarity_threshold = similarity_threshold
+        self.min_group_size = min_group_size
+        self.max_group_size = max_group_size
+        self.clustering = clustering
+        self.target_num_groups = target_num_groups
 
+    @profiled('analysis.group')
     def create_supernodes(self, strategy: str = "functional") -> List[Supernode]:
         """
         Group nodes into supernodes using:
@@ -44,7 +161,36 @@ class GroupingEngine:
         else:
             raise ValueError(f"Unknown strategy: {strategy}")
 
-    def _functional_grouping(self) -> List[Supernode]:
+    def _indices(self, node_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """The given nodes that have node data, in order, and their analyzer indices"""
+        analyzer = self.analyzer
+        kept, indices = [], []
+        for node_id in node_ids:
+            idx = analyzer.node_index.get(node_id)
+            if idx is not None and analyzer.has_node_data[idx]:
+                kept.append(node_id)
+                indices.append(idx)
+        return kept, np.array(indices, dtype=np.int64)
+
+    def _role_codes(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Index into ROLES of each node's functional role:
+        - Output promoter: late layer (16+) and direct logit influence above 0.1
+        - Input detector: early layer (0-5)
+        - Relational processor: everything else
+        """
+        layers = self.analyzer.layers[indices]
+        codes = np.full(len(indices), ROLES.index('relational_processor'), dtype=np.int64)
+        codes[layers <= 5] = ROLES.index('input_detector')
+        codes[(layers >= 16) & (self.analyzer.logit_influence[indices] > 0.1)] = ROLES.index('output_promoter')
+        return codes
+
+    def _classify(self, node_id: str) -> Optional[str]:
+        """Functional role of a node (None when it has no node data)"""
+        _, indices = self._indices([node_id])
+        return ROLES[self._role_codes(indices)[0]] if len(indices) else None
+
+    def _functional_grouping(self, node_ids: Optional[List[str]] = None) -> List[Supernode]:
         """
         Classify each node by role:
         - Input detectors: Activate on specific input tokens, early layers
@@ -52,130 +198,191 @@ class GroupingEngine:
         - Output promoters: Boost specific output tokens, late layers
 
         Group nodes with the same role and strong interconnections
+
+        node_ids: Nodes to group (default: all pinned nodes)
         """
+        node_ids, indices = self._indices(self.pinned_nodes if node_ids is None else node_ids)
+        codes = self._role_codes(indices)
+
+        # Create supernodes for each role
         supernodes = []
+        for code, role in enumerate(ROLES):
+            members = np.flatnonzero(codes == code)
+            supernodes.extend(self._layer_proximity_groups([node_ids[i] for i in members], role))
 
-        # Classify nodes by role
-        roles = {
-            'input_detector': [],
-            'relational_processor': [],
-            'output_promoter': []
-        }
+        return supernodes
 
-        for node_id in self.pinned_nodes:
-            node = self.analyzer.get_node(node_id)
-            if not node:
-                continue
+    def _layer_proximity_groups(self, node_list: List[str], role: str) -> List[Supernode]:
+        """Split one role's nodes into supernodes of nodes within 3 layers of each other"""
+        if not node_list:
+            return []
 
-            layer = node.get('layer', 0)
-
-            # Check if it's an output promoter (late layer + high logit influence)
-            if layer >= 16:
-                logit_influence = sum(
-                    e['weight'] for e in self.analyzer.edges
-                    if e['source'] == node_id and e['target'].startswith('logit_')
-                )
-                if logit_influence > 0.1:
-                    roles['output_promoter'].append(node_id)
-                    continue
-
-            # Check if it's an input detector (early layer)
-            if layer <= 5:
-                roles['input_detector'].append(node_id)
-                continue
+        if len(node_list) <= 3:
+            # Small enough to be one supernode
+            return [self._make_supernode(node_list, role)]
 
-            # Otherwise it's a middle processor
-            roles['relational_processor'].append(node_id)
+        # Further subdivide by layer proximity: a group spans at most 3 layers from its first node
+        _, indices = self._indices(node_list)
+        order = np.argsort(self.analyzer.layers[indices], kind='stable')
+        layers = self.analyzer.layers[indices][order].tolist()
+        sorted_nodes = [node_list[i] for i in order]
 
-        # Create supernodes for each role
-        for role, node_list in roles.items():
-            if not node_list:
-                continue
+        supernodes = []
+        start = 0
+        for i in range(1, len(layers)):
+            if layers[i] - layers[start] > 3:
+                supernodes.append(self._make_supernode(sorted_nodes[start:i], role))
+                start = i
+        supernodes.append(self._make_supernode(sorted_nodes[start:], role))
+
+        return supernodes
+
+    def _make_supernode(self, node_ids: List[str], role: str) -> Supernode:
+        """Build an unlabeled supernode with its layer range and total outgoing influence"""
+        indices = np.array([self.analyzer.node_index[nid] for nid in node_ids], dtype=np.int64)
+        layers = self.analyzer.layers[indices]
+        return Supernode(
+            label="",  # To be filled by AutoLabeler
+            node_ids=node_ids,
+            layer_range=(int(layers.min()), int(layers.max())),
+            functional_role=role,
+            total_influence=float(self.analyzer.out_strength[indices].sum())
+        )
+
+    def _semantic_grouping(self) -> List[Supernode]:
+        """
+        Use feature explanations to group:
+        1. Batch-embed each feature's explanation (cached per feature across graphs)
+        2. Cluster embeddings by cosine similarity (average linkage or HDBSCAN)
+        3. Split clusters above max_group_size in layer order; each supernode takes its
+           members' most common functional role
+
+        Nodes without an explanation, and clusters below min_group_size, are grouped
+        functionally.
+        """
+        texts = self._explanations(self.pinned_nodes)
+        supernodes, leftover = self._semantic_clusters([nid for nid in self.pinned_nodes if nid in texts], texts)
+        leftover += [nid for nid in self.pinned_nodes if nid not in texts]
+        supernodes += self._functional_grouping(leftover)
+        return sorted(supernodes, key=lambda s: s.layer_range)
+
+    def _layer_grouping(self) -> List[Supernode]:
+        """
+        Group nodes by layer proximity:
+        1. Sort pinned nodes by (layer, ctx_idx)
+        2. Cut the sorted order into the contiguous groups that minimize the summed squared
+           layer spread (segment_layers), with every group between min_group_size and
+           max_group_size nodes and target_num_groups groups (nearest feasible count)
+        3. Each supernode takes its members' most common functional role; influence totals
+           come from one bincount over the per-node outgoing-weight sums
+        """
+        analyzer = self.analyzer
+        node_ids, indices = self._indices(self.pinned_nodes)
+        if not node_ids:
+            return []
+
+        order = np.lexsort((analyzer.ctx_idx[indices], analyzer.layers[indices]))
+        indices = indices[order]
+        layers = analyzer.layers[indices]
+        bounds = segment_layers(layers.astype(float), self.target_num_groups, self.min_group_size,
+                                self.max_group_size)
 
-            # Get layer range
-            layers = [self.analyzer.get_node(nid).get('layer', 0) for nid in node_list]
-            min_layer = min(layers)
-            max_layer = max(layers)
+        group = np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+        totals = np.bincount(group, weights=analyzer.out_strength[indices])
+        role_counts = np.zeros((len(bounds) - 1, len(ROLES)), dtype=np.int64)
+        np.add.at(role_counts, (group, self._role_codes(indices)), 1)
+        starts = bounds[:-1]
+        low = np.minimum.reduceat(layers, starts)
+        high = np.maximum.reduceat(layers, starts)
 
-            # Calculate total influence
-            total_influence = sum(
-                sum(e['weight'] for e in self.analyzer.edges if e['source'] == nid)
-                for nid in node_list
+        return [
+            Supernode(
+                label="",  # To be filled by AutoLabeler
+                node_ids=[node_ids[order[i]] for i in range(start, stop)],
+                layer_range=(int(low[g]), int(high[g])),
+                functional_role=ROLES[int(role_counts[g].argmax())],
+                total_influence=float(totals[g])
             )
+            for g, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))
+        ]
 
-            if len(node_list) <= 3:
-                # Small enough to be one supernode
-                supernodes.append(Supernode(
-                    label="",  # To be filled by AutoLabeler
-                    node_ids=node_list,
-                    layer_range=(min_layer, max_layer),
-                    functional_role=role,
-                    total_influence=total_influence
-                ))
-            else:
-                # Further subdivide by layer proximity
-                # Group nodes within 3 layers of each other
-                sorted_nodes = sorted(node_list, key=lambda nid: self.analyzer.get_node(nid).get('layer', 0))
-
-                current_group = [sorted_nodes[0]]
-                current_layer = self.analyzer.get_node(sorted_nodes[0]).get('layer', 0)
-
-                for nid in sorted_nodes[1:]:
-                    node_layer = self.analyzer.get_node(nid).get('layer', 0)
-
-                    if node_layer - current_layer <= 3:
-                        current_group.append(nid)
-                    else:
-                        # Save current group and start new one
-                        group_layers = [self.analyzer.get_node(n).get('layer', 0) for n in current_group]
-                        group_influence = sum(
-                            sum(e['weight'] for e in self.analyzer.edges if e['source'] == n)
-                            for n in current_group
-                        )
-                        supernodes.append(Supernode(
-                            label="",
-                            node_ids=current_group,
-                            layer_range=(min(group_layers), max(group_layers)),
-                            functional_role=role,
-                            total_influence=group_influence
-                        ))
-                        current_group = [nid]
-                        current_layer = node_layer
-
-                # Add final group
-                if current_group:
-                    group_layers = [self.analyzer.get_node(n).get('layer', 0) for n in current_group]
-                    group_influence = sum(
-                        sum(e['weight'] for e in self.analyzer.edges if e['source'] == n)
-                        for n in current_group
-                    )
-                    supernodes.append(Supernode(
-                        label="",
-                        node_ids=current_group,
-                        layer_range=(min(group_layers), max(group_layers)),
-                        functional_role=role,
-                        total_influence=group_influence
-                    ))
+    def _hybrid_grouping(self) -> List[Supernode]:
+        """
+        Combination of functional and semantic grouping: nodes are split by functional
+        role, then clustered semantically within each role. Nodes without an explanation,
+        and clusters below min_group_size, are grouped by layer proximity within the role.
+        """
+        texts = self._explanations(self.pinned_nodes)
+        roles = {role: [] for role in ROLES}
+        for node_id in self.pinned_nodes:
+            role = self._classify(node_id)
+            if role is not None:
+                roles[role].append(node_id)
 
+        supernodes = []
+        for role, node_list in roles.items():
+            clustered, leftover = self._semantic_clusters([nid for nid in node_list if nid in texts], texts)
+            supernodes += clustered
+            leftover += [nid for nid in node_list if nid not in texts]
+            supernodes += self._layer_proximity_groups(sorted(leftover, key=self.analyzer.layer_of), role)
         return supernodes
 
-    def _semantic_grouping(self) -> List[Supernode]:
+    def _explanations(self, node_ids: List[str]) -> Dict[str, str]:
+        """Non-empty explanation (clerp) per node"""
+        texts = {}
+        for node_id in node_ids:
+            node = self.analyzer.get_node(node_id)
+            if node:
+                text = (node.get('explanation') or node.get('clerp') or '').strip()
+                if text:
+                    texts[node_id] = text
+        return texts
+
+    def _feature_key(self, node_id: str) -> str:
         """
-        Use feature explanations and max-activating examples to group:
-        1. Embed each feature's explanation using sentence-transformers
-        2. Cluster embeddings using HDBSCAN or hierarchical clustering
-        3. Validate clusters by checking if features have similar activation patterns
+        Cache key identifying a feature across graphs: model/layer/feature index, so the
+        same feature at other context positions or in other graphs shares one vector
         """
-        # TODO: Implement semantic grouping using embeddings
-        # For now, fall back to functional grouping
-        return self._functional_grouping()
+        node = self.analyzer.get_node(node_id) or {}
+        feature = node.get('feature_index', node.get('feature'))
+        if feature is None or node.get('feature_type') in ('logit', 'mlp reconstruction error', 'embedding'):
+            return f"node/{node_id}"
+        graph = self.analyzer.graph_arrays
+        model = (graph.metadata.get('scan') if graph is not None else None) or ''
+        return f"{model}/{self.analyzer.layer_of(node_id)}/{feature}"
 
-    def _layer_grouping(self) -> List[Supernode]:
-        """Group nodes by layer proximity"""
-        # TODO: Implement layer-based grouping
-        return self._functional_grouping()
+    def _embed(self, node_ids: List[str], texts: Dict[str, str]) -> np.ndarray:
+        embedder = self.embedder if self.embedder is not None else get_embedder(DEFAULT_EMBEDDING_MODEL)
+        vectors = CachedEmbedder(embedder, self.vector_cache).embed(
+            [self._feature_key(nid) for nid in node_ids], [texts[nid] for nid in node_ids]
+        )
+        if embedder.reweight_idf and len(vectors):
+            # IDF over the features being grouped, so shared boilerplate words count less
+            df = (vectors != 0).sum(axis=0)
+            vectors = normalize_rows(vectors * (np.log((1 + len(vectors)) / (1 + df)) + 1.0))
+        return vectors
 
-    def _hybrid_grouping(self) -> List[Supernode]:
-        """Combination of functional and semantic grouping"""
-        # TODO: Implement hybrid grouping
-        return self._functional_grouping()
+    def _semantic_clusters(self, node_ids: List[str], texts: Dict[str, str]) -> Tuple[List[Supernode], List[str]]:
+        """
+        Supernodes from clustering the nodes' explanations
+
+        Returns: (supernodes, nodes left over in clusters below min_group_size)
+        """
+        if not node_ids:
+            return [], []
+        labels = cluster_vectors(self._embed(node_ids, texts), self.similarity_threshold, self.clustering,
+                                 self.min_group_size)
+
+        supernodes, leftover = [], []
+        for label in range(labels.max() + 1):
+            members = [nid for nid, l in zip(node_ids, labels) if l == label]
+            if len(members) < self.min_group_size:
+                leftover += members
+                continue
+            role = Counter(self._classify(nid) for nid in members).most_common(1)[0][0]
+            members.sort(key=self.analyzer.layer_of)
+            # Even split into as few layer-ordered chunks as max_group_size allows
+            num_chunks = -(-len(members) // self.max_group_size)
+            for chunk in np.array_split(np.arange(len(members)), num_chunks):
+                supernodes.append(self._make_supernode([members[i] for i in chunk], role))
+        return supernodes, leftover
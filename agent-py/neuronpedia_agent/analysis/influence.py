@@ -0,0 +1,98 @@
+"""Backward influence propagation over the attribution DAG"""
+
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+
+from ..utils.profiling import profiled
+
+if TYPE_CHECKING:
+    from .graph_analyzer import GraphAnalyzer
+
+
+class InfluencePropagator:
+    """
+    Total (direct + indirect) influence of every node on a set of targets.
+
+    With A the normalized adjacency (see GraphAnalyzer.normalized_adjacency), the
+    influence of the nodes on targets seeded in R is X = R + A X, i.e. the sum over all
+    paths of the product of edge fractions. On a DAG this is solved exactly by one
+    backward sweep in topological order: a level's rows only reference later levels,
+    which are already final. Nodes are permuted so that every level is a contiguous row
+    block, and each block is a single sparse-times-dense product, so a sweep touches each
+    edge once per right-hand side column, O(E·k) for k targets solved together.
+    """
+
+    @profiled('analysis.influence_setup')
+    def __init__(self, analyzer: 'GraphAnalyzer'):
+        self.analyzer = analyzer
+        levels = analyzer.path_engine.levels()
+        order = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+        self._order = order
+        self._position = np.empty_like(order)
+        self._position[order] = np.arange(len(order))
+
+        permuted = analyzer.normalized_adjacency()[order][:, order].tocsr()
+        bounds = np.cumsum([0] + [len(level) for level in levels])
+        # Row blocks for every level that has outgoing edges, last level first
+        self._blocks: List[Tuple[int, int, sp.csr_matrix]] = [
+            (int(start), int(stop), permuted[start:stop])
+            for start, stop in zip(bounds[-2::-1], bounds[:0:-1])
+            if permuted.indptr[stop] > permuted.indptr[start]
+        ]
+
+    @profiled('analysis.influence_sweep')
+    def propagate(self, rhs: np.ndarray) -> np.ndarray:
+        """
+        Solve X = rhs + A X for one (n,) or many (n, k) right-hand sides
+
+        Column j of rhs seeds the targets of the j-th problem (e.g. a one-hot logit);
+        the result has the same shape, indexed like analyzer.node_ids.
+        """
+        rhs = np.asarray(rhs, dtype=np.float64)
+        x = rhs[self._order].copy()
+        for start, stop, block in self._blocks:
+            x[start:stop] += block @ x
+        result = np.empty_like(x)
+        result[self._order] = x
+        return result
+
+    def logit_influence(self, logits: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, List[str]]:
+        """
+        Influence of every node on each logit, all logits solved in one sweep
+
+        - logits: Logit node IDs (default: every logit node)
+
+        Returns: (matrix of shape (num_nodes, num_logits), logit IDs in column order);
+        a logit's own entry in its column is 1
+        """
+        analyzer = self.analyzer
+        if logits is None:
+            columns = np.flatnonzero(analyzer.is_logit)
+        else:
+            columns = np.array([analyzer.node_index[l] for l in logits if l in analyzer.node_index], dtype=np.int64)
+        rhs = np.zeros((len(analyzer.node_ids), len(columns)))
+        rhs[columns, np.arange(len(columns))] = 1.0
+        return self.propagate(rhs), [analyzer.node_ids[i] for i in columns]
+
+    def total_influence(self, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Influence of every node on the logits combined, weighted by token probability
+
+        weights: Per-node target weight (default: token_prob on logits, uniform when
+        probabilities are missing), summing to 1
+        """
+        if weights is None:
+            weights = self.logit_weights()
+        return self.propagate(weights)
+
+    def logit_weights(self) -> np.ndarray:
+        """Token probabilities of the logit nodes, normalized (uniform when missing)"""
+        analyzer = self.analyzer
+        weights = analyzer.is_logit.astype(float)
+        for idx in np.flatnonzero(analyzer.is_logit):
+            node = analyzer.get_node(analyzer.node_ids[idx])
+            if node and node.get('token_prob'):
+                weights[idx] = node['token_prob']
+        total = weights.sum()
+        return weights / total if total > 0 else weights
@@ -1,16 +1,40 @@
 """Node selection module for choosing which nodes to pin"""
 
 from typing import List
+import numpy as np
 from .graph_analyzer import GraphAnalyzer
+from ..utils.profiling import profiled
 
 
 class NodeSelector:
     """Automatically select which nodes to pin based on importance and interpretability"""
 
-    def __init__(self, analyzer: GraphAnalyzer, max_nodes: int = 30):
+    def __init__(self, analyzer: GraphAnalyzer, max_nodes: int = 30, num_target_logits: int = 5,
+                 paths_per_logit: int = 5, importance: str = "influence", metrics=None,
+                 replacement_weight: float = 1.0, completeness_weight: float = 1.0,
+                 max_paths_per_logit: int = 640):
+        """
+        paths_per_logit: Strongest paths first traced into each target logit; the pathway
+        strategy doubles it while the paths cover fewer than max_nodes nodes, up to
+        max_paths_per_logit
+        importance: Node importance method for the importance and balanced strategies
+        ("influence" or "centrality", see GraphAnalyzer.compute_node_importance)
+        metrics: MetricsCalculator over the same analyzer for the optimize strategy to reuse
+        (built on demand otherwise)
+        replacement_weight / completeness_weight: Objective weights of the optimize strategy
+        (see GreedyOptimizer)
+        """
         self.analyzer = analyzer
         self.max_nodes = max_nodes
-
+        self.num_target_logits = num_target_logits
+        self.paths_per_logit = paths_per_logit
+        self.max_paths_per_logit = max(max_paths_per_logit, paths_per_logit)
+        self.importance = importance
+        self.metrics = metrics
+        self.replacement_weight = replacement_weight
+        self.completeness_weight = completeness_weight
+
+    @profiled('analysis.select')
     def select_nodes_for_pinning(self, strategy: str = "pathway") -> List[str]:
         """
         Select nodes to pin using one of several strategies:
@@ -18,6 +42,7 @@ class NodeSelector:
         - "pathway": Follow strongest paths from input to output
         - "importance": Select top-N most important nodes globally
         - "balanced": Mix of input features, middle processing, output features
+        - "optimize": Greedily add the node with the largest gain in replacement + completeness
 
         Returns: List of node IDs to pin
         """
@@ -27,42 +52,61 @@ class NodeSelector:
             return self._importance_strategy()
         elif strategy == "balanced":
             return self._balanced_strategy()
+        elif strategy == "optimize":
+            return self._optimize_strategy()
         else:
             raise ValueError(f"Unknown strategy: {strategy}")
 
     def _pathway_strategy(self) -> List[str]:
         """
-        1. Identify top 3-5 target logits
-        2. Find input features in early layers
-        3. Trace strongest paths between them
-        4. Select nodes on these paths, prioritizing bottlenecks
+        1. Identify top target logits
+        2. Use every input feature in early layers as a path source
+        3. Find the strongest paths into each target logit (one pass over the DAG)
+        4. Select nodes on these paths, strongest paths first, prioritizing bottlenecks
         """
-        # Get input and output features
         input_features = self.analyzer.identify_input_features(layer_threshold=5)
-        output_features = self.analyzer.identify_output_features(layer_threshold=16)
-
-        # Trace paths
-        paths = self.analyzer.trace_pathways(
-            input_features[:10],  # Sample top 10 input features
-            output_features[:10]   # Sample top 10 output features
-        )
-
-        # Collect nodes from strongest paths
-        selected_nodes = set()
-        for path in paths:
-            # Prioritize bottleneck nodes
-            selected_nodes.update(path.bottleneck_nodes)
-            # Add other nodes from path
-            selected_nodes.update(path.nodes)
-
-            if len(selected_nodes) >= self.max_nodes:
-                break
-
-        return list(selected_nodes)[:self.max_nodes]
+        targets = self._target_logits()
+        if not targets:
+            targets = self.analyzer.identify_output_features(layer_threshold=16)
+
+        # Widen the search until the paths cover max_nodes, no more paths exist, a wider
+        # search adds no node or k reaches its cap (path counts grow exponentially with depth)
+        k = self.paths_per_logit
+        covered = -1
+        while True:
+            paths = self.analyzer.trace_pathways(input_features, targets, k=k)
+
+            # Collect nodes from strongest paths (dict keeps insertion order)
+            selected_nodes = {}
+            for path in paths:
+                # Prioritize bottleneck nodes, then add other nodes from path
+                for node_id in path.bottleneck_nodes + path.nodes:
+                    selected_nodes.setdefault(node_id, None)
+
+                if len(selected_nodes) >= self.max_nodes:
+                    break
+
+            if (len(selected_nodes) >= self.max_nodes or len(paths) < k * len(targets)
+                    or len(selected_nodes) == covered or k >= self.max_paths_per_logit):
+                return list(selected_nodes)[:self.max_nodes]
+            covered = len(selected_nodes)
+            k = min(k * 2, self.max_paths_per_logit)
+
+    def _target_logits(self) -> List[str]:
+        """Top logits by token probability, or by incoming influence when probabilities are missing"""
+        logits = np.flatnonzero(self.analyzer.is_logit)
+        incoming = np.asarray(self.analyzer.adjacency_matrix().sum(axis=0)).ravel()
+
+        def rank(idx: int):
+            node = self.analyzer.get_node(self.analyzer.node_ids[idx]) or {}
+            return (node.get('token_prob') or 0.0, incoming[idx])
+
+        ranked = sorted(logits.tolist(), key=rank, reverse=True)
+        return [self.analyzer.node_ids[i] for i in ranked[:self.num_target_logits]]
 
     def _importance_strategy(self) -> List[str]:
         """Select top-N most important nodes globally"""
-        importance = self.analyzer.compute_node_importance()
+        importance = self.analyzer.compute_node_importance(self.importance)
 
         # Sort by importance and take top N
         sorted_nodes = sorted(
@@ -80,7 +124,7 @@ class NodeSelector:
         - 40% middle processing (layers 6-15)
         - 30% output features (layers 16+)
         """
-        importance = self.analyzer.compute_node_importance()
+        importance = self.analyzer.compute_node_importance(self.importance)
 
         # Categorize nodes by layer
         input_nodes = []
@@ -88,9 +132,9 @@ class NodeSelector:
         output_nodes = []
 
         for node_id, imp_score in importance.items():
-            node = self.analyzer.get_node(node_id)
-            if node:
-                layer = node.get('layer', 0)
+            idx = self.analyzer.index_of(node_id)
+            if idx is not None and self.analyzer.has_node_data[idx]:
+                layer = int(self.analyzer.layers[idx])
                 if layer <= 5:
                     input_nodes.append((node_id, imp_score))
                 elif layer <= 15:
@@ -114,3 +158,12 @@ class NodeSelector:
         selected.extend([node_id for node_id, _ in output_nodes[:num_output]])
 
         return selected
+
+    def _optimize_strategy(self) -> List[str]:
+        """Pick nodes one at a time by marginal gain in replacement and completeness"""
+        from ..optimization.greedy import GreedyOptimizer
+        from ..optimization.metrics import MetricsCalculator
+
+        metrics = self.metrics if self.metrics is not None else MetricsCalculator({}, {}, analyzer=self.analyzer)
+        return GreedyOptimizer(metrics, replacement_weight=self.replacement_weight,
+                               completeness_weight=self.completeness_weight).select(self.max_nodes)
@@ -0,0 +1,342 @@
+"""Local cumulative-influence pruning (circuit-tracer's node_threshold / edge_threshold)"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+from .graph_analyzer import GraphAnalyzer
+from ..storage.arrays import EMBEDDING_LAYER, GraphArrays
+from ..utils.profiling import profiled, span
+
+
+@dataclass
+class PruneResult:
+    """A pruned graph and what was kept of the original"""
+    graph: GraphArrays
+    node_mask: np.ndarray        # Kept nodes, indexed like the original graph
+    link_mask: np.ndarray        # Kept links, indexed like the original graph
+    node_influence: np.ndarray   # Influence of every original node on the (weighted) logits
+    node_threshold: float
+    edge_threshold: float
+
+    @property
+    def node_ratio(self) -> float:
+        return float(self.node_mask.mean()) if len(self.node_mask) else 1.0
+
+    @property
+    def edge_ratio(self) -> float:
+        return float(self.link_mask.mean()) if len(self.link_mask) else 1.0
+
+
+def cumulative_mask(scores: np.ndarray, threshold: float):
+    """
+    Smallest set of highest scores whose sum reaches `threshold` of the total
+
+    Returns: (boolean mask of the kept entries, each entry's cumulative share when ranked
+    by score, in (0, 1]); a threshold ≥ 1 or an all-zero score vector keeps everything
+    """
+    n = len(scores)
+    order = np.argsort(-scores, kind='stable')
+    cumulative = np.cumsum(scores[order])
+    total = cumulative[-1] if n else 0.0
+    share = np.ones(n)
+    mask = np.ones(n, dtype=bool)
+    if total <= 0:
+        return mask, share
+    share[order] = cumulative / total
+    if threshold < 1:
+        keep = min(int(np.searchsorted(cumulative, threshold * total, side='left')) + 1, n)
+        mask[:] = False
+        mask[order[:keep]] = True
+    return mask, share
+
+
+def _always_kept(graph: GraphArrays, is_logit: np.ndarray) -> np.ndarray:
+    """Embeddings and logits, which pruning never drops"""
+    return is_logit | (graph.layer == EMBEDDING_LAYER) | (graph.feature_type == graph.type_code('embedding'))
+
+
+def _is_error(graph: GraphArrays) -> np.ndarray:
+    return graph.feature_type == graph.type_code('mlp reconstruction error')
+
+
+def _edge_scores(graph: GraphArrays, node_mask: np.ndarray, source: np.ndarray, target: np.ndarray):
+    """
+    Edge influence over the node-pruned graph, so edges into dropped nodes carry nothing
+
+    Returns: (indices of the links between kept nodes, their scores: the fraction of the
+    target's incoming absolute weight the edge carries times the target's influence)
+    """
+    pruned = graph.subset(node_mask)
+    propagator = GraphAnalyzer.from_arrays(pruned).influence_propagator
+    pruned_influence = propagator.total_influence(propagator.logit_weights())
+
+    rows = np.flatnonzero(node_mask)
+    local = np.full(graph.num_nodes, -1, dtype=np.int64)
+    local[rows] = np.arange(len(rows))
+    links = np.flatnonzero(node_mask[source] & node_mask[target])
+    magnitude = np.abs(graph.link_weight[links]).astype(np.float64)
+    local_target = local[target[links]]
+    incoming = np.bincount(local_target, weights=magnitude, minlength=len(rows))
+    fraction = np.divide(magnitude, incoming[local_target], out=np.zeros_like(magnitude),
+                         where=incoming[local_target] > 0)
+    return links, fraction * pruned_influence[local_target]
+
+
+def _drop_dangling(node_mask: np.ndarray, link_mask: np.ndarray, source: np.ndarray, target: np.ndarray,
+                   always: np.ndarray, is_error: np.ndarray):
+    """
+    Drop features and error nodes without a kept outgoing edge, and features without a
+    kept incoming edge, until nothing changes
+
+    Returns: (node mask, link mask restricted to links between the remaining nodes)
+    """
+    n = len(node_mask)
+    while True:
+        live = link_mask & node_mask[source] & node_mask[target]
+        has_out = np.bincount(source[live], minlength=n) > 0
+        has_in = np.bincount(target[live], minlength=n) > 0
+        kept = node_mask & (always | (has_out & (has_in | is_error)))
+        if np.array_equal(kept, node_mask):
+            return node_mask, live
+        node_mask = kept
+
+
+@profiled('analysis.prune')
+def prune_graph(graph: GraphArrays, node_threshold: float = 0.8, edge_threshold: float = 0.98,
+                analyzer: Optional[GraphAnalyzer] = None) -> PruneResult:
+    """
+    Prune a graph the way circuit-tracer does before upload, but locally
+
+    1. Node influence: total (direct + indirect) influence of every node on the logits,
+       weighted by token probability (InfluencePropagator). The highest-influence nodes
+       covering node_threshold of the total are kept, plus every embedding and logit.
+    2. Edge influence, recomputed on the node-pruned graph: the fraction of its target's
+       incoming absolute weight an edge carries, times the target's influence. The
+       highest-scoring edges covering edge_threshold of the total are kept.
+    3. Features and error nodes left without a kept outgoing edge, and features left
+       without a kept incoming edge, are dropped, repeated until nothing changes.
+
+    The pruned graph keeps the original's layout; node `influence` is rewritten as the
+    Neuronpedia-style cumulative share (lower = more influential, NaN on logits) and
+    metadata.pruning_settings records the thresholds.
+
+    - analyzer: GraphAnalyzer already built on `graph` (built here when omitted)
+    """
+    analyzer = analyzer if analyzer is not None else GraphAnalyzer.from_arrays(graph)
+    propagator = analyzer.influence_propagator
+    weights = propagator.logit_weights()
+    influence = propagator.total_influence(weights) - weights
+
+    is_logit = analyzer.is_logit
+    always, is_error = _always_kept(graph, is_logit), _is_error(graph)
+    source = graph.link_source.astype(np.int64)
+    target = graph.link_target.astype(np.int64)
+
+    with span('analysis.prune_nodes'):
+        node_mask, share = cumulative_mask(influence, node_threshold)
+        node_mask |= always
+
+    with span('analysis.prune_edges'):
+        links, scores = _edge_scores(graph, node_mask, source, target)
+        edge_keep, _ = cumulative_mask(scores, edge_threshold)
+        link_mask = np.zeros(graph.num_links, dtype=bool)
+        link_mask[links[edge_keep]] = True
+
+    with span('analysis.prune_dangling'):
+        node_mask, link_mask = _drop_dangling(node_mask, link_mask, source, target, always, is_error)
+
+    result = graph.subset(node_mask, link_mask)
+    cumulative = share[node_mask].astype(np.float32)
+    cumulative[is_logit[node_mask]] = np.nan
+    result.influence = cumulative
+    metadata = dict(result.extra.get('metadata') or {})
+    metadata['node_threshold'] = node_threshold
+    metadata['pruning_settings'] = {'node_threshold': node_threshold, 'edge_threshold': edge_threshold}
+    result.extra['metadata'] = metadata
+
+    return PruneResult(graph=result, node_mask=node_mask, link_mask=link_mask, node_influence=influence,
+                       node_threshold=node_threshold, edge_threshold=edge_threshold)
+
+
+# Default sweep grid; 1.0 keeps everything, so the last cell is the unpruned graph
+DEFAULT_NODE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+DEFAULT_EDGE_THRESHOLDS = (0.8, 0.9, 0.95, 0.98, 1.0)
+
+
+@dataclass
+class ThresholdSweep:
+    """
+    Pruned-graph size and quality over a grid of thresholds
+
+    Every array is indexed [node threshold, edge threshold].
+    """
+    node_thresholds: np.ndarray
+    edge_thresholds: np.ndarray
+    num_nodes: np.ndarray
+    num_edges: np.ndarray
+    replacement: np.ndarray
+    completeness: np.ndarray
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One record per grid cell, node threshold major"""
+        return [
+            {
+                'node_threshold': float(node_threshold),
+                'edge_threshold': float(edge_threshold),
+                'num_nodes': int(self.num_nodes[i, j]),
+                'num_edges': int(self.num_edges[i, j]),
+                'replacement_score': float(self.replacement[i, j]),
+                'completeness_score': float(self.completeness[i, j])
+            }
+            for i, node_threshold in enumerate(self.node_thresholds)
+            for j, edge_threshold in enumerate(self.edge_thresholds)
+        ]
+
+
+def _entry_levels(scores: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Index of the first (ascending) threshold whose cumulative_mask keeps each entry
+
+    len(thresholds) marks entries no threshold keeps.
+    """
+    n = len(scores)
+    order = np.argsort(-scores, kind='stable')
+    cumulative = np.cumsum(scores[order])
+    total = cumulative[-1] if n else 0.0
+    sizes = np.array([
+        n if threshold >= 1 or total <= 0
+        else min(int(np.searchsorted(cumulative, threshold * total, side='left')) + 1, n)
+        for threshold in thresholds
+    ], dtype=np.int64)
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    return np.searchsorted(sizes, rank, side='right')
+
+
+@profiled('analysis.threshold_sweep')
+def threshold_sweep(graph: GraphArrays, node_thresholds: Sequence[float] = DEFAULT_NODE_THRESHOLDS,
+                    edge_thresholds: Sequence[float] = DEFAULT_EDGE_THRESHOLDS,
+                    analyzer: Optional[GraphAnalyzer] = None) -> ThresholdSweep:
+    """
+    Replacement and completeness of the pruned graph at every (node, edge) threshold pair
+
+    Every cell holds exactly the graph prune_graph returns for its thresholds. Nodes are
+    ranked once; edges are rescored once per node threshold (on that node-pruned graph)
+    and ranked, so each edge threshold keeps a prefix of that ranking, and the dangling
+    node pass runs per cell on boolean masks. No pruned graph is materialized:
+
+    - Completeness is MetricsCalculator's, with the kept nodes as the pinned set and only
+      kept edges explaining their targets (fractions of the full graph's incoming weight).
+    - Replacement (influence reaching the logits from the kept input nodes along kept
+      nodes and edges, over that of all input nodes in the full graph) comes from one
+      backward sweep over the topological levels carrying one column per grid cell,
+      O(E · cells). Unlike MetricsCalculator's pinned-set score, dropped inputs (e.g.
+      error nodes) contribute nothing, as they are absent from the pruned graph.
+
+    Thresholds are sorted ascending; memory is O((num_nodes + num_links) · cells).
+    """
+    node_thresholds = np.sort(np.asarray(node_thresholds, dtype=float))
+    edge_thresholds = np.sort(np.asarray(edge_thresholds, dtype=float))
+    num_node_levels, num_edge_levels = len(node_thresholds), len(edge_thresholds)
+
+    analyzer = analyzer if analyzer is not None else GraphAnalyzer.from_arrays(graph)
+    propagator = analyzer.influence_propagator
+    weights = propagator.logit_weights()
+    full_influence = propagator.total_influence(weights)
+    n = graph.num_nodes
+
+    always, is_error = _always_kept(graph, analyzer.is_logit), _is_error(graph)
+    node_level = _entry_levels(full_influence - weights, node_thresholds)
+    node_level[always] = 0
+
+    source = graph.link_source.astype(np.int64)
+    target = graph.link_target.astype(np.int64)
+    magnitude = np.abs(graph.link_weight).astype(np.float64)
+    incoming = np.bincount(target, weights=magnitude, minlength=n)
+    fraction = np.divide(magnitude, incoming[target], out=np.zeros_like(magnitude), where=incoming[target] > 0)
+    has_incoming = incoming > 0
+
+    shape = (num_node_levels, num_edge_levels)
+    num_nodes = np.zeros(shape, dtype=np.int64)
+    num_edges = np.zeros(shape, dtype=np.int64)
+    completeness = np.zeros(shape)
+    # Per node level: each edge's first kept edge level (num_edge_levels = never kept)
+    edge_level = np.full((num_node_levels, graph.num_links), num_edge_levels, dtype=np.int64)
+    alive = np.zeros((n, num_node_levels * num_edge_levels), dtype=bool)
+
+    with span('analysis.sweep_masks'):
+        for i in range(num_node_levels):
+            node_mask = node_level <= i
+            links, scores = _edge_scores(graph, node_mask, source, target)
+            edge_level[i, links] = _entry_levels(scores, edge_thresholds)
+            for j in range(num_edge_levels):
+                kept_nodes, kept_links = _drop_dangling(node_mask, edge_level[i] <= j, source, target,
+                                                        always, is_error)
+                num_nodes[i, j] = kept_nodes.sum()
+                num_edges[i, j] = kept_links.sum()
+                scored = np.count_nonzero(kept_nodes & has_incoming)
+                completeness[i, j] = fraction[kept_links].sum() / scored if scored else 0.0
+                alive[:, i * num_edge_levels + j] = kept_nodes
+
+    with span('analysis.sweep_replacement'):
+        replacement = _sweep_replacement(analyzer, weights, full_influence, source, target, fraction,
+                                         alive, edge_level, num_edge_levels)
+
+    return ThresholdSweep(
+        node_thresholds=node_thresholds,
+        edge_thresholds=edge_thresholds,
+        num_nodes=num_nodes,
+        num_edges=num_edges,
+        replacement=replacement,
+        completeness=completeness
+    )
+
+
+def _sweep_replacement(analyzer: GraphAnalyzer, weights: np.ndarray, full_influence: np.ndarray,
+                       source: np.ndarray, target: np.ndarray, fraction: np.ndarray, alive: np.ndarray,
+                       edge_level: np.ndarray, num_edge_levels: int) -> np.ndarray:
+    """
+    Replacement score per grid cell from one masked backward sweep
+
+    Column c = i * num_edge_levels + j holds cell (i, j), and alive[:, c] its kept nodes.
+    Each edge carries one weight per column (its fraction where the cell keeps it, else
+    0) and the dropped nodes of a column are zeroed, so influence only flows through kept
+    nodes and edges.
+    """
+    n = len(weights)
+    num_node_levels = len(edge_level)
+    inputs = np.flatnonzero(~analyzer.is_logit & (np.bincount(target, minlength=n) == 0))
+    total = float(full_influence[inputs].sum())
+    if total <= 0:
+        return np.zeros((num_node_levels, num_edge_levels))
+
+    levels = analyzer.path_engine.levels()
+    order = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n)
+    bounds = np.cumsum([0] + [len(level) for level in levels])
+
+    # Edges kept in some cell, grouped by source in sweep order
+    column_node_level = np.repeat(np.arange(num_node_levels), num_edge_levels)
+    column_edge_level = np.tile(np.arange(num_edge_levels), num_node_levels)
+    links = np.flatnonzero((edge_level < num_edge_levels).any(axis=0))
+    links = links[np.argsort(position[source[links]], kind='stable')]
+    edge_source = position[source[links]]
+    edge_target = position[target[links]]
+    edge_weight = fraction[links, None] * (edge_level[column_node_level][:, links].T <= column_edge_level)
+
+    permuted_alive = alive[order]
+    rhs = weights[order]
+    x = np.zeros((n, alive.shape[1]))
+    for start, stop in zip(bounds[-2::-1], bounds[:0:-1]):
+        y = np.repeat(rhs[start:stop, None], alive.shape[1], axis=1)
+        lo, hi = np.searchsorted(edge_source, [start, stop])
+        if lo < hi:
+            groups = np.flatnonzero(np.diff(edge_source[lo:hi], prepend=-1))
+            contribution = edge_weight[lo:hi] * x[edge_target[lo:hi]]
+            y[edge_source[lo + groups] - start] += np.add.reduceat(contribution, groups, axis=0)
+        x[start:stop] = y * permuted_alive[start:stop]
+
+    through = x[position[inputs]].sum(axis=0) / total
+    return np.minimum(through, 1.0).reshape(num_node_levels, num_edge_levels)
@@ -1,3 +1,5 @@
-"""API client modules (to be implemented)"""
+"""Neuronpedia API client"""
 
-# TODO: Implement API client and schemas
+from .client import AsyncNeuronpediaClient, NeuronpediaAPIError, NeuronpediaClient
+
+__all__ = ['AsyncNeuronpediaClient', 'NeuronpediaAPIError', 'NeuronpediaClient']
@@ -0,0 +1,417 @@
+"""Pooled sync and async clients for the Neuronpedia API"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import (
+    Any, AsyncIterator, Awaitable, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+)
+import httpx
+
+from ..storage import GraphArrays, stream_graph
+from ..storage.compression import StreamDecompressor, decompress_bytes
+from ..utils.config import load_config
+
+
+DEFAULT_BASE_URL = "https://www.neuronpedia.org/api"
+USER_AGENT = "NeuronpediaAgent/1.0"
+CHUNK_SIZE = 1 << 20
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class NeuronpediaAPIError(Exception):
+    """Non-success response from the Neuronpedia API"""
+
+    def __init__(self, status_code: int, message: str, url: str):
+        super().__init__(f"HTTP {status_code} from {url}: {message}")
+        self.status_code = status_code
+        self.url = url
+
+
+@contextmanager
+def _atomic_file(dest: Union[str, Path]) -> Iterator[BinaryIO]:
+    """Binary file written next to dest and renamed into place once the block completes"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=dest.name + '.', suffix='.part', dir=dest.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.replace(tmp_path, dest)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _ChunkReader:
+    """Minimal binary file interface (read) over an iterator of byte chunks"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class _ClientBase:
+    """Settings, URL/header building and retry policy shared by the sync and async clients"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = DEFAULT_BASE_URL, timeout: float = 60.0,
+                 retry_attempts: int = 3, max_connections: int = 16, backoff_base: float = 0.5,
+                 backoff_max: float = 10.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.max_connections = max_connections
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_config(cls, config: Optional[Union[Dict, str, Path]] = None, api_key: Optional[str] = None, **overrides):
+        """
+        Build a client from the `api` section of config.yaml (base_url, timeout, retry_attempts)
+
+        config: Parsed config dict, path to a YAML file, or None for the default config.yaml
+        """
+        if not isinstance(config, dict):
+            config = load_config(config)
+        settings = {k: v for k, v in (config.get('api') or {}).items()
+                    if k in ('base_url', 'timeout', 'retry_attempts', 'max_connections')}
+        settings.update(overrides)
+        return cls(api_key=api_key, **settings)
+
+    def _url(self, path: str) -> str:
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _headers(self, url: str) -> Dict[str, str]:
+        # Only send the key to the API itself, never to signed S3 URLs
+        if self.api_key and url.startswith(self.base_url):
+            return {'x-api-key': self.api_key}
+        return {}
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server-sent retry-after"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('retry-after', 0)))
+            except ValueError:
+                pass
+        return delay
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Any:
+        if response.status_code >= 400:
+            raise NeuronpediaAPIError(response.status_code, response.text[:200], str(response.url))
+        if not response.content:
+            return None
+        return json.loads(decompress_bytes(response.content))
+
+    @staticmethod
+    def _generate_payload(prompt: str, model_id: str, compress: bool, signed_url: Optional[str],
+                          options: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {'prompt': prompt, 'model_id': model_id, **options}
+        if signed_url:
+            payload['signed_url'] = signed_url
+        if compress:
+            payload['compress'] = True
+        return payload
+
+
+class NeuronpediaClient(_ClientBase):
+    """
+    Synchronous Neuronpedia client over one pooled keep-alive HTTP connection set
+
+    Requests failing with 429/5xx or a transport error are retried `retry_attempts` times
+    with jittered exponential backoff. Use as a context manager (or call close()) to
+    release the pool.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = DEFAULT_BASE_URL, **settings):
+        super().__init__(api_key=api_key, base_url=base_url, **settings)
+        self._http = httpx.Client(timeout=self.timeout, limits=self._limits(),
+                                  headers={'User-Agent': USER_AGENT}, follow_redirects=True)
+
+    def close(self):
+        self._http.close()
+
+    def __enter__(self) -> 'NeuronpediaClient':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, method: str, path: str, **kwargs) -> Any:
+        """Send a request with retries; returns the decoded JSON body"""
+        url = self._url(path)
+        for attempt in range(self.retry_attempts + 1):
+            last = attempt == self.retry_attempts
+            try:
+                response = self._http.request(method, url, headers=self._headers(url), **kwargs)
+            except httpx.TransportError:
+                if last:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            return self._parse(response)
+
+    def get(self, path: str, **params) -> Any:
+        return self.request('GET', path, params=params or None)
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Any:
+        return self.request('POST', path, json=payload)
+
+    # Endpoints
+
+    def list_graphs(self) -> List[Dict[str, Any]]:
+        response = self.get('graph/list')
+        return response.get('graphs', []) if isinstance(response, dict) else (response or [])
+
+    def find_graph(self, slug: str) -> Optional[Dict[str, Any]]:
+        """Metadata of one of the user's graphs by slug (None if not listed)"""
+        return next((graph for graph in self.list_graphs() if graph.get('slug') == slug), None)
+
+    def get_graph_metadata(self, model_id: str, slug: str) -> Dict[str, Any]:
+        """Graph metadata, including the signed S3 `url` of the graph JSON"""
+        return self.get(f'graph/{model_id}/{slug}')
+
+    def generate_graph(self, prompt: str, model_id: str, compress: bool = False,
+                       signed_url: Optional[str] = None, **options) -> Any:
+        """
+        Request a new attribution graph
+
+        options: Other generation parameters (node_threshold, edge_threshold, max_feature_nodes, ...)
+        compress: Ask for a gzip-compressed upload; downloads decompress it transparently
+        """
+        return self.post('graph/generate', self._generate_payload(prompt, model_id, compress, signed_url, options))
+
+    def get_feature(self, model_id: str, source: str, index: int) -> Dict[str, Any]:
+        return self.get(f'feature/{model_id}/{source}/{index}')
+
+    def save_subgraph(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self.post('graph/subgraph/save', payload)
+
+    def list_subgraphs(self, model_id: str, slug: str) -> Dict[str, Any]:
+        return self.post('graph/subgraph/list', {'modelId': model_id, 'slug': slug})
+
+    # Downloads
+
+    @contextmanager
+    def _stream(self, url: str) -> Iterator[httpx.Response]:
+        # Only opening the response is retried; a body cut off midway is an error
+        for attempt in range(self.retry_attempts + 1):
+            last = attempt == self.retry_attempts
+            request = self._http.build_request('GET', url, headers=self._headers(url))
+            try:
+                response = self._http.send(request, stream=True)
+            except httpx.TransportError:
+                if last:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                response.close()
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            try:
+                if response.status_code >= 400:
+                    response.read()
+                    raise NeuronpediaAPIError(response.status_code, response.text[:200], url)
+                yield response
+            finally:
+                response.close()
+            return
+
+    def iter_download(self, url: str, decompress: bool = True, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Stream a (signed S3) URL as byte chunks
+
+        Graphs generated with `compress: true` are stored gzipped on S3, usually without a
+        Content-Encoding header, so the HTTP layer hands over the raw bytes. With
+        decompress set, gzip and zstd bodies are detected from their magic bytes and
+        decoded on the fly; other bodies pass through unchanged.
+        """
+        with self._stream(self._url(url)) as response:
+            decoder = StreamDecompressor() if decompress else None
+            for chunk in response.iter_bytes(chunk_size):
+                yield decoder.feed(chunk) if decoder else chunk
+            if decoder:
+                yield decoder.flush()
+
+    def download(self, url: str, dest: Union[str, Path], decompress: bool = False,
+                 chunk_size: int = CHUNK_SIZE) -> Path:
+        """
+        Stream a URL straight to disk without holding the body in memory
+
+        Compressed graphs stay compressed on disk unless decompress is set; the graph
+        loaders (storage.load_graph and everything built on it) read them transparently.
+        The file is written next to dest and renamed into place once complete.
+        """
+        with _atomic_file(dest) as f:
+            for chunk in self.iter_download(url, decompress=decompress, chunk_size=chunk_size):
+                f.write(chunk)
+        return Path(dest)
+
+    def download_graph(self, url: str, dest: Optional[Union[str, Path]] = None) -> GraphArrays:
+        """
+        Parse a graph JSON URL into GraphArrays while it downloads
+
+        dest: Also keep the body on disk, as received (so still compressed if it was)
+        """
+        if dest is None:
+            return stream_graph(_ChunkReader(self.iter_download(url)))
+
+        with _atomic_file(dest) as f:
+            def tee(chunks: Iterator[bytes]) -> Iterator[bytes]:
+                decoder = StreamDecompressor()
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield decoder.feed(chunk)
+                yield decoder.flush()
+
+            return stream_graph(_ChunkReader(tee(self.iter_download(url, decompress=False))))
+
+
+class AsyncNeuronpediaClient(_ClientBase):
+    """
+    Asynchronous counterpart of NeuronpediaClient for concurrent fan-out
+
+    All requests share one connection pool of `max_connections`; gather() runs many
+    calls at once and the pool bounds how many are on the wire.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = DEFAULT_BASE_URL, **settings):
+        super().__init__(api_key=api_key, base_url=base_url, **settings)
+        self._http = httpx.AsyncClient(timeout=self.timeout, limits=self._limits(),
+                                       headers={'User-Agent': USER_AGENT}, follow_redirects=True)
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def __aenter__(self) -> 'AsyncNeuronpediaClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def request(self, method: str, path: str, **kwargs) -> Any:
+        """Send a request with retries; returns the decoded JSON body"""
+        url = self._url(path)
+        for attempt in range(self.retry_attempts + 1):
+            last = attempt == self.retry_attempts
+            try:
+                response = await self._http.request(method, url, headers=self._headers(url), **kwargs)
+            except httpx.TransportError:
+                if last:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                continue
+            return self._parse(response)
+
+    async def get(self, path: str, **params) -> Any:
+        return await self.request('GET', path, params=params or None)
+
+    async def post(self, path: str, payload: Dict[str, Any]) -> Any:
+        return await self.request('POST', path, json=payload)
+
+    @staticmethod
+    async def gather(calls: Iterable[Awaitable], return_exceptions: bool = False) -> List[Any]:
+        """Run calls concurrently, results in input order"""
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    # Endpoints
+
+    async def list_graphs(self) -> List[Dict[str, Any]]:
+        response = await self.get('graph/list')
+        return response.get('graphs', []) if isinstance(response, dict) else (response or [])
+
+    async def find_graph(self, slug: str) -> Optional[Dict[str, Any]]:
+        return next((graph for graph in await self.list_graphs() if graph.get('slug') == slug), None)
+
+    async def get_graph_metadata(self, model_id: str, slug: str) -> Dict[str, Any]:
+        return await self.get(f'graph/{model_id}/{slug}')
+
+    async def generate_graph(self, prompt: str, model_id: str, compress: bool = False,
+                             signed_url: Optional[str] = None, **options) -> Any:
+        return await self.post('graph/generate', self._generate_payload(prompt, model_id, compress, signed_url, options))
+
+    async def get_feature(self, model_id: str, source: str, index: int) -> Dict[str, Any]:
+        return await self.get(f'feature/{model_id}/{source}/{index}')
+
+    async def get_features(self, model_id: str, refs: Iterable[Tuple[str, int]]) -> List[Any]:
+        """Fetch many (source, index) features concurrently"""
+        return await self.gather(self.get_feature(model_id, source, index) for source, index in refs)
+
+    async def save_subgraph(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.post('graph/subgraph/save', payload)
+
+    async def list_subgraphs(self, model_id: str, slug: str) -> Dict[str, Any]:
+        return await self.post('graph/subgraph/list', {'modelId': model_id, 'slug': slug})
+
+    # Downloads
+
+    @asynccontextmanager
+    async def _stream(self, url: str) -> AsyncIterator[httpx.Response]:
+        for attempt in range(self.retry_attempts + 1):
+            last = attempt == self.retry_attempts
+            request = self._http.build_request('GET', url, headers=self._headers(url))
+            try:
+                response = await self._http.send(request, stream=True)
+            except httpx.TransportError:
+                if last:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                await response.aclose()
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                continue
+            try:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise NeuronpediaAPIError(response.status_code, response.text[:200], url)
+                yield response
+            finally:
+                await response.aclose()
+            return
+
+    async def download(self, url: str, dest: Union[str, Path], decompress: bool = False,
+                       chunk_size: int = CHUNK_SIZE) -> Path:
+        """Stream a URL to disk (see NeuronpediaClient.download)"""
+        with _atomic_file(dest) as f:
+            async with self._stream(self._url(url)) as response:
+                decoder = StreamDecompressor() if decompress else None
+                async for chunk in response.aiter_bytes(chunk_size):
+                    f.write(decoder.feed(chunk) if decoder else chunk)
+                if decoder:
+                    f.write(decoder.flush())
+        return Path(dest)
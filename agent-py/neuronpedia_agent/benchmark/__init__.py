@@ -0,0 +1,21 @@
+"""Synthetic graphs and scaling benchmarks for the cleanup pipeline"""
+
+from .synthetic import DICTIONARY_SIZE, synthetic_graph, write_graph_json
+from .suite import (
+    DEFAULT_GROUPINGS, DEFAULT_SIZES, DEFAULT_STRATEGIES, BenchmarkReport, BenchmarkRun, StageResult, parse_sizes,
+    run_benchmarks
+)
+
+__all__ = [
+    'DICTIONARY_SIZE',
+    'synthetic_graph',
+    'write_graph_json',
+    'DEFAULT_GROUPINGS',
+    'DEFAULT_SIZES',
+    'DEFAULT_STRATEGIES',
+    'BenchmarkReport',
+    'BenchmarkRun',
+    'StageResult',
+    'parse_sizes',
+    'run_benchmarks'
+]
@@ -0,0 +1,238 @@
+"""Per-stage time and memory benchmarks of the cleanup pipeline on synthetic graphs"""
+
+import gc
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from ..analysis.graph_analyzer import GraphAnalyzer
+from ..analysis.grouping_engine import GroupingEngine
+from ..analysis.node_selector import NodeSelector
+from ..embeddings import VectorCache, get_embedder
+from ..embeddings.embedder import HASHING_MODEL
+from ..optimization.metrics import MetricsCalculator
+from ..optimization.path_tracer import PathTracer
+from ..storage import convert_graph, load_graph, read_cache
+from .synthetic import synthetic_graph, write_graph_json
+
+
+# (nodes, edges) grid; 1k nodes cannot hold 1M distinct forward edges, so it is not paired with them
+DEFAULT_SIZES: Tuple[Tuple[int, int], ...] = ((1_000, 10_000), (10_000, 10_000), (10_000, 1_000_000), (100_000, 1_000_000))
+DEFAULT_STRATEGIES = ('importance', 'pathway', 'optimize')
+DEFAULT_GROUPINGS = ('functional', 'layer', 'semantic')
+
+
+@dataclass
+class StageResult:
+    """One pipeline stage at one graph size"""
+    seconds: float
+    peak_bytes: Optional[int] = None  # Peak traced allocation above the stage's starting point
+
+
+@dataclass
+class BenchmarkRun:
+    """All stages at one (nodes, edges) size"""
+    num_nodes: int     # Generated (may fall short of the request when the DAG is saturated)
+    num_edges: int
+    file_bytes: int
+    stages: Dict[str, StageResult] = field(default_factory=dict)
+    centrality_mode: Optional[str] = None  # Betweenness mode the centrality stage resolved to
+    centrality_pivots: Optional[int] = None
+
+
+@dataclass
+class BenchmarkReport:
+    runs: List[BenchmarkRun]
+
+    def stage_names(self) -> List[str]:
+        names: List[str] = []
+        for run in self.runs:
+            names.extend(name for name in run.stages if name not in names)
+        return names
+
+    def scaling(self) -> Dict[str, Optional[float]]:
+        """
+        Per stage, the exponent b of a least-squares fit seconds ≈ a · (nodes + edges)^b
+
+        None when fewer than two sizes have a measurable time.
+        """
+        exponents = {}
+        for name in self.stage_names():
+            points = [(run.num_nodes + run.num_edges, run.stages[name].seconds) for run in self.runs
+                      if name in run.stages and run.stages[name].seconds > 0]
+            if len({size for size, _ in points}) < 2:
+                exponents[name] = None
+                continue
+            sizes, seconds = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+            exponents[name] = float(np.polyfit(sizes, seconds, 1)[0])
+        return exponents
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'runs': [asdict(run) for run in self.runs], 'scaling': self.scaling()}
+
+    def format_table(self) -> str:
+        """Stages as rows, sizes as columns: seconds (and peak MB when measured)"""
+        headers = [f"{run.num_nodes:,}n/{run.num_edges:,}e" for run in self.runs]
+        width = max([12] + [len(h) for h in headers]) + 2
+        names = self.stage_names()
+        label = max(len(name) for name in names + ['stage']) + 2
+        lines = ['stage'.ljust(label) + ''.join(h.rjust(width) for h in headers) + 'scaling'.rjust(10)]
+        exponents = self.scaling()
+        for name in names:
+            cells = []
+            for run in self.runs:
+                stage = run.stages.get(name)
+                if stage is None:
+                    cells.append('-')
+                elif stage.peak_bytes is None:
+                    cells.append(f"{stage.seconds:.3f}s")
+                else:
+                    cells.append(f"{stage.seconds:.3f}s {stage.peak_bytes / 2 ** 20:.0f}MB")
+            exponent = exponents.get(name)
+            lines.append(name.ljust(label) + ''.join(c.rjust(width) for c in cells)
+                         + (f"{exponent:.2f}" if exponent is not None else '-').rjust(10))
+        if any(run.centrality_mode for run in self.runs):
+            cells = [run.centrality_mode if run.centrality_mode != 'approximate' else f"approx/{run.centrality_pivots}"
+                     for run in self.runs]
+            lines.append('(centrality)'.ljust(label) + ''.join((c or '-').rjust(width) for c in cells))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def _measure(results: Dict[str, StageResult], name: str, memory: bool) -> Iterator[None]:
+    gc.collect()
+    if memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline if memory else None
+    results[name] = StageResult(seconds=seconds, peak_bytes=peak)
+
+
+def _run_pipeline(num_nodes: int, num_edges: int, workdir: Path, strategies: Sequence[str],
+                  groupings: Sequence[str], max_nodes: int, centrality: Dict[str, Any], seed: int,
+                  memory: bool) -> BenchmarkRun:
+    stages: Dict[str, StageResult] = {}
+
+    def measure(name: str):
+        return _measure(stages, name, memory)
+
+    with measure('generate'):
+        graph = synthetic_graph(num_nodes, num_edges, seed=seed)
+    path = workdir / f'synthetic-{num_nodes}-{num_edges}.json'
+    with measure('write_json'):
+        write_graph_json(graph, path)
+    del graph
+
+    with measure('load_json'):
+        graph = load_graph(path)
+    cache_dir = workdir / (path.name + '.cache')
+    with measure('convert'):
+        convert_graph(path, cache_dir)
+    with measure('load_cache'):
+        read_cache(cache_dir)
+
+    with measure('analyze'):
+        analyzer = GraphAnalyzer.from_arrays(graph, centrality=centrality)
+    with measure('importance'):
+        analyzer.compute_node_importance('influence')
+    with measure('centrality'):
+        betweenness = analyzer.centrality.betweenness()
+
+    pinned: List[str] = []
+    for strategy in strategies:
+        with measure(f'select[{strategy}]'):
+            selected = NodeSelector(analyzer, max_nodes=max_nodes).select_nodes_for_pinning(strategy)
+        pinned = pinned or selected
+
+    embedder = get_embedder(HASHING_MODEL)
+    supernodes = []
+    for grouping in groupings:
+        with measure(f'group[{grouping}]'):
+            grouped = GroupingEngine(analyzer, pinned, embedder=embedder,
+                                     vector_cache=VectorCache(':memory:')).create_supernodes(strategy=grouping)
+        supernodes = supernodes or grouped
+
+    with measure('metrics'):
+        MetricsCalculator(graph, {'pinned_node_ids': pinned, 'supernodes': supernodes},
+                          analyzer=analyzer).validate_subgraph()
+
+    target = np.flatnonzero(graph.is_target_logit)
+    with measure('trace'):
+        PathTracer(analyzer, supernodes).trace_computation(
+            graph.node_ids[0], graph.node_ids[target[0]] if len(target) else ''
+        )
+
+    return BenchmarkRun(num_nodes=graph.num_nodes, num_edges=graph.num_links,
+                        file_bytes=path.stat().st_size, stages=stages, centrality_mode=betweenness.mode,
+                        centrality_pivots=betweenness.num_pivots)
+
+
+def run_benchmarks(sizes: Sequence[Tuple[int, int]] = DEFAULT_SIZES,
+                   strategies: Sequence[str] = DEFAULT_STRATEGIES,
+                   groupings: Sequence[str] = DEFAULT_GROUPINGS, max_nodes: int = 30,
+                   centrality: Optional[Dict[str, Any]] = None, memory: bool = True, seed: int = 0,
+                   workdir: Optional[Union[str, Path]] = None,
+                   on_run: Optional[Callable[[BenchmarkRun], None]] = None) -> BenchmarkReport:
+    """
+    Time (and memory-profile) every pipeline stage on synthetic graphs of each size
+
+    Stages: generate, write_json, load_json, convert, load_cache, analyze, importance,
+    centrality, select[strategy], group[grouping], metrics, trace.
+
+    - centrality: CentralityService keyword arguments (default: the service defaults, so
+      "auto" mode picks exact or approximate betweenness per size as a cleanup run would);
+      the mode each size resolved to is recorded on its BenchmarkRun
+    - memory: Also run every size a second time under tracemalloc for per-stage peak
+      allocation (a separate pass, so tracing overhead does not distort the timings)
+    - workdir: Where graph files are written (default: a temporary directory, removed after)
+    - on_run: Called as each size finishes
+    """
+    own_dir = workdir is None
+    workdir = Path(tempfile.mkdtemp(prefix='neuronpedia-bench-')) if own_dir else Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    runs = []
+    try:
+        for num_nodes, num_edges in sizes:
+            run = _run_pipeline(num_nodes, num_edges, workdir, strategies, groupings, max_nodes,
+                                centrality, seed, memory=False)
+            if memory:
+                tracemalloc.start()
+                try:
+                    traced = _run_pipeline(num_nodes, num_edges, workdir, strategies, groupings, max_nodes,
+                                           centrality, seed, memory=True)
+                finally:
+                    tracemalloc.stop()
+                for name, stage in traced.stages.items():
+                    if name in run.stages:
+                        run.stages[name].peak_bytes = stage.peak_bytes
+            runs.append(run)
+            if on_run is not None:
+                on_run(run)
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return BenchmarkReport(runs=runs)
+
+
+def parse_sizes(value: str) -> List[Tuple[int, int]]:
+    """Parse "1000x10000,10k x 1M"-style size lists (k/M suffixes allowed)"""
+    def number(text: str) -> int:
+        text = text.strip().lower()
+        scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+        return int(float(text[:-1] if scale > 1 else text) * scale)
+
+    sizes = []
+    for item in value.split(','):
+        if item.strip():
+            nodes, _, edges = item.lower().partition('x')
+            sizes.append((number(nodes), number(edges)))
+    return sizes
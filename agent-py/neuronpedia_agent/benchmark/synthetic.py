@@ -0,0 +1,201 @@
+"""Synthetic attribution graphs in the Neuronpedia schema, for benchmarks"""
+
+from pathlib import Path
+from typing import Union
+import numpy as np
+
+from ..storage import EMBEDDING_LAYER, FEATURE_TYPES, GraphArrays, write_graph_json as stream_graph_json
+
+
+# Transcoder dictionary size; error nodes are numbered above it so node ids stay unique
+DICTIONARY_SIZE = 16384
+VOCAB_SIZE = 256000
+
+_EMBEDDING, _TRANSCODER, _ERROR, _LOGIT = (FEATURE_TYPES.index(name) for name in (
+    'embedding', 'cross layer transcoder', 'mlp reconstruction error', 'logit'
+))
+
+
+def synthetic_graph(num_nodes: int = 1000, num_edges: int = 10000, num_layers: int = 26, num_ctx: int = 8,
+                    num_logits: int = 10, error_fraction: float = 0.05, weight_sigma: float = 1.4,
+                    seed: int = 0) -> GraphArrays:
+    """
+    Generate a random attribution graph shaped like a circuit-tracer export
+
+    - Nodes: one embedding (layer 'E') per context position, num_logits logits at the last
+      position (layer num_layers + 1), error nodes on a random subset of (layer, position)
+      pairs, and transcoder features in layers 0..num_layers-1 (denser in early layers, as
+      in real graphs) filling up to num_nodes.
+    - Edges: distinct (source, target) pairs that go strictly up in layer and never back in
+      context position, so the graph is a DAG. Endpoints are drawn with heavy-tailed
+      (Pareto) propensities, giving hub nodes; weights are log-normal in magnitude (median
+      ≈ 0.34, weight_sigma sets the tail) and ~40% negative. When fewer than num_edges
+      pairs are possible, all of them are used.
+    - Node influence follows Neuronpedia's cumulative convention (lower = more influential,
+      all ≤ 0.8).
+    """
+    rng = np.random.default_rng(seed)
+    logit_layer = num_layers + 1
+
+    # Errors on a subset of (layer, position) slots, one node per slot at most
+    num_errors = min(int(num_nodes * error_fraction), num_layers * num_ctx)
+    num_features = max(num_nodes - num_ctx - num_logits - num_errors, 0)
+    error_slots = rng.choice(num_layers * num_ctx, size=num_errors, replace=False)
+
+    layer_weights = np.exp(-np.arange(num_layers) / 6.0) + 0.15
+    # (layer, feature, position) keys: a feature can fire at several positions, but not twice at one
+    keys = np.zeros(0, dtype=np.int64)
+    first_ctx = 1 if num_ctx > 1 else 0
+    capacity = num_layers * DICTIONARY_SIZE * (num_ctx - first_ctx)
+    num_features = min(num_features, capacity)
+    while len(keys) < num_features:
+        draw = num_features - len(keys) + 16
+        layers = rng.choice(num_layers, size=draw, p=layer_weights / layer_weights.sum())
+        drawn = ((layers.astype(np.int64) * DICTIONARY_SIZE + rng.integers(0, DICTIONARY_SIZE, size=draw)) * num_ctx
+                 + rng.integers(first_ctx, num_ctx, size=draw))
+        keys = np.unique(np.concatenate([keys, drawn]))
+    keys = np.sort(rng.choice(keys, size=num_features, replace=False)) if len(keys) > num_features else keys
+    feature_ctx = keys % num_ctx
+    feature_index = (keys // num_ctx) % DICTIONARY_SIZE
+    feature_layer = keys // num_ctx // DICTIONARY_SIZE
+    num_features = len(keys)
+
+    embedding_token = rng.integers(0, VOCAB_SIZE, size=num_ctx)
+    logit_token = rng.choice(VOCAB_SIZE, size=num_logits, replace=False)
+
+    layer = np.concatenate([
+        np.full(num_ctx, EMBEDDING_LAYER), feature_layer, error_slots // num_ctx, np.full(num_logits, logit_layer)
+    ]).astype(np.int16)
+    ctx_idx = np.concatenate([
+        np.arange(num_ctx), feature_ctx, error_slots % num_ctx, np.full(num_logits, num_ctx - 1)
+    ]).astype(np.int32)
+    feature = np.concatenate([
+        embedding_token, feature_index, np.full(num_errors, -1), logit_token
+    ]).astype(np.int64)
+    feature_type = np.concatenate([
+        np.full(num_ctx, _EMBEDDING), np.full(num_features, _TRANSCODER), np.full(num_errors, _ERROR),
+        np.full(num_logits, _LOGIT)
+    ]).astype(np.int8)
+    n = len(layer)
+
+    node_ids = (
+        [f"E_{t}_{c}" for t, c in zip(embedding_token.tolist(), range(num_ctx))]
+        + [f"{l}_{f}_{c}" for l, f, c in zip(feature_layer.tolist(), feature_index.tolist(), feature_ctx.tolist())]
+        + [f"{s // num_ctx}_{DICTIONARY_SIZE + s % num_ctx}_{s % num_ctx}" for s in error_slots.tolist()]
+        + [f"{logit_layer}_{t}_{num_ctx - 1}" for t in logit_token.tolist()]
+    )
+
+    source, target = _sample_edges(rng, layer, ctx_idx, num_edges)
+    magnitude = rng.lognormal(mean=np.log(0.34), sigma=weight_sigma, size=len(source))
+    weight = np.where(rng.random(len(source)) < 0.4, -magnitude, magnitude).astype(np.float32)
+
+    # Cumulative influence: nodes ranked by attributed mass, running share scaled into (0, 0.8]
+    magnitude = np.abs(weight)
+    mass = np.bincount(source, weights=magnitude, minlength=n) + np.bincount(target, weights=magnitude, minlength=n)
+    order = np.argsort(-mass, kind='stable')
+    cumulative = np.cumsum(mass[order]) / max(mass.sum(), 1e-12)
+    influence = np.empty(n, dtype=np.float32)
+    influence[order] = 0.8 * np.maximum(cumulative, 1e-6)
+    is_logit = feature_type == _LOGIT
+    influence[is_logit] = np.nan
+
+    activation = np.full(n, np.nan, dtype=np.float32)
+    is_feature = feature_type == _TRANSCODER
+    activation[is_feature] = rng.lognormal(mean=0.5, sigma=0.8, size=int(is_feature.sum()))
+
+    token_prob = np.zeros(n, dtype=np.float32)
+    probs = np.sort(rng.dirichlet(np.full(num_logits, 0.3)))[::-1] if num_logits else np.zeros(0)
+    token_prob[is_logit] = probs
+    is_target_logit = np.zeros(n, dtype=bool)
+    if num_logits:
+        is_target_logit[np.flatnonzero(is_logit)[0]] = True
+
+    clerp = [''] * n
+    for i, p in zip(np.flatnonzero(is_logit).tolist(), probs.tolist()):
+        clerp[i] = f'Output "tok{feature[i]}" (p={p:.3f})'
+
+    prompt_tokens = ['<bos>'] + [f'tok{t}' for t in embedding_token[1:].tolist()]
+    extra = {
+        'metadata': {
+            'slug': f'synthetic-{n}-{len(source)}-{seed}',
+            'scan': 'synthetic',
+            'prompt_tokens': prompt_tokens,
+            'prompt': ' '.join(prompt_tokens),
+            'node_threshold': 0.8,
+            'schema_version': 1,
+            'generation_settings': {'seed': seed, 'num_layers': num_layers, 'num_ctx': num_ctx}
+        },
+        'qParams': {'pinnedIds': [], 'supernodes': [], 'linkType': 'both', 'clickedId': '', 'sg_pos': ''}
+    }
+
+    return GraphArrays(
+        node_ids=node_ids,
+        index={node_id: i for i, node_id in enumerate(node_ids)},
+        layer=layer,
+        ctx_idx=ctx_idx,
+        feature=feature,
+        feature_type=feature_type,
+        feature_types=FEATURE_TYPES,
+        influence=influence,
+        activation=activation,
+        token_prob=token_prob,
+        is_target_logit=is_target_logit,
+        clerp=clerp,
+        has_data=np.ones(n, dtype=bool),
+        link_source=source.astype(np.int32),
+        link_target=target.astype(np.int32),
+        link_weight=weight,
+        extra=extra,
+        schema='neuronpedia'
+    )
+
+
+def _sample_edges(rng: np.random.Generator, layer: np.ndarray, ctx_idx: np.ndarray,
+                  num_edges: int, max_rounds: int = 12):
+    """
+    Distinct forward (source, target) pairs with Pareto-distributed endpoint propensities
+
+    Hubs soon saturate their possible pairs in dense graphs, so after a few rounds the
+    remaining edges are drawn with uniform propensities.
+    """
+    n = len(layer)
+    # Nodes sorted by layer; sources for a target are the prefix with a lower layer
+    by_layer = np.argsort(layer, kind='stable')
+    below = np.searchsorted(layer[by_layer], layer, side='left')  # Nodes in lower layers, per node
+    eligible = np.flatnonzero(below > 0)
+    if not len(eligible):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Upper bound on distinct pairs (ignores the context constraint)
+    num_edges = min(num_edges, int(below[eligible].sum()))
+
+    heavy_tailed = (rng.pareto(1.5, size=n) + 1.0, rng.pareto(1.5, size=n) + 1.0)
+    pairs = np.zeros(0, dtype=np.int64)
+    for round_ in range(max_rounds):
+        missing = num_edges - len(pairs)
+        if missing <= 0:
+            break
+        out_propensity, in_propensity = heavy_tailed if round_ < 3 else (np.ones(n), np.ones(n))
+        cumulative = np.cumsum(out_propensity[by_layer])
+        target_p = in_propensity[eligible] / in_propensity[eligible].sum()
+
+        draw = int(missing * 1.3) + 16
+        target = eligible[rng.choice(len(eligible), size=draw, p=target_p)]
+        limit = cumulative[below[target] - 1]
+        source = by_layer[np.minimum(np.searchsorted(cumulative, rng.random(draw) * limit, side='right'),
+                                     below[target] - 1)]
+        forward = ctx_idx[source] <= ctx_idx[target]
+        pairs = np.concatenate([pairs, source[forward].astype(np.int64) * n + target[forward]])
+        pairs.sort()
+        pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+    if len(pairs) > num_edges:
+        pairs = np.sort(rng.choice(pairs, size=num_edges, replace=False))
+    return pairs // n, pairs % n
+
+
+def write_graph_json(graph: GraphArrays, path: Union[str, Path]) -> Path:
+    """Stream a graph to a Neuronpedia-style JSON file (see storage.write_graph_json)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        stream_graph_json(graph, f)
+    return path
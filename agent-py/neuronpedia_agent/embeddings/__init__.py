@@ -0,0 +1,19 @@
+"""Embedding of feature explanations for semantic grouping"""
+
+from .embedder import (
+    DEFAULT_EMBEDDING_MODEL, Embedder, HashingEmbedder, SentenceTransformerEmbedder, get_embedder, normalize_rows
+)
+from .vector_cache import DEFAULT_VECTOR_CACHE_PATH, CachedEmbedder, VectorCache, open_vector_cache
+
+__all__ = [
+    'DEFAULT_EMBEDDING_MODEL',
+    'Embedder',
+    'HashingEmbedder',
+    'SentenceTransformerEmbedder',
+    'get_embedder',
+    'normalize_rows',
+    'DEFAULT_VECTOR_CACHE_PATH',
+    'CachedEmbedder',
+    'VectorCache',
+    'open_vector_cache'
+]
@@ -0,0 +1,110 @@
+"""Text embedders for feature explanations"""
+
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+
+try:
+    import sentence_transformers
+except ImportError:  # pragma: no cover - optional dependency
+    sentence_transformers = None
+
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+HASHING_MODEL = "hashing"
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class Embedder:
+    """
+    Maps a batch of texts to L2-normalized row vectors
+
+    - name: Identifies the vector space; cached vectors are only reused under the same name
+    - reweight_idf: Vectors are term frequencies that benefit from IDF weighting over the
+      batch being clustered
+    """
+    name: str = ""
+    reweight_idf: bool = False
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+    Offline fallback: hashed bag of words and character trigrams
+
+    Each token is hashed (crc32, stable across processes) into one of `dim` signed
+    buckets with a 1 + log(tf) weight, so vectors need no vocabulary and can be cached
+    independently of the batch. Clustering applies IDF over the batch (reweight_idf).
+    """
+    reweight_idf = True
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"{HASHING_MODEL}-{dim}"
+
+    def _tokens(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        grams = [f"#{w[i:i + 3]}" for w in (f"<{w}>" for w in words) for i in range(len(w) - 2)]
+        return words + grams
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        rows, buckets, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in self._tokens(text):
+                digest = zlib.crc32(token.encode('utf-8'))
+                rows.append(row)
+                buckets.append(digest % self.dim)
+                signs.append(1.0 if digest & 0x80000000 else -1.0)
+
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(buckets, dtype=np.int64)),
+                  np.array(signs, dtype=np.float32))
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        return normalize_rows(vectors)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """sentence-transformers model, loaded on first use and encoded in batches (thread-safe)"""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 64,
+                 device: Optional[str] = None):
+        if sentence_transformers is None:
+            raise ImportError("sentence-transformers is required for SentenceTransformerEmbedder")
+        self.name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            if self._model is None:
+                self._model = sentence_transformers.SentenceTransformer(self.name, device=self.device)
+            vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                         normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (all-zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+@lru_cache(maxsize=None)
+def get_embedder(model_name: Optional[str] = DEFAULT_EMBEDDING_MODEL) -> Embedder:
+    """
+    Shared embedder for a model name (one model load per process)
+
+    Falls back to HashingEmbedder when the name is "hashing"/None or
+    sentence-transformers is not installed.
+    """
+    if model_name and model_name != HASHING_MODEL and sentence_transformers is not None:
+        return SentenceTransformerEmbedder(model_name)
+    return HashingEmbedder()
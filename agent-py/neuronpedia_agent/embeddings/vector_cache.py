@@ -0,0 +1,187 @@
+"""Persistent SQLite cache of feature embedding vectors"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from .embedder import Embedder
+
+
+DEFAULT_VECTOR_CACHE_PATH = Path.home() / '.cache' / 'neuronpedia_agent' / 'embeddings.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    embedder TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (embedder, feature)
+)
+"""
+
+# SQLite's default limit on bound parameters per statement is 999
+_QUERY_CHUNK = 400
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class VectorCache:
+    """
+    Disk-backed embedding store keyed by (embedder name, feature id)
+
+    Each vector is stored with a digest of the text it embeds, so a feature whose
+    explanation changed is re-embedded instead of served stale. Lookups go through an
+    in-process dict first. hits / misses count features looked up through this instance.
+    One instance may be shared by threads; path ":memory:" keeps vectors for this process only.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_VECTOR_CACHE_PATH):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._memory: Dict[Tuple[str, str], Tuple[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Batch workers share one file; WAL lets readers proceed during writes
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def get_many(self, embedder: str, features: Sequence[str], digests: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the features whose stored digest matches"""
+        with self._lock:
+            return self._get_many(embedder, features, digests)
+
+    def _get_many(self, embedder: str, features: Sequence[str], digests: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        missing = []
+        for feature, digest in zip(features, digests):
+            entry = self._memory.get((embedder, feature))
+            if entry is not None and entry[0] == digest:
+                found[feature] = entry[1]
+            else:
+                missing.append((feature, digest))
+
+        in_memory = len(found)
+        wanted = dict(missing)
+        names = list(wanted)
+        for start in range(0, len(names), _QUERY_CHUNK):
+            chunk = names[start:start + _QUERY_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT feature, digest, vector FROM vectors WHERE embedder = ? "
+                f"AND feature IN ({','.join('?' * len(chunk))})",
+                (embedder, *chunk)
+            ).fetchall()
+            for feature, digest, blob in rows:
+                if wanted.get(feature) == digest:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._memory[(embedder, feature)] = (digest, vector)
+                    found[feature] = vector
+
+        self.hits += len(found)
+        self.misses += len(wanted) - (len(found) - in_memory)
+        return found
+
+    def put_many(self, embedder: str, entries: Sequence[Tuple[str, str, np.ndarray]]):
+        """Insert or replace (feature, digest, vector) entries"""
+        with self._lock:
+            self._put_many(embedder, entries)
+
+    def _put_many(self, embedder: str, entries: Sequence[Tuple[str, str, np.ndarray]]):
+        now = time.time()
+        for feature, digest, vector in entries:
+            self._memory[(embedder, feature)] = (digest, np.asarray(vector, dtype=np.float32))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO vectors (embedder, feature, digest, vector, created) VALUES (?, ?, ?, ?, ?)',
+            ((embedder, feature, digest, np.asarray(vector, dtype=np.float32).tobytes(), now)
+             for feature, digest, vector in entries)
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        self._memory.clear()
+        self._conn.execute('DELETE FROM vectors')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def open_vector_cache(path: Union[str, Path] = DEFAULT_VECTOR_CACHE_PATH) -> VectorCache:
+    """Shared VectorCache for a path (one connection and memory layer per process)"""
+    return VectorCache(Path(path).expanduser())
+
+
+class CachedEmbedder:
+    """
+    Embed feature texts, computing each feature's vector at most once
+
+    Features are looked up in the in-process memo and the optional VectorCache;
+    only the misses are sent to the embedder, as one batch.
+    """
+
+    def __init__(self, embedder: Embedder, cache: Optional[VectorCache] = None):
+        self.embedder = embedder
+        self.cache = cache
+        self._memory: Dict[Tuple[str, str], np.ndarray] = {}
+        self.embedded = 0  # Texts actually sent to the embedder
+
+    def embed(self, features: List[str], texts: List[str]) -> np.ndarray:
+        """
+        Vectors for the (feature id, text) pairs, one row per pair
+
+        Returns: float32 array of shape (len(features), dim)
+        """
+        name = self.embedder.name
+        digests = [text_digest(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        for feature, digest in zip(features, digests):
+            vector = self._memory.get((feature, digest))
+            if vector is not None:
+                vectors[feature] = vector
+
+        pending = [(f, d) for f, d in zip(features, digests) if f not in vectors]
+        if pending and self.cache is not None:
+            vectors.update(self.cache.get_many(name, [f for f, _ in pending], [d for _, d in pending]))
+
+        todo = {}
+        for feature, digest, text in zip(features, digests, texts):
+            if feature not in vectors and feature not in todo:
+                todo[feature] = (digest, text)
+        if todo:
+            fresh = self.embedder.embed([text for _, text in todo.values()])
+            self.embedded += len(todo)
+            entries = []
+            for (feature, (digest, _)), vector in zip(todo.items(), fresh):
+                vectors[feature] = vector
+                entries.append((feature, digest, vector))
+            if self.cache is not None:
+                self.cache.put_many(name, entries)
+
+        for feature, digest in zip(features, digests):
+            self._memory[(feature, digest)] = vectors[feature]
+        if not features:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([vectors[f] for f in features]).astype(np.float32)
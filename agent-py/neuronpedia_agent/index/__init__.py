@@ -0,0 +1,24 @@
+"""Cross-graph indexes for finding recurring features and circuits"""
+
+from .feature_index import DEFAULT_INDEX_PATH, FeatureIndex, GraphMatch, Posting, feature_postings
+from .cooccurrence import CooccurrenceMatrix, FeatureSet, Partner, graph_features, merge_shards
+from .similarity import DEFAULT_SIMILARITY_PATH, GraphSketch, SimilarGraph, SimilarityIndex, minhash, sketch_graph
+
+__all__ = [
+    'DEFAULT_INDEX_PATH',
+    'FeatureIndex',
+    'GraphMatch',
+    'Posting',
+    'feature_postings',
+    'CooccurrenceMatrix',
+    'FeatureSet',
+    'Partner',
+    'graph_features',
+    'merge_shards',
+    'DEFAULT_SIMILARITY_PATH',
+    'GraphSketch',
+    'SimilarGraph',
+    'SimilarityIndex',
+    'minhash',
+    'sketch_graph'
+]
@@ -0,0 +1,536 @@
+"""Sparse feature co-occurrence and accumulated influence matrices over a graph corpus"""
+
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import scipy.sparse as sp
+
+from ..storage import GraphArrays, load_graph, load_graph_cached
+from .feature_index import feature_rows, graph_model
+
+
+MATRIX_VERSION = 1
+META_FILE = 'meta.json'
+
+# Feature keys are packed into one int64: model code (15 bits) | layer (16) | feature index (32)
+_MODEL_SHIFT = 48
+_LAYER_SHIFT = 32
+_LOW_MASK = (1 << 32) - 1
+
+# Pending pair entries buffered before they are folded into the matrices
+_FLUSH_ENTRIES = 5_000_000
+
+SCORES = ('count', 'jaccard', 'npmi')
+
+
+def _pack(model_code, layer, feature) -> np.ndarray:
+    return ((np.asarray(model_code, dtype=np.int64) << _MODEL_SHIFT)
+            | (np.asarray(layer, dtype=np.int64) << _LAYER_SHIFT)
+            | np.asarray(feature, dtype=np.int64))
+
+
+def _unpack(packed: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return packed >> _MODEL_SHIFT, (packed >> _LAYER_SHIFT) & 0xFFFF, packed & _LOW_MASK
+
+
+@dataclass
+class FeatureSet:
+    """
+    The features one graph contributes, in a compact picklable form
+
+    - layer / feature: One entry per distinct (layer, feature) in the set
+    - edge_source / edge_target / edge_weight: Links between set members, as positions
+      into layer / feature, summed over context positions
+    """
+    model: str
+    layer: np.ndarray
+    feature: np.ndarray
+    edge_source: np.ndarray
+    edge_target: np.ndarray
+    edge_weight: np.ndarray
+
+
+def graph_features(graph: GraphArrays, node_ids: Optional[Sequence[str]] = None,
+                   influence_threshold: Optional[float] = None,
+                   max_features: Optional[int] = None) -> FeatureSet:
+    """
+    Select a graph's feature set: the given (e.g. pinned) nodes, else its high-influence features
+
+    Node influence is Neuronpedia's cumulative influence, where lower values are more
+    influential: influence_threshold keeps nodes at or below it, and max_features keeps the
+    nodes with the lowest values. A feature present at several context positions counts once.
+    """
+    rows = feature_rows(graph)
+    if node_ids is not None:
+        wanted = np.fromiter((graph.index.get(nid, -1) for nid in node_ids), dtype=np.int64)
+        rows = np.intersect1d(rows, wanted)
+    else:
+        influence = np.asarray(graph.influence[rows], dtype=np.float64)
+        if influence_threshold is not None:
+            keep = influence <= influence_threshold
+            rows, influence = rows[keep], influence[keep]
+        if max_features is not None and len(rows) > max_features:
+            order = np.argsort(np.where(np.isnan(influence), np.inf, influence), kind='stable')
+            rows = np.sort(rows[order[:max_features]])
+
+    keys = _pack(0, graph.layer[rows], graph.feature[rows])
+    unique, position = np.unique(keys, return_inverse=True)
+    local = np.full(graph.num_nodes, -1, dtype=np.int64)
+    local[rows] = position
+
+    source = local[graph.link_source]
+    target = local[graph.link_target]
+    mask = (source >= 0) & (target >= 0)
+    _, layer, feature = _unpack(unique)
+    return FeatureSet(
+        model=graph_model(graph),
+        layer=layer,
+        feature=feature,
+        edge_source=source[mask],
+        edge_target=target[mask],
+        edge_weight=np.asarray(graph.link_weight[mask], dtype=np.float64)
+    )
+
+
+def _extract_features(path: str, cache: bool, influence_threshold: Optional[float],
+                      max_features: Optional[int]) -> FeatureSet:
+    """Load one graph file and select its feature set (runs in worker processes)"""
+    graph = load_graph_cached(path) if cache else load_graph(path)
+    return graph_features(graph, influence_threshold=influence_threshold, max_features=max_features)
+
+
+@dataclass
+class Partner:
+    """A feature related to a queried one"""
+    model: str
+    layer: int
+    feature: int
+    score: float
+    count: int  # Graphs containing both features
+
+
+class _Vocabulary:
+    """Dense ids for packed feature keys, in insertion order, with vectorized lookup"""
+
+    def __init__(self, keys: np.ndarray):
+        self.keys = keys
+        self._sorter: Optional[np.ndarray] = None
+        self._sorted: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, packed: np.ndarray) -> np.ndarray:
+        """Ids of the keys (-1 where unknown)"""
+        packed = np.asarray(packed, dtype=np.int64)
+        if not len(self.keys):
+            return np.full(packed.shape, -1, dtype=np.int64)
+        if self._sorter is None:
+            self._sorter = np.argsort(self.keys, kind='stable')
+            self._sorted = self.keys[self._sorter]
+        position = np.minimum(np.searchsorted(self._sorted, packed), len(self.keys) - 1)
+        return np.where(self._sorted[position] == packed, self._sorter[position], -1)
+
+    def add(self, packed: np.ndarray) -> np.ndarray:
+        """Ids of the keys, assigning new ids to unknown ones"""
+        ids = self.lookup(packed)
+        new = np.unique(np.asarray(packed, dtype=np.int64)[ids < 0])
+        if len(new):
+            self.keys = np.concatenate([self.keys, new])
+            self._sorter = self._sorted = None
+            ids = self.lookup(packed)
+        return ids
+
+
+def _empty(n: int, dtype) -> sp.csr_matrix:
+    return sp.csr_matrix((n, n), dtype=dtype)
+
+
+def _grow(matrix: sp.csr_matrix, n: int) -> sp.csr_matrix:
+    """The matrix padded with empty rows and columns to n × n (no copy of the entries)"""
+    rows = matrix.shape[0]
+    if rows == n:
+        return matrix
+    indptr = np.concatenate([matrix.indptr, np.full(n - rows, matrix.indptr[-1], dtype=matrix.indptr.dtype)])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=(n, n), copy=False)
+
+
+def _save_csr(directory: Path, name: str, matrix: sp.csr_matrix):
+    for part in ('indptr', 'indices', 'data'):
+        np.save(directory / f'{name}_{part}.npy', np.ascontiguousarray(getattr(matrix, part)))
+
+
+def _load_csr(directory: Path, name: str, n: int, mmap: bool) -> sp.csr_matrix:
+    mode = 'r' if mmap else None
+    data, indices, indptr = (np.load(directory / f'{name}_{part}.npy', mmap_mode=mode)
+                             for part in ('data', 'indices', 'indptr'))
+    return sp.csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+
+
+class CooccurrenceMatrix:
+    """
+    Feature × feature statistics accumulated over a corpus of graphs
+
+    - cooccurrence[i, j]: Graphs whose feature set contains both i and j (symmetric)
+    - graph_count[i]: Graphs whose feature set contains i
+    - influence[i, j]: Summed weight of edges from feature i to feature j
+
+    Features are (model, layer, feature index). Each added graph contributes only its
+    new pairs, buffered as coordinate triplets and folded into the CSR matrices in
+    batches, so the cost of adding a graph does not grow with the corpus. Graphs are
+    identified by name and counted once. Saved matrices are .npy bundles that load()
+    memory-maps; matrices built on separate shards combine with merge().
+    """
+
+    def __init__(self):
+        self.models: List[str] = []
+        self.graphs: List[str] = []
+        self._graph_names = set()
+        self._vocab = _Vocabulary(np.zeros(0, dtype=np.int64))
+        self._graph_count = np.zeros(0, dtype=np.int64)
+        self._cooccurrence = _empty(0, np.int64)
+        self._influence = _empty(0, np.float64)
+        self._influence_t = _empty(0, np.float64)
+        self._pending_pairs: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_edges: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._pending_entries = 0
+
+    @property
+    def num_features(self) -> int:
+        return len(self._vocab)
+
+    @property
+    def num_graphs(self) -> int:
+        return len(self.graphs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._graph_names
+
+    def _model_code(self, model: str) -> int:
+        if model not in self.models:
+            self.models.append(model)
+        return self.models.index(model)
+
+    # Accumulation
+
+    def add_graph(self, name: str, graph: GraphArrays, node_ids: Optional[Sequence[str]] = None,
+                  influence_threshold: Optional[float] = None, max_features: Optional[int] = None) -> bool:
+        """
+        Add a graph's feature set (see graph_features)
+
+        Returns: False if a graph with this name was already added
+        """
+        if name in self._graph_names:
+            return False
+        self.add_features(name, graph_features(graph, node_ids, influence_threshold, max_features))
+        return True
+
+    def add_features(self, name: str, features: FeatureSet):
+        """Add a precomputed feature set (e.g. extracted in a worker process)"""
+        if name in self._graph_names:
+            return
+        ids = self._vocab.add(_pack(self._model_code(features.model), features.layer, features.feature))
+        if len(self._graph_count) < len(self._vocab) or not self._graph_count.flags.writeable:
+            # Grown, or still the read-only memory map of a loaded matrix
+            graph_count = np.zeros(len(self._vocab), dtype=np.int64)
+            graph_count[:len(self._graph_count)] = self._graph_count
+            self._graph_count = graph_count
+        # ids are distinct: graph_features dedupes the set
+        self._graph_count[ids] += 1
+
+        upper = np.triu_indices(len(ids), 1)
+        first, second = ids[upper[0]], ids[upper[1]]
+        self._pending_pairs.append((np.minimum(first, second), np.maximum(first, second)))
+        self._pending_edges.append((ids[features.edge_source], ids[features.edge_target], features.edge_weight))
+        self._pending_entries += len(first) + len(features.edge_weight)
+
+        self.graphs.append(name)
+        self._graph_names.add(name)
+        if self._pending_entries >= _FLUSH_ENTRIES:
+            self._flush()
+
+    def update(self, paths: Iterable[Union[str, Path]], processes: int = 1, cache: bool = True,
+               influence_threshold: Optional[float] = None, max_features: Optional[int] = None,
+               on_graph: Optional[Callable[[str, Optional[Exception]], None]] = None) -> Dict[str, int]:
+        """
+        Add the high-influence feature sets of graph files not yet in the matrix
+
+        Graphs are named by resolved path. Feature sets are extracted in `processes`
+        worker processes and accumulated here.
+
+        - on_graph: Called with (path, error or None) as each graph is added
+
+        Returns: counts of 'added', 'skipped' and 'failed' graphs
+        """
+        paths = [str(Path(p).resolve()) for p in paths]
+        todo = [p for p in paths if p not in self._graph_names]
+        counts = {'added': 0, 'skipped': len(paths) - len(todo), 'failed': 0}
+
+        def finish(path: str, features: Optional[FeatureSet], error: Optional[Exception]):
+            if features is not None:
+                self.add_features(path, features)
+                counts['added'] += 1
+            else:
+                counts['failed'] += 1
+            if on_graph is not None:
+                on_graph(path, error)
+
+        if processes <= 1:
+            for path in todo:
+                try:
+                    features = _extract_features(path, cache, influence_threshold, max_features)
+                except Exception as e:
+                    finish(path, None, e)
+                else:
+                    finish(path, features, None)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = {pool.submit(_extract_features, path, cache, influence_threshold, max_features): path
+                           for path in todo}
+                for future in as_completed(futures):
+                    try:
+                        features = future.result()
+                    except Exception as e:
+                        finish(futures[future], None, e)
+                    else:
+                        finish(futures[future], features, None)
+        return counts
+
+    def _flush(self):
+        """Fold buffered triplets into the CSR matrices"""
+        n = self.num_features
+        if self._pending_pairs:
+            rows = np.concatenate([p[0] for p in self._pending_pairs])
+            cols = np.concatenate([p[1] for p in self._pending_pairs])
+            upper = sp.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(n, n))
+            self._cooccurrence = _grow(self._cooccurrence, n) + upper + upper.T.tocsr()
+        if self._pending_edges:
+            rows = np.concatenate([e[0] for e in self._pending_edges])
+            cols = np.concatenate([e[1] for e in self._pending_edges])
+            weights = np.concatenate([e[2] for e in self._pending_edges])
+            added = sp.csr_matrix((weights, (rows, cols)), shape=(n, n))
+            self._influence = _grow(self._influence, n) + added
+            self._influence_t = _grow(self._influence_t, n) + added.T.tocsr()
+        self._cooccurrence = _grow(self._cooccurrence, n)
+        self._influence = _grow(self._influence, n)
+        self._influence_t = _grow(self._influence_t, n)
+        self._pending_pairs.clear()
+        self._pending_edges.clear()
+        self._pending_entries = 0
+
+    def merge(self, other: 'CooccurrenceMatrix') -> 'CooccurrenceMatrix':
+        """
+        Add another matrix's counts into this one (e.g. a shard built on other graphs)
+
+        Raises: ValueError if both matrices contain a graph of the same name
+        """
+        overlap = self._graph_names.intersection(other.graphs)
+        if overlap:
+            raise ValueError(f"Matrices share {len(overlap)} graphs, e.g. {sorted(overlap)[0]!r}")
+        other._flush()
+        self._flush()
+
+        model_codes = np.array([self._model_code(m) for m in other.models] or [0], dtype=np.int64)
+        codes, layer, feature = _unpack(other._vocab.keys)
+        ids = self._vocab.add(_pack(model_codes[codes], layer, feature))
+        n = self.num_features
+
+        graph_count = np.zeros(n, dtype=np.int64)
+        graph_count[:len(self._graph_count)] = self._graph_count
+        graph_count[ids] += other._graph_count
+        self._graph_count = graph_count
+
+        def remapped(matrix: sp.csr_matrix) -> sp.csr_matrix:
+            coo = matrix.tocoo()
+            return sp.csr_matrix((coo.data, (ids[coo.row], ids[coo.col])), shape=(n, n))
+
+        self._cooccurrence = _grow(self._cooccurrence, n) + remapped(other._cooccurrence)
+        self._influence = _grow(self._influence, n) + remapped(other._influence)
+        self._influence_t = _grow(self._influence_t, n) + remapped(other._influence_t)
+        self.graphs.extend(other.graphs)
+        self._graph_names.update(other.graphs)
+        return self
+
+    # Queries
+
+    def _id(self, model: str, layer: int, feature: int) -> int:
+        if model not in self.models:
+            return -1
+        return int(self._vocab.lookup(_pack(self.models.index(model), layer, feature)))
+
+    def _key(self, ids: np.ndarray) -> List[Tuple[str, int, int]]:
+        codes, layer, feature = _unpack(self._vocab.keys[ids])
+        return [(self.models[c], l, f) for c, l, f in zip(codes.tolist(), layer.tolist(), feature.tolist())]
+
+    def graph_count(self, model: str, layer: int, feature: int) -> int:
+        """Graphs whose feature set contains the feature"""
+        self._flush()
+        i = self._id(model, layer, feature)
+        return int(self._graph_count[i]) if i >= 0 else 0
+
+    def count(self, a: Tuple[str, int, int], b: Tuple[str, int, int]) -> int:
+        """Graphs containing both features (model, layer, feature)"""
+        self._flush()
+        i, j = self._id(*a), self._id(*b)
+        if i < 0 or j < 0:
+            return 0
+        if i == j:
+            return int(self._graph_count[i])
+        cols, values = _row(self._cooccurrence, i)
+        hit = np.flatnonzero(cols == j)
+        return int(values[hit[0]]) if len(hit) else 0
+
+    def partners(self, model: str, layer: int, feature: int, k: int = 10, score: str = 'count',
+                 min_count: int = 1) -> List[Partner]:
+        """
+        The k features most often found together with a feature
+
+        score: 'count' (graphs containing both), 'jaccard' (count over graphs containing
+        either) or 'npmi' (normalized pointwise mutual information across the corpus)
+        """
+        if score not in SCORES:
+            raise ValueError(f"Unknown score: {score} (expected one of {', '.join(SCORES)})")
+        self._flush()
+        i = self._id(model, layer, feature)
+        if i < 0:
+            return []
+        cols, counts = _row(self._cooccurrence, i)
+        keep = counts >= min_count
+        cols, counts = cols[keep], counts[keep].astype(np.float64)
+
+        if score == 'count':
+            scores = counts
+        elif score == 'jaccard':
+            scores = counts / (self._graph_count[i] + self._graph_count[cols] - counts)
+        else:
+            total = float(self.num_graphs)
+            joint = counts / total
+            pmi = np.log(joint / ((self._graph_count[i] / total) * (self._graph_count[cols] / total)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.where(joint < 1.0, pmi / -np.log(joint), 1.0)
+
+        top = _top_k(scores, k)
+        counts = counts[top].astype(np.int64)
+        return [Partner(m, l, f, float(s), int(c))
+                for (m, l, f), s, c in zip(self._key(cols[top]), scores[top], counts)]
+
+    def influence_partners(self, model: str, layer: int, feature: int, k: int = 10,
+                           direction: str = 'both') -> List[Partner]:
+        """
+        The k features with the largest accumulated edge weight to / from a feature
+
+        direction: 'out' (edges from the feature), 'in' (edges into it) or 'both'
+        Partner.score is the summed signed weight; ranking uses its magnitude.
+        """
+        if direction not in ('out', 'in', 'both'):
+            raise ValueError(f"Unknown direction: {direction}")
+        self._flush()
+        i = self._id(model, layer, feature)
+        if i < 0:
+            return []
+        parts = []
+        if direction in ('out', 'both'):
+            parts.append(_row(self._influence, i))
+        if direction in ('in', 'both'):
+            parts.append(_row(self._influence_t, i))
+        cols = np.concatenate([p[0] for p in parts])
+        weights = np.concatenate([p[1] for p in parts])
+        cols, inverse = np.unique(cols, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights, minlength=len(cols))
+
+        top = _top_k(np.abs(weights), k)
+        shared = dict(zip(*(part.tolist() for part in _row(self._cooccurrence, i))))
+        return [Partner(m, l, f, float(w), int(shared.get(c, 0)))
+                for (m, l, f), w, c in zip(self._key(cols[top]), weights[top], cols[top].tolist())]
+
+    # Persistence
+
+    def save(self, directory: Union[str, Path]) -> Path:
+        """Write the matrices as .npy columns plus a JSON sidecar (atomically replaced)"""
+        self._flush()
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=directory.name + '.', dir=directory.parent))
+        try:
+            np.save(tmp_dir / 'vocab.npy', self._vocab.keys)
+            np.save(tmp_dir / 'graph_count.npy', self._graph_count)
+            _save_csr(tmp_dir, 'cooccurrence', self._cooccurrence)
+            _save_csr(tmp_dir, 'influence', self._influence)
+            _save_csr(tmp_dir, 'influence_t', self._influence_t)
+            with open(tmp_dir / META_FILE, 'w') as f:
+                json.dump({
+                    'version': MATRIX_VERSION,
+                    'models': self.models,
+                    'graphs': self.graphs,
+                    'num_features': self.num_features
+                }, f)
+            if directory.exists():
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return directory
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> 'CooccurrenceMatrix':
+        """Open saved matrices; arrays are memory-mapped read-only when mmap is set"""
+        directory = Path(directory)
+        with open(directory / META_FILE) as f:
+            meta = json.load(f)
+        if meta.get('version') != MATRIX_VERSION:
+            raise ValueError(f"Unsupported co-occurrence matrix version in {directory}")
+
+        mode = 'r' if mmap else None
+        n = meta['num_features']
+        matrix = cls()
+        matrix.models = list(meta['models'])
+        matrix.graphs = list(meta['graphs'])
+        matrix._graph_names = set(matrix.graphs)
+        matrix._vocab = _Vocabulary(np.load(directory / 'vocab.npy', mmap_mode=mode))
+        matrix._graph_count = np.load(directory / 'graph_count.npy', mmap_mode=mode)
+        matrix._cooccurrence = _load_csr(directory, 'cooccurrence', n, mmap)
+        matrix._influence = _load_csr(directory, 'influence', n, mmap)
+        matrix._influence_t = _load_csr(directory, 'influence_t', n, mmap)
+        return matrix
+
+    def stats(self) -> Dict[str, Any]:
+        self._flush()
+        return {
+            'graphs': self.num_graphs,
+            'features': self.num_features,
+            'pairs': self._cooccurrence.nnz // 2,
+            'influence_edges': self._influence.nnz
+        }
+
+
+def _row(matrix: sp.csr_matrix, i: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of row i (slices of the stored arrays)"""
+    start, end = matrix.indptr[i], matrix.indptr[i + 1]
+    return np.asarray(matrix.indices[start:end], dtype=np.int64), np.asarray(matrix.data[start:end])
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, highest first"""
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def merge_shards(directories: Iterable[Union[str, Path]],
+                 output: Optional[Union[str, Path]] = None) -> CooccurrenceMatrix:
+    """Combine saved shards into one matrix, optionally saving it to output"""
+    merged = CooccurrenceMatrix()
+    for directory in directories:
+        merged.merge(CooccurrenceMatrix.load(directory))
+    if output is not None:
+        merged.save(output)
+    return merged
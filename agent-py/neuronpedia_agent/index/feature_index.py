@@ -0,0 +1,369 @@
+"""On-disk inverted index from transcoder features to the graphs they appear in"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from ..storage import GraphArrays, load_graph, load_graph_cached
+
+
+DEFAULT_INDEX_PATH = Path.home() / '.cache' / 'neuronpedia_agent' / 'feature_index.sqlite'
+
+# Node types that are not dictionary features and are never indexed
+_NON_FEATURE_TYPES = ('logit', 'embedding', 'mlp reconstruction error')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS graphs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    model_id INTEGER NOT NULL,
+    slug TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    num_nodes INTEGER NOT NULL,
+    num_features INTEGER NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    layer INTEGER NOT NULL,
+    feature INTEGER NOT NULL,
+    model_id INTEGER NOT NULL,
+    graph_id INTEGER NOT NULL,
+    ctx_idx INTEGER NOT NULL,
+    influence REAL,
+    activation REAL,
+    PRIMARY KEY (layer, feature, model_id, graph_id, ctx_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_graph ON postings (graph_id);
+"""
+
+FeatureKey = Union[Tuple[int, int], Tuple[str, int, int]]
+
+
+@dataclass
+class Posting:
+    """One occurrence of a feature: a node of an indexed graph"""
+    graph: str
+    model: str
+    layer: int
+    feature: int
+    ctx_idx: int
+    influence: Optional[float]
+    activation: Optional[float]
+
+
+@dataclass
+class GraphMatch:
+    """A graph containing some of the queried features"""
+    graph: str
+    model: str
+    shared: int                     # Distinct queried features present
+    influence: float                # Summed influence of the matching nodes
+    features: List[Tuple[int, int]]  # Matching (layer, feature) pairs
+
+
+def graph_model(graph: GraphArrays) -> str:
+    """Model a graph was traced on (metadata scan, '' if unknown)"""
+    metadata = graph.metadata
+    return str(metadata.get('scan') or metadata.get('model') or '')
+
+
+def feature_rows(graph: GraphArrays) -> np.ndarray:
+    """Indices of the graph's dictionary-feature nodes (no logit, embedding or error nodes)"""
+    mask = graph.has_data & (graph.feature >= 0) & (graph.layer >= 0) & ~graph.logit_mask()
+    for name in _NON_FEATURE_TYPES:
+        code = graph.type_code(name)
+        if code >= 0:
+            mask &= graph.feature_type != code
+    return np.flatnonzero(mask)
+
+
+def feature_postings(graph: GraphArrays) -> Dict[str, np.ndarray]:
+    """
+    Posting columns of a graph: one row per feature node
+
+    Missing ctx_idx is -1; missing influence / activation are NaN.
+    """
+    rows = feature_rows(graph)
+    return {
+        'layer': np.asarray(graph.layer[rows], dtype=np.int64),
+        'feature': np.asarray(graph.feature[rows], dtype=np.int64),
+        'ctx_idx': np.asarray(graph.ctx_idx[rows], dtype=np.int64),
+        'influence': np.asarray(graph.influence[rows], dtype=np.float64),
+        'activation': np.asarray(graph.activation[rows], dtype=np.float64)
+    }
+
+
+def _entry(path: str, graph: GraphArrays) -> Dict[str, Any]:
+    """Index entry of a loaded graph file"""
+    stat = os.stat(path)
+    metadata = graph.metadata
+    return {
+        'path': path,
+        'model': graph_model(graph),
+        'slug': str(metadata.get('slug') or ''),
+        'prompt': str(metadata.get('prompt') or ''),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'num_nodes': graph.num_nodes,
+        'postings': feature_postings(graph)
+    }
+
+
+def _extract(path: str, cache: bool) -> Dict[str, Any]:
+    """Parse one graph file into its index entry (runs in worker processes)"""
+    return _entry(path, load_graph_cached(path) if cache else load_graph(path))
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class FeatureIndex:
+    """
+    Inverted index (model, layer, feature index) → graphs, ctx positions, influence, activation
+
+    Postings live in a SQLite table clustered on (layer, feature, model), so a lookup
+    is an index range scan and no graph JSON is reopened at query time. Graphs are added
+    incrementally; a graph whose file size and mtime are unchanged is not re-read, and
+    a changed graph has its postings replaced. One instance may be shared by threads.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._models: Dict[str, int] = {}
+        if str(path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several readers may share an index file; WAL lets them proceed during writes
+        self._conn = sqlite3.connect(str(path), timeout=30.0, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # Building
+
+    def is_current(self, path: Union[str, Path]) -> bool:
+        """Whether a graph file is indexed with its current size and mtime"""
+        path = str(Path(path).resolve())
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime_ns FROM graphs WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return False
+        stat = os.stat(path)
+        return row[0] == stat.st_size and row[1] == stat.st_mtime_ns
+
+    def add_graph(self, path: Union[str, Path], graph: Optional[GraphArrays] = None, cache: bool = True) -> int:
+        """
+        Index one graph file (replacing an older entry for the same path)
+
+        graph: Already loaded arrays of the file, to avoid parsing it again
+
+        Returns: Number of postings written
+        """
+        path = str(Path(path).resolve())
+        entry = _extract(path, cache) if graph is None else _entry(path, graph)
+        return self._write(entry)
+
+    def update(self, paths: Iterable[Union[str, Path]], processes: int = 1, cache: bool = True,
+               on_graph: Optional[Callable[[str, Optional[Exception]], None]] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date with a set of graph files
+
+        Unchanged graphs are skipped. Files are parsed in `processes` worker processes;
+        postings are written from this process, one transaction per graph.
+
+        - on_graph: Called with (path, error or None) as each graph is indexed
+
+        Returns: counts of 'indexed', 'skipped' and 'failed' graphs
+        """
+        paths = [str(Path(p).resolve()) for p in paths]
+        todo = [p for p in paths if not self.is_current(p)]
+        counts = {'indexed': 0, 'skipped': len(paths) - len(todo), 'failed': 0}
+
+        def finish(path: str, entry: Optional[Dict[str, Any]], error: Optional[Exception]):
+            if entry is not None:
+                self._write(entry)
+                counts['indexed'] += 1
+            else:
+                counts['failed'] += 1
+            if on_graph is not None:
+                on_graph(path, error)
+
+        if processes <= 1:
+            for path in todo:
+                try:
+                    entry = _extract(path, cache)
+                except Exception as e:
+                    finish(path, None, e)
+                else:
+                    finish(path, entry, None)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = {pool.submit(_extract, path, cache): path for path in todo}
+                for future in as_completed(futures):
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        finish(futures[future], None, e)
+                    else:
+                        finish(futures[future], entry, None)
+        return counts
+
+    def remove(self, path: Union[str, Path]) -> bool:
+        """Drop a graph and its postings; returns whether it was indexed"""
+        path = str(Path(path).resolve())
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT id FROM graphs WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute('DELETE FROM postings WHERE graph_id = ?', row)
+            self._conn.execute('DELETE FROM graphs WHERE id = ?', row)
+        return True
+
+    def _model_id(self, name: str) -> int:
+        model_id = self._models.get(name)
+        if model_id is None:
+            self._conn.execute('INSERT OR IGNORE INTO models (name) VALUES (?)', (name,))
+            model_id = self._conn.execute('SELECT id FROM models WHERE name = ?', (name,)).fetchone()[0]
+            self._models[name] = model_id
+        return model_id
+
+    def _write(self, entry: Dict[str, Any]) -> int:
+        postings = entry['postings']
+        with self._lock, self._conn:
+            model_id = self._model_id(entry['model'])
+            old = self._conn.execute('SELECT id FROM graphs WHERE path = ?', (entry['path'],)).fetchone()
+            if old is not None:
+                self._conn.execute('DELETE FROM postings WHERE graph_id = ?', old)
+                self._conn.execute('DELETE FROM graphs WHERE id = ?', old)
+            graph_id = self._conn.execute(
+                'INSERT INTO graphs (path, model_id, slug, prompt, size, mtime_ns, num_nodes, num_features, indexed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (entry['path'], model_id, entry['slug'], entry['prompt'], entry['size'], entry['mtime_ns'],
+                 entry['num_nodes'], len(postings['layer']), time.time())
+            ).lastrowid
+            # A feature can repeat at one position only through duplicate node entries; keep the first
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO postings (layer, feature, model_id, graph_id, ctx_idx, influence, activation) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((layer, feature, model_id, graph_id, ctx_idx, _optional(influence), _optional(activation))
+                 for layer, feature, ctx_idx, influence, activation in zip(
+                     postings['layer'].tolist(), postings['feature'].tolist(), postings['ctx_idx'].tolist(),
+                     postings['influence'], postings['activation']))
+            )
+        return len(postings['layer'])
+
+    # Queries
+
+    def _keys(self, features: Sequence[FeatureKey], model: Optional[str]) -> List[Tuple[Optional[int], int, int]]:
+        """(model id or None, layer, feature) per query key; unknown models match nothing"""
+        keys = []
+        for key in features:
+            name, layer, feature = key if len(key) == 3 else (model, *key)
+            model_id = None
+            if name is not None:
+                model_id = self._models.get(name)
+                if model_id is None:
+                    row = self._conn.execute('SELECT id FROM models WHERE name = ?', (name,)).fetchone()
+                    model_id = row[0] if row else -1
+            keys.append((model_id, int(layer), int(feature)))
+        return keys
+
+    def postings(self, layer: int, feature: int, model: Optional[str] = None) -> List[Posting]:
+        """Every indexed occurrence of one feature (of any model when model is None)"""
+        return self.lookup([(layer, feature)], model=model)
+
+    def lookup(self, features: Sequence[FeatureKey], model: Optional[str] = None) -> List[Posting]:
+        """
+        Occurrences of several features
+
+        features: (layer, feature) pairs, or (model, layer, feature) triples that override `model`
+        """
+        with self._lock:
+            rows = self._query(
+                'SELECT g.path, m.name, p.layer, p.feature, p.ctx_idx, p.influence, p.activation',
+                self._keys(features, model)
+            )
+        return [Posting(*row) for row in rows]
+
+    def graphs_sharing(self, features: Sequence[FeatureKey], model: Optional[str] = None,
+                       min_shared: Optional[int] = None, limit: Optional[int] = None) -> List[GraphMatch]:
+        """
+        Graphs containing at least `min_shared` of the features (default: all of them)
+
+        Sorted by number of shared features, then by summed influence of the matching nodes.
+        """
+        with self._lock:
+            keys = self._keys(features, model)
+            rows = self._query('SELECT g.path, m.name, p.layer, p.feature, p.influence', keys)
+        distinct = len({key[1:] if key[0] is None else key for key in keys})
+        min_shared = distinct if min_shared is None else min_shared
+
+        matches: Dict[str, GraphMatch] = {}
+        for path, name, layer, feature, influence in rows:
+            match = matches.get(path)
+            if match is None:
+                match = matches[path] = GraphMatch(graph=path, model=name, shared=0, influence=0.0, features=[])
+            if (layer, feature) not in match.features:
+                match.features.append((layer, feature))
+            match.influence += influence or 0.0
+        result = []
+        for match in matches.values():
+            match.shared = len(match.features)
+            if match.shared >= min_shared:
+                result.append(match)
+        result.sort(key=lambda m: (-m.shared, -m.influence, m.graph))
+        return result[:limit] if limit is not None else result
+
+    def _query(self, select: str, keys: List[Tuple[Optional[int], int, int]]) -> List[tuple]:
+        """Run `select` over the postings of each key (joined with graphs g and models m)"""
+        rows = []
+        for model_id, layer, feature in dict.fromkeys(keys):
+            # One primary-key range scan per feature
+            sql = (f'{select} FROM postings p JOIN graphs g ON g.id = p.graph_id JOIN models m ON m.id = p.model_id '
+                   'WHERE p.layer = ? AND p.feature = ?')
+            if model_id is None:
+                rows.extend(self._conn.execute(sql, (layer, feature)))
+            else:
+                rows.extend(self._conn.execute(sql + ' AND p.model_id = ?', (layer, feature, model_id)))
+        return rows
+
+    # Bookkeeping
+
+    def graphs(self) -> List[Dict[str, Any]]:
+        """Indexed graphs with their metadata"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT g.path, m.name, g.slug, g.prompt, g.num_nodes, g.num_features, g.indexed '
+                'FROM graphs g JOIN models m ON m.id = g.model_id ORDER BY g.path'
+            ).fetchall()
+        keys = ('path', 'model', 'slug', 'prompt', 'num_nodes', 'num_features', 'indexed')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM graphs').fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            graphs, = self._conn.execute('SELECT COUNT(*) FROM graphs').fetchone()
+            postings, = self._conn.execute('SELECT COUNT(*) FROM postings').fetchone()
+            features, = self._conn.execute(
+                'SELECT COUNT(*) FROM (SELECT DISTINCT layer, feature, model_id FROM postings)'
+            ).fetchone()
+        return {'graphs': graphs, 'postings': postings, 'features': features}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,449 @@
+"""MinHash / LSH similarity search over attribution graphs"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+
+from ..storage import GraphArrays, load_graph, load_graph_cached
+from .feature_index import feature_rows, graph_model
+
+
+DEFAULT_SIMILARITY_PATH = Path.home() / '.cache' / 'neuronpedia_agent' / 'similarity.sqlite'
+
+# Signature length per channel (features, edges) and LSH bands per channel; with 32 bands
+# of 4 rows a pair becomes a candidate with probability ≥ 0.5 around similarity 0.4
+NUM_PERM = 128
+NUM_BANDS = 32
+SEED = 0x5EED
+
+RERANK_MEASURES = ('weighted', 'jaccard')
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+# Tokens hashed per block when computing signatures (bounds memory to NUM_PERM × block)
+_BLOCK = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS graphs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    model TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    num_features INTEGER NOT NULL,
+    num_edges INTEGER NOT NULL,
+    feature_signature BLOB NOT NULL,
+    edge_signature BLOB NOT NULL,
+    features BLOB NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    graph_id INTEGER NOT NULL,
+    PRIMARY KEY (band, hash, graph_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_graph ON buckets (graph_id);
+"""
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over a uint64 array (wrapping arithmetic)"""
+    with np.errstate(over='ignore'):
+        x = x + _GOLDEN
+        x = (x ^ (x >> np.uint64(30))) * _MIX1
+        x = (x ^ (x >> np.uint64(27))) * _MIX2
+        return x ^ (x >> np.uint64(31))
+
+
+def _aggregate(tokens: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct tokens with summed weights, normalized to sum 1 (uniform if all zero)"""
+    unique, inverse = np.unique(tokens, return_inverse=True)
+    summed = np.bincount(inverse, weights=weights, minlength=len(unique))
+    total = summed.sum()
+    if total > 0:
+        return unique, summed / total
+    return unique, np.full(len(unique), 1.0 / len(unique)) if len(unique) else summed
+
+
+def minhash(tokens: np.ndarray, weights: np.ndarray, num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """
+    Weighted MinHash signature of a token set (P-MinHash)
+
+    Slot k holds the token minimizing -log(u_k(token)) / weight, where u_k is a
+    per-slot hash mapped to (0, 1). Two signatures agree in a slot with probability
+    equal to the probability-Jaccard similarity of the weighted sets; with equal weights
+    this is ordinary MinHash. Zero-weight tokens never win a slot. An empty set has an
+    all-zero signature.
+    """
+    signature = np.zeros(num_perm, dtype=np.uint64)
+    if not len(tokens):
+        return signature
+    seeds = _mix(np.arange(num_perm, dtype=np.uint64) + np.uint64(seed))[:, None]
+    best = np.full(num_perm, np.inf)
+    slots = np.arange(num_perm)
+    with np.errstate(divide='ignore'):
+        inverse_weights = 1.0 / np.asarray(weights, dtype=np.float64)
+    for start in range(0, len(tokens), _BLOCK):
+        block = tokens[start:start + _BLOCK]
+        uniform = ((_mix(block[None, :] ^ seeds) >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+        values = -np.log(uniform) * inverse_weights[None, start:start + _BLOCK]
+        winner = np.argmin(values, axis=1)
+        value = values[slots, winner]
+        better = value < best
+        best[better] = value[better]
+        signature[better] = block[winner[better]]
+    return signature
+
+
+def band_hashes(signature: np.ndarray, num_bands: int = NUM_BANDS) -> np.ndarray:
+    """One signed 64-bit hash per LSH band of a signature"""
+    rows = signature.reshape(num_bands, -1)
+    h = np.full(num_bands, SEED, dtype=np.uint64) + np.arange(num_bands, dtype=np.uint64)
+    for r in range(rows.shape[1]):
+        h = _mix(h ^ rows[:, r])
+    return h.view(np.int64)
+
+
+@dataclass
+class GraphSketch:
+    """
+    A graph reduced to weighted token sets and their MinHash signatures
+
+    Features are (model, layer, feature index) tokens weighted by the feature's total
+    absolute edge weight; edges are (source feature, target feature) shingles weighted
+    by absolute weight, summed over context positions. Weights are normalized per set.
+    """
+    model: str
+    feature_tokens: np.ndarray
+    feature_weights: np.ndarray
+    edge_tokens: np.ndarray
+    edge_weights: np.ndarray
+    feature_signature: np.ndarray
+    edge_signature: np.ndarray
+
+
+def graph_shingles(graph: GraphArrays) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Weighted feature tokens and edge shingles of a graph (see GraphSketch)"""
+    model = graph_model(graph)
+    rows = feature_rows(graph)
+    weight = np.abs(np.asarray(graph.link_weight, dtype=np.float64))
+    strength = (np.bincount(graph.link_source, weights=weight, minlength=graph.num_nodes)
+                + np.bincount(graph.link_target, weights=weight, minlength=graph.num_nodes))
+
+    salt = np.uint64(zlib.crc32(model.encode('utf-8')))
+    keys = (np.asarray(graph.layer[rows], dtype=np.int64) << 32) | np.asarray(graph.feature[rows], dtype=np.int64)
+    node_tokens = _mix(keys.astype(np.uint64) ^ salt)
+    feature_tokens, feature_weights = _aggregate(node_tokens, strength[rows])
+
+    token_of = np.zeros(graph.num_nodes, dtype=np.uint64)
+    token_of[rows] = node_tokens
+    is_feature = np.zeros(graph.num_nodes, dtype=bool)
+    is_feature[rows] = True
+    mask = is_feature[graph.link_source] & is_feature[graph.link_target]
+    shingles = _mix(token_of[graph.link_source[mask]] ^ _mix(token_of[graph.link_target[mask]]))
+    edge_tokens, edge_weights = _aggregate(shingles, weight[mask])
+    return feature_tokens, feature_weights, edge_tokens, edge_weights
+
+
+def sketch_graph(graph: GraphArrays, num_perm: int = NUM_PERM, seed: int = SEED) -> GraphSketch:
+    """Token sets and signatures of a graph"""
+    feature_tokens, feature_weights, edge_tokens, edge_weights = graph_shingles(graph)
+    return GraphSketch(
+        model=graph_model(graph),
+        feature_tokens=feature_tokens,
+        feature_weights=feature_weights,
+        edge_tokens=edge_tokens,
+        edge_weights=edge_weights,
+        feature_signature=minhash(feature_tokens, feature_weights, num_perm, seed),
+        edge_signature=minhash(edge_tokens, edge_weights, num_perm, seed)
+    )
+
+
+def overlap(tokens_a: np.ndarray, weights_a: np.ndarray, tokens_b: np.ndarray, weights_b: np.ndarray,
+            measure: str = 'weighted') -> float:
+    """
+    Exact similarity of two sorted, distinct token sets
+
+    measure: 'jaccard' (|A ∩ B| / |A ∪ B|) or 'weighted' (Σ min / Σ max of the weights)
+    """
+    common, ia, ib = np.intersect1d(tokens_a, tokens_b, assume_unique=True, return_indices=True)
+    if measure == 'jaccard':
+        union = len(tokens_a) + len(tokens_b) - len(common)
+        return len(common) / union if union else 0.0
+    shared = float(np.minimum(weights_a[ia], weights_b[ib]).sum())
+    union = float(weights_a.sum() + weights_b.sum()) - shared
+    return shared / union if union > 0 else 0.0
+
+
+def _pack_features(tokens: np.ndarray, weights: np.ndarray) -> bytes:
+    return zlib.compress(tokens.astype(np.uint64).tobytes() + weights.astype(np.float32).tobytes())
+
+
+def _unpack_features(blob: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    raw = zlib.decompress(blob)
+    n = len(raw) // 12
+    return (np.frombuffer(raw[:8 * n], dtype=np.uint64),
+            np.frombuffer(raw[8 * n:], dtype=np.float32).astype(np.float64))
+
+
+def _load(path: str, cache: bool) -> GraphArrays:
+    return load_graph_cached(path) if cache else load_graph(path)
+
+
+def _extract(path: str, cache: bool, num_perm: int) -> Tuple[str, int, int, GraphSketch]:
+    """Sketch one graph file (runs in worker processes)"""
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns, sketch_graph(_load(path, cache), num_perm)
+
+
+@dataclass
+class SimilarGraph:
+    """A query result"""
+    graph: str
+    model: str
+    score: float                # Exact similarity when reranked, else the estimate
+    estimate: float             # From signature agreement
+    feature_similarity: float   # Per channel, exact when reranked
+    edge_similarity: float
+    band_matches: int           # LSH bands shared with the query
+    exact: bool
+
+
+class SimilarityIndex:
+    """
+    LSH index of graph MinHash signatures for nearest-neighbor search
+
+    Each graph's feature and edge signatures are split into bands; a band hash is a
+    bucket key in a SQLite table clustered on (band, hash). A query fetches only the
+    graphs sharing at least one bucket with it, ranks them by signature agreement, and
+    optionally reranks the best ones exactly: features from the stored weighted sets,
+    edges by reloading the candidate graphs. Graphs are added incrementally and
+    unchanged files (size + mtime) are skipped. One instance may be shared by threads.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_SIMILARITY_PATH, num_perm: int = NUM_PERM,
+                 num_bands: int = NUM_BANDS):
+        if num_perm % num_bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of num_bands ({num_bands})")
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if str(path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=30.0, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        # Signatures are only comparable under the settings the index was built with
+        self._conn.executemany('INSERT OR IGNORE INTO settings VALUES (?, ?)',
+                               (('num_perm', num_perm), ('num_bands', num_bands), ('seed', SEED)))
+        self._conn.commit()
+        settings = dict(self._conn.execute('SELECT key, value FROM settings'))
+        self.num_perm = settings['num_perm']
+        self.num_bands = settings['num_bands']
+        if settings['seed'] != SEED:
+            raise ValueError(f"{path} was built with a different MinHash seed")
+
+    # Building
+
+    def is_current(self, path: Union[str, Path]) -> bool:
+        """Whether a graph file is indexed with its current size and mtime"""
+        path = str(Path(path).resolve())
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime_ns FROM graphs WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return False
+        stat = os.stat(path)
+        return row[0] == stat.st_size and row[1] == stat.st_mtime_ns
+
+    def add_graph(self, path: Union[str, Path], graph: Optional[GraphArrays] = None, cache: bool = True):
+        """Index one graph file (replacing an older entry for the same path)"""
+        path = str(Path(path).resolve())
+        if graph is None:
+            self._write(*_extract(path, cache, self.num_perm))
+        else:
+            stat = os.stat(path)
+            self._write(path, stat.st_size, stat.st_mtime_ns, sketch_graph(graph, self.num_perm))
+
+    def update(self, paths: Iterable[Union[str, Path]], processes: int = 1, cache: bool = True,
+               on_graph: Optional[Callable[[str, Optional[Exception]], None]] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date with a set of graph files
+
+        Unchanged graphs are skipped; sketches are computed in `processes` worker processes.
+
+        - on_graph: Called with (path, error or None) as each graph is indexed
+
+        Returns: counts of 'indexed', 'skipped' and 'failed' graphs
+        """
+        paths = [str(Path(p).resolve()) for p in paths]
+        todo = [p for p in paths if not self.is_current(p)]
+        counts = {'indexed': 0, 'skipped': len(paths) - len(todo), 'failed': 0}
+
+        def finish(path: str, entry: Optional[tuple], error: Optional[Exception]):
+            if entry is not None:
+                self._write(*entry)
+                counts['indexed'] += 1
+            else:
+                counts['failed'] += 1
+            if on_graph is not None:
+                on_graph(path, error)
+
+        if processes <= 1:
+            for path in todo:
+                try:
+                    entry = _extract(path, cache, self.num_perm)
+                except Exception as e:
+                    finish(path, None, e)
+                else:
+                    finish(path, entry, None)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = {pool.submit(_extract, path, cache, self.num_perm): path for path in todo}
+                for future in as_completed(futures):
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        finish(futures[future], None, e)
+                    else:
+                        finish(futures[future], entry, None)
+        return counts
+
+    def _band_keys(self, sketch: GraphSketch) -> List[Tuple[int, int]]:
+        """(band, hash) bucket keys; feature bands first, then edge bands (empty sets get none)"""
+        keys = []
+        for offset, tokens, signature in ((0, sketch.feature_tokens, sketch.feature_signature),
+                                          (self.num_bands, sketch.edge_tokens, sketch.edge_signature)):
+            if len(tokens):
+                keys.extend((offset + band, h) for band, h in enumerate(band_hashes(signature, self.num_bands).tolist()))
+        return keys
+
+    def _write(self, path: str, size: int, mtime_ns: int, sketch: GraphSketch):
+        with self._lock, self._conn:
+            old = self._conn.execute('SELECT id FROM graphs WHERE path = ?', (path,)).fetchone()
+            if old is not None:
+                self._conn.execute('DELETE FROM buckets WHERE graph_id = ?', old)
+                self._conn.execute('DELETE FROM graphs WHERE id = ?', old)
+            graph_id = self._conn.execute(
+                'INSERT INTO graphs (path, model, size, mtime_ns, num_features, num_edges, feature_signature, '
+                'edge_signature, features, indexed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, sketch.model, size, mtime_ns, len(sketch.feature_tokens), len(sketch.edge_tokens),
+                 sketch.feature_signature.tobytes(), sketch.edge_signature.tobytes(),
+                 _pack_features(sketch.feature_tokens, sketch.feature_weights), time.time())
+            ).lastrowid
+            self._conn.executemany('INSERT OR IGNORE INTO buckets (band, hash, graph_id) VALUES (?, ?, ?)',
+                                   ((band, h, graph_id) for band, h in self._band_keys(sketch)))
+
+    def remove(self, path: Union[str, Path]) -> bool:
+        """Drop a graph; returns whether it was indexed"""
+        path = str(Path(path).resolve())
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT id FROM graphs WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute('DELETE FROM buckets WHERE graph_id = ?', row)
+            self._conn.execute('DELETE FROM graphs WHERE id = ?', row)
+        return True
+
+    # Queries
+
+    def query(self, graph: Union[str, Path, GraphArrays], k: int = 10, rerank: Optional[str] = 'weighted',
+              rerank_depth: Optional[int] = None, edge_weight: float = 0.5, cache: bool = True) -> List[SimilarGraph]:
+        """
+        Indexed graphs most similar to a graph
+
+        - graph: Graph file (excluded from its own results) or loaded GraphArrays
+        - rerank: Exact measure for the best candidates ('weighted', 'jaccard'), or None to
+          rank by the MinHash estimate alone
+        - rerank_depth: Candidates reranked exactly (default 4k)
+        - edge_weight: Weight of edge similarity against feature similarity in the score
+
+        Returns: Up to k results, most similar first
+        """
+        if rerank is not None and rerank not in RERANK_MEASURES:
+            raise ValueError(f"Unknown rerank measure: {rerank} (expected one of {', '.join(RERANK_MEASURES)})")
+        own_path = None
+        if not isinstance(graph, GraphArrays):
+            own_path = str(Path(graph).resolve())
+            graph = _load(own_path, cache)
+        sketch = sketch_graph(graph, self.num_perm)
+
+        with self._lock:
+            matches: Dict[int, int] = {}
+            for band, h in self._band_keys(sketch):
+                for graph_id, in self._conn.execute(
+                        'SELECT graph_id FROM buckets WHERE band = ? AND hash = ?', (band, h)):
+                    matches[graph_id] = matches.get(graph_id, 0) + 1
+            rows = self._rows('id, path, model, feature_signature, edge_signature', list(matches))
+
+        results = []
+        for graph_id, path, model, feature_signature, edge_signature in rows:
+            if path == own_path:
+                continue
+            features = float(np.mean(np.frombuffer(feature_signature, dtype=np.uint64) == sketch.feature_signature))
+            edges = float(np.mean(np.frombuffer(edge_signature, dtype=np.uint64) == sketch.edge_signature))
+            estimate = (1.0 - edge_weight) * features + edge_weight * edges
+            results.append(SimilarGraph(graph=path, model=model, score=estimate, estimate=estimate,
+                                        feature_similarity=features, edge_similarity=edges,
+                                        band_matches=matches[graph_id], exact=False))
+        results.sort(key=lambda r: (-r.score, r.graph))
+
+        if rerank is not None:
+            depth = rerank_depth if rerank_depth is not None else 4 * k
+            top = results[:depth]
+            self._rerank(top, sketch, rerank, edge_weight, cache)
+            results = sorted(top, key=lambda r: (-r.score, r.graph)) + results[depth:]
+        return results[:k]
+
+    def _rows(self, columns: str, graph_ids: List[int]) -> List[tuple]:
+        rows = []
+        for start in range(0, len(graph_ids), 400):
+            chunk = graph_ids[start:start + 400]
+            rows.extend(self._conn.execute(
+                f"SELECT {columns} FROM graphs WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return rows
+
+    def _rerank(self, results: List[SimilarGraph], sketch: GraphSketch, measure: str, edge_weight: float,
+                cache: bool):
+        """Replace estimates with exact similarities (edges keep the estimate if the file is gone)"""
+        with self._lock:
+            stored = dict(self._conn.execute(
+                f"SELECT path, features FROM graphs WHERE path IN ({','.join('?' * len(results))})",
+                [r.graph for r in results]
+            ).fetchall()) if results else {}
+        for result in results:
+            tokens, weights = _unpack_features(stored[result.graph])
+            result.feature_similarity = overlap(sketch.feature_tokens, sketch.feature_weights, tokens, weights, measure)
+            if edge_weight > 0 and os.path.exists(result.graph):
+                _, _, tokens, weights = graph_shingles(_load(result.graph, cache))
+                result.edge_similarity = overlap(sketch.edge_tokens, sketch.edge_weights, tokens, weights, measure)
+            result.score = (1.0 - edge_weight) * result.feature_similarity + edge_weight * result.edge_similarity
+            result.exact = True
+
+    # Bookkeeping
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM graphs').fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            graphs, = self._conn.execute('SELECT COUNT(*) FROM graphs').fetchone()
+            buckets, = self._conn.execute('SELECT COUNT(DISTINCT band || ":" || hash) FROM buckets').fetchone()
+        return {'graphs': graphs, 'buckets': buckets, 'num_perm': self.num_perm, 'num_bands': self.num_bands}
+
+    def close(self):
+        self._conn.close()
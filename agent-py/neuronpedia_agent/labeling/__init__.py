@@ -1,5 +1,7 @@
 """Labeling modules for supernode naming"""
 
 from .auto_labeler import AutoLabeler
+from .label_cache import LabelCache, label_key
+from .rate_limiter import RateLimiter, TokenBucket
 
-__all__ = ['AutoLabeler']
+__all__ = ['AutoLabeler', 'LabelCache', 'label_key', 'RateLimiter', 'TokenBucket']
@@ -1,8 +1,13 @@
 """Auto-labeling module using LLM to generate supernode labels"""
 
-from typing import Dict
+import asyncio
+import random
+from typing import Dict, List, Optional, Sequence
 import anthropic
 from ..analysis.grouping_engine import Supernode
+from ..utils.profiling import add_tokens, profiled
+from .label_cache import LabelCache
+from .rate_limiter import RateLimiter
 
 
 LABELING_PROMPT = """
@@ -34,12 +39,42 @@ Generate a label:
 
 
 class AutoLabeler:
-    """Generate human-readable labels for supernodes using an LLM"""
+    """
+    Generate human-readable labels for supernodes using an LLM
 
-    def __init__(self, api_key: str, model: str = "claude-sonnet-4-20250514"):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    generate_label() labels one supernode with the synchronous client. generate_labels()
+    labels a whole batch concurrently with the async client: at most `max_concurrency`
+    requests in flight, optional requests/tokens-per-minute budgets, and retries with
+    jittered exponential backoff on 429, 5xx and connection errors. `base_url` points
+    the clients at another endpoint (e.g. a local stub server).
+
+    With a LabelCache, supernodes labeled before (same members, role, layer range, prompt,
+    target and model) are answered from the cache without an API call.
+    """
+
+    def __init__(self, api_key: str, model: str = "claude-sonnet-4-20250514", base_url: Optional[str] = None,
+                 max_concurrency: int = 8, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, timeout: float = 60.0,
+                 cache: Optional[LabelCache] = None):
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url, timeout=timeout)
         self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_tokens = 50
+        self.temperature = 0.7
+        self.cache = cache
+        # Running totals across calls, for reporting
+        self.usage = {'requests': 0, 'retries': 0, 'failures': 0, 'input_tokens': 0, 'output_tokens': 0}
 
+    @profiled('labeling.generate_label')
     def generate_label(self, supernode: Supernode, node_data: Dict, prompt: str = "", target_logit: str = "") -> str:
         """
         Generate a concise, interpretable label for a supernode
@@ -52,28 +87,154 @@ class AutoLabeler:
 
         Returns: Label string (2-5 words)
         """
+        key = self._cache_key(supernode, node_data, prompt, target_logit)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
         labeling_prompt = self._create_labeling_prompt(supernode, node_data, prompt, target_logit)
 
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=50,
-                temperature=0.7,
-                messages=[
-                    {"role": "user", "content": labeling_prompt}
-                ]
-            )
-
-            label = message.content[0].text.strip()
-            # Ensure label is concise (truncate if too long)
-            words = label.split()
-            if len(words) > 5:
-                label = " ".join(words[:5])
-
+            message = self.client.messages.create(**self._request(labeling_prompt))
+            self._record_usage(message)
+            label = self._clean_label(message.content[0].text)
+            if key is not None:
+                self.cache.put(key, label, self.model)
             return label
         except Exception as e:
             # Fallback to generic label
-            return f"{supernode.functional_role} (layers {supernode.layer_range[0]}-{supernode.layer_range[1]})"
+            self.usage['failures'] += 1
+            return self._fallback_label(supernode)
+
+    @profiled('labeling.generate_labels')
+    def generate_labels(self, supernodes: Sequence[Supernode], node_data: Dict, prompt: str = "",
+                        target_logit: str = "") -> List[str]:
+        """
+        Label a batch of supernodes concurrently
+
+        node_data: Node dicts keyed by node id, covering the nodes of every supernode
+
+        Returns: Labels in the order of `supernodes` (generic fallback label where a request
+        still fails after all retries)
+        """
+        return asyncio.run(self.generate_labels_async(supernodes, node_data, prompt, target_logit))
+
+    async def generate_labels_async(self, supernodes: Sequence[Supernode], node_data: Dict, prompt: str = "",
+                                    target_logit: str = "") -> List[str]:
+        """Coroutine version of generate_labels, for callers already running an event loop"""
+        labels: List[Optional[str]] = [None] * len(supernodes)
+        keys = [self._cache_key(snode, node_data, prompt, target_logit) for snode in supernodes]
+        pending = []
+        for i, key in enumerate(keys):
+            if key is not None:
+                labels[i] = self.cache.get(key)
+            if labels[i] is None:
+                pending.append(i)
+        if not pending:
+            return labels
+
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        limiter = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+
+        # max_retries=0: retries are handled here so they also go through the rate limiter
+        async with anthropic.AsyncAnthropic(api_key=self.api_key, base_url=self.base_url,
+                                            timeout=self.timeout, max_retries=0) as client:
+            async def label_one(supernode: Supernode) -> Optional[str]:
+                labeling_prompt = self._create_labeling_prompt(supernode, node_data, prompt, target_logit)
+                async with semaphore:
+                    try:
+                        message = await self._create_with_retry(client, limiter, labeling_prompt)
+                    except Exception:
+                        self.usage['failures'] += 1
+                        return None
+                return self._clean_label(message.content[0].text)
+
+            results = await asyncio.gather(*(label_one(supernodes[i]) for i in pending))
+
+        new_entries = []
+        for i, label in zip(pending, results):
+            if label is None:
+                label = self._fallback_label(supernodes[i])
+            elif keys[i] is not None:
+                new_entries.append((keys[i], label, self.model))
+            labels[i] = label
+        if new_entries:
+            self.cache.put_many(new_entries)
+        return labels
+
+    async def _create_with_retry(self, client: 'anthropic.AsyncAnthropic', limiter: RateLimiter, labeling_prompt: str):
+        # Rough pre-request estimate (~4 characters per token), corrected from the response usage
+        estimated_tokens = len(labeling_prompt) // 4 + self.max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(estimated_tokens)
+            try:
+                message = await client.messages.create(**self._request(labeling_prompt))
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                self.usage['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+
+            usage = self._record_usage(message)
+            if usage is not None:
+                limiter.settle(estimated_tokens, usage)
+            return message
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than a server-sent retry-after"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('retry-after', 0)))
+            except ValueError:
+                pass
+        return delay
+
+    def _cache_key(self, supernode: Supernode, node_data: Dict, prompt: str, target_logit: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.key_for(supernode, node_data, prompt, target_logit, self.model)
+
+    def _request(self, labeling_prompt: str) -> Dict:
+        request = {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'messages': [
+                {"role": "user", "content": labeling_prompt}
+            ]
+        }
+        if self.temperature is not None:
+            # extra_body: newer SDK releases no longer take temperature as a keyword argument
+            request['extra_body'] = {'temperature': self.temperature}
+        return request
+
+    def _record_usage(self, message) -> Optional[int]:
+        """Add a response's token usage to the running totals; returns its total tokens"""
+        self.usage['requests'] += 1
+        usage = getattr(message, 'usage', None)
+        if usage is None:
+            return None
+        self.usage['input_tokens'] += usage.input_tokens
+        self.usage['output_tokens'] += usage.output_tokens
+        add_tokens(usage.input_tokens, usage.output_tokens)
+        return usage.input_tokens + usage.output_tokens
+
+    @staticmethod
+    def _clean_label(text: str) -> str:
+        label = text.strip()
+        # Ensure label is concise (truncate if too long)
+        words = label.split()
+        if len(words) > 5:
+            label = " ".join(words[:5])
+        return label
+
+    @staticmethod
+    def _fallback_label(supernode: Supernode) -> str:
+        return f"{supernode.functional_role} (layers {supernode.layer_range[0]}-{supernode.layer_range[1]})"
 
     def _create_labeling_prompt(self, supernode: Supernode, node_data: Dict, prompt: str, target_logit: str) -> str:
         """
@@ -90,9 +251,9 @@ class AutoLabeler:
         feature_details = []
         for node_id in supernode.node_ids:
             node = node_data.get(node_id, {})
-            explanation = node.get('explanation', 'No explanation')
+            explanation = node.get('explanation') or node.get('clerp') or 'No explanation'
             layer = node.get('layer', '?')
-            feature_idx = node.get('feature_index', '?')
+            feature_idx = node.get('feature_index', node.get('feature', '?'))
 
             detail = f"- Layer {layer}, Feature {feature_idx}: {explanation}"
 
@@ -114,3 +275,10 @@ class AutoLabeler:
             layer_max=supernode.layer_range[1],
             feature_details=feature_details_str
         )
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and connection failures are worth retrying"""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return error.status_code == 429 or error.status_code >= 500
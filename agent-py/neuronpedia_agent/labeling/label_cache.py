@@ -0,0 +1,168 @@
+"""Persistent SQLite cache of supernode labels"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from ..storage import load_graph, read_cleaned_output
+
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'neuronpedia_agent' / 'labels.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    key TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def label_key(node_ids: Sequence[str], features: Sequence, functional_role: str,
+              layer_range: Tuple[int, int], prompt: str, target_logit: str, model: str) -> str:
+    """
+    Canonical hash of the labeling-prompt inputs
+
+    node_ids and features are paired and sorted, so the key does not depend on the
+    order nodes were grouped in.
+    """
+    members = sorted(zip((str(n) for n in node_ids), (str(f) for f in features)))
+    payload = json.dumps({
+        'nodes': members,
+        'role': functional_role,
+        'layers': [int(layer_range[0]), int(layer_range[1])],
+        'prompt': prompt,
+        'target_logit': target_logit,
+        'model': model
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _feature_of(node: Dict):
+    feature = node.get('feature_index', node.get('feature'))
+    return '' if feature is None else feature
+
+
+class LabelCache:
+    """
+    Disk-backed label store keyed by label_key()
+
+    - ttl: seconds after which an entry is treated as missing and purged (None = never)
+    - max_entries: least-recently-used entries beyond this count are evicted on insert
+
+    hits / misses count lookups made through this instance.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH, max_entries: Optional[int] = 100_000,
+                 ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several processes may share a cache file; WAL lets readers proceed during writes
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(_SCHEMA)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS labels_accessed ON labels (accessed)')
+        self._conn.commit()
+
+    def key_for(self, supernode, node_data: Dict, prompt: str, target_logit: str, model: str) -> str:
+        """label_key() of a supernode, taking feature indices from node_data"""
+        features = [_feature_of(node_data.get(nid, {})) for nid in supernode.node_ids]
+        return label_key(supernode.node_ids, features, supernode.functional_role,
+                         supernode.layer_range, prompt, target_logit, model)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._conn.execute('SELECT label, created FROM labels WHERE key = ?', (key,)).fetchone()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            self._conn.execute('DELETE FROM labels WHERE key = ?', (key,))
+            self._conn.commit()
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute('UPDATE labels SET accessed = ?, hits = hits + 1 WHERE key = ?', (now, key))
+        self._conn.commit()
+        return row[0]
+
+    def put(self, key: str, label: str, model: str = ''):
+        self.put_many([(key, label, model)])
+
+    def put_many(self, entries: Iterable[Tuple[str, str, str]]):
+        """Insert or replace (key, label, model) entries, then apply eviction"""
+        now = time.time()
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO labels (key, label, model, created, accessed) VALUES (?, ?, ?, ?, ?)',
+            ((key, label, model, now, now) for key, label, model in entries)
+        )
+        self._evict(now)
+        self._conn.commit()
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            self._conn.execute('DELETE FROM labels WHERE created < ?', (now - self.ttl,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                'DELETE FROM labels WHERE key IN '
+                '(SELECT key FROM labels ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        self._conn.execute('DELETE FROM labels')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def warm(self, cleaned_graph_files: Iterable[Union[str, Path]], model: str, prompt: str = "",
+             target_logit: str = "") -> int:
+        """
+        Seed the cache from previous cleanup outputs (cleaned_graph.json)
+
+        Feature indices come from each file's original_graph, embedded or referenced.
+        Generic fallback labels ("<role> (layers a-b)") are skipped. prompt / target_logit /
+        model must match what those runs labeled with for the entries to be hit later.
+
+        Returns: Number of labels stored
+        """
+        entries: List[Tuple[str, str, str]] = []
+        for path in cleaned_graph_files:
+            output = read_cleaned_output(path)
+            graph = load_graph(path) if 'original_graph' in output else None
+            index = graph.index if graph is not None else {}
+            for snode in output.get('supernodes', []):
+                label = snode.get('label')
+                role = snode.get('functional_role', '')
+                layer_range = snode.get('layer_range') or (0, 0)
+                if not label or label == f"{role} (layers {layer_range[0]}-{layer_range[1]})":
+                    continue
+                node_ids = snode.get('node_ids', [])
+                features = [_feature_of(graph.node(index[nid]) if nid in index and graph.has_data[index[nid]] else {})
+                            for nid in node_ids]
+                key = label_key(node_ids, features, role, layer_range, prompt, target_logit, model)
+                entries.append((key, label, model))
+        self.put_many(entries)
+        return len(entries)
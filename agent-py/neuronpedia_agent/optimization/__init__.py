@@ -2,10 +2,12 @@
 
 from .path_tracer import PathTracer, ComputationPath
 from .metrics import MetricsCalculator, ValidationResult
+from .greedy import GreedyOptimizer
 
 __all__ = [
     'PathTracer',
     'ComputationPath',
     'MetricsCalculator',
-    'ValidationResult'
+    'ValidationResult',
+    'GreedyOptimizer'
 ]
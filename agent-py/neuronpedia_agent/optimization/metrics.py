@@ -1,7 +1,17 @@
 """Metrics calculation module for evaluating subgraph quality"""
 
-from typing import Dict
+from typing import Dict, Iterable, Optional
 from dataclasses import dataclass
+import numpy as np
+import scipy.sparse as sp
+from ..analysis.graph_analyzer import GraphAnalyzer
+from ..utils.profiling import profiled
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
 
 
 @dataclass
@@ -15,47 +25,140 @@ class ValidationResult:
 
 
 class MetricsCalculator:
-    """Compute quality metrics for the cleaned subgraph"""
-
-    def __init__(self, full_graph: Dict, subgraph: Dict):
+    """
+    Compute quality metrics for the cleaned subgraph
+
+    The full graph is loaded once into a sparse adjacency matrix (via GraphAnalyzer);
+    both scores are then computed with sparse matrix-vector products, so repeated
+    scoring of different pinned sets only pays for the propagation itself.
+    Edge weights are taken in absolute value, as in circuit-tracer's graph scores.
+    """
+
+    @profiled('optimization.metrics_setup')
+    def __init__(self, full_graph: Dict, subgraph: Dict, analyzer: Optional[GraphAnalyzer] = None,
+                 max_hops: Optional[int] = None, tol: float = 1e-10):
         self.full_graph = full_graph
         self.subgraph = subgraph
+        self.analyzer = analyzer if analyzer is not None else GraphAnalyzer(full_graph)
+        self.max_hops = max_hops
+        self.tol = tol
+
+        adjacency = self.analyzer.adjacency_matrix()
+        n = adjacency.shape[0]
+
+        # Column-normalize so each node's incoming influence sums to 1
+        incoming = np.asarray(adjacency.sum(axis=0)).ravel()
+        scale = np.divide(1.0, incoming, out=np.zeros(n), where=incoming > 0)
+        normalized = adjacency @ sp.diags(scale)
+
+        # Influence cannot pass through a logit, only end at one
+        is_logit = self.analyzer.is_logit
+        self._incoming = incoming
+        self._propagation = (normalized @ sp.diags((~is_logit).astype(float))).tocsr()
+        self._logit_weights = self._target_logit_weights()
+        self._direct = normalized @ self._logit_weights
+        self._sources = (incoming == 0) & ~is_logit
+        self._influence = None
+
+    def _target_logit_weights(self) -> np.ndarray:
+        """Weight logits by token probability when available, otherwise uniformly"""
+        is_logit = self.analyzer.is_logit
+        weights = is_logit.astype(float)
+        for idx in np.flatnonzero(is_logit):
+            node = self.analyzer.get_node(self.analyzer.node_ids[idx])
+            if node and node.get('token_prob'):
+                weights[idx] = node['token_prob']
+        total = weights.sum()
+        return weights / total if total > 0 else weights
+
+    @property
+    def propagation(self) -> sp.csr_matrix:
+        """Column-normalized |adjacency| with logit columns zeroed: influence only passes through non-logits"""
+        return self._propagation
+
+    @property
+    def direct_influence(self) -> np.ndarray:
+        """Normalized edge weight from each node straight into the (probability-weighted) target logits"""
+        return _read_only(self._direct)
+
+    @property
+    def sources(self) -> np.ndarray:
+        """Mask of input nodes: no incoming edges and not a logit"""
+        return _read_only(self._sources)
+
+    @property
+    def incoming_weight(self) -> np.ndarray:
+        """Total absolute incoming edge weight of each node"""
+        return _read_only(self._incoming)
+
+    def propagate(self, matrix: sp.csr_matrix, rhs: np.ndarray) -> np.ndarray:
+        """
+        Sum influence over all paths: x = (I + A + A^2 + ...) rhs.
 
-    def compute_replacement_score(self) -> float:
+        Attribution graphs are DAGs, so A is nilpotent and the truncated Neumann
+        series is exact once it runs past the longest path.
+        """
+        max_hops = self.max_hops if self.max_hops is not None else matrix.shape[0]
+        result = rhs.copy()
+        term = rhs
+        for _ in range(max_hops):
+            term = matrix @ term
+            if not term.any() or np.abs(term).max() <= self.tol * max(np.abs(result).max(), 1.0):
+                break
+            result += term
+        return result
+
+    def influence(self) -> np.ndarray:
+        """Path-sum influence of every node on the (probability-weighted) target logits"""
+        if self._influence is None:
+            self._influence = self.propagate(self._propagation, self._direct)
+        return self._influence
+
+    def total_influence(self) -> float:
+        """Influence of all input nodes (no incoming edges) on the target logits"""
+        return float(self.influence()[self._sources].sum())
+
+    def _pinned_mask(self, pinned_ids: Optional[Iterable[str]]) -> np.ndarray:
+        if pinned_ids is None:
+            pinned_ids = self.subgraph.get('pinned_node_ids', [])
+        mask = np.zeros(len(self.analyzer.node_ids), dtype=bool)
+        indices = [self.analyzer.node_index[nid] for nid in pinned_ids if nid in self.analyzer.node_index]
+        mask[indices] = True
+        return mask
+
+    def compute_replacement_score(self, pinned_ids: Optional[Iterable[str]] = None) -> float:
         """
         Replacement = (end-to-end influence through pinned features) / (total influence)
 
         Algorithm:
-        1. Compute total influence from input tokens to target logits in full graph
-        2. Compute influence that flows through pinned nodes in subgraph
+        1. Compute total path-sum influence from input nodes (no incoming edges) to target logits
+        2. Repeat the propagation on the subgraph whose intermediate nodes are all pinned
         3. Return ratio
         """
-        # Get pinned node IDs
-        pinned_ids = set(self.subgraph.get('pinned_node_ids', []))
-
-        # Calculate total influence in full graph to logits
-        total_influence = 0.0
-        for edge in self.full_graph.get('edges', []):
-            if edge['target'].startswith('logit_'):
-                total_influence += edge['weight']
-
-        # Calculate influence through pinned nodes
-        pinned_influence = 0.0
-        for edge in self.full_graph.get('edges', []):
-            if edge['source'] in pinned_ids and edge['target'].startswith('logit_'):
-                pinned_influence += edge['weight']
-            elif edge['source'] in pinned_ids and edge['target'] in pinned_ids:
-                # Indirect influence through other pinned nodes
-                for edge2 in self.full_graph.get('edges', []):
-                    if edge2['source'] == edge['target'] and edge2['target'].startswith('logit_'):
-                        pinned_influence += edge['weight'] * edge2['weight']
+        pinned = self._pinned_mask(pinned_ids)
+        if not pinned.any():
+            return 0.0
 
+        total_influence = self.total_influence()
         if total_influence == 0:
             return 0.0
 
-        return min(pinned_influence / total_influence, 1.0)
+        # Influence on logits along paths that stay inside the pinned set
+        restrict = sp.diags(pinned.astype(float))
+        pinned_influence = self.propagate(
+            (restrict @ self._propagation @ restrict).tocsr(),
+            np.where(pinned, self._direct, 0.0)
+        )
 
-    def compute_completeness_score(self) -> float:
+        # Pinned inputs start their own paths; unpinned inputs must enter the pinned set
+        through_pinned = (
+            pinned_influence[self._sources & pinned].sum()
+            + (self._propagation[self._sources & ~pinned] @ pinned_influence).sum()
+        )
+
+        return min(float(through_pinned) / total_influence, 1.0)
+
+    def compute_completeness_score(self, pinned_ids: Optional[Iterable[str]] = None) -> float:
         """
         Completeness = (incoming edge influence explained by subgraph) / (total incoming influence)
 
@@ -64,34 +167,19 @@ class MetricsCalculator:
         2. For each pinned node, sum incoming edge weights from OTHER pinned nodes
         3. Return ratio averaged across all pinned nodes
         """
-        pinned_ids = set(self.subgraph.get('pinned_node_ids', []))
-
-        if not pinned_ids:
+        pinned = self._pinned_mask(pinned_ids)
+        if not pinned.any():
             return 0.0
 
-        total_completeness = 0.0
-        num_nodes = 0
-
-        for node_id in pinned_ids:
-            # Sum all incoming edges to this node
-            total_incoming = 0.0
-            explained_incoming = 0.0
-
-            for edge in self.full_graph.get('edges', []):
-                if edge['target'] == node_id:
-                    total_incoming += edge['weight']
-                    if edge['source'] in pinned_ids:
-                        explained_incoming += edge['weight']
-
-            if total_incoming > 0:
-                total_completeness += explained_incoming / total_incoming
-                num_nodes += 1
-
-        if num_nodes == 0:
+        # Masked row sums: weight each source row by whether it is pinned
+        explained = self.analyzer.adjacency_matrix().T @ pinned.astype(float)
+        scored = pinned & (self._incoming > 0)
+        if not scored.any():
             return 0.0
 
-        return total_completeness / num_nodes
+        return float(np.mean(explained[scored] / self._incoming[scored]))
 
+    @profiled('optimization.validate')
     def validate_subgraph(self, min_replacement: float = 0.5, min_completeness: float = 0.7) -> ValidationResult:
         """
         Check if subgraph meets quality thresholds:
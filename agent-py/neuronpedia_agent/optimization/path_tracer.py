@@ -4,6 +4,7 @@ from typing import List
 from dataclasses import dataclass
 from ..analysis.graph_analyzer import GraphAnalyzer
 from ..analysis.grouping_engine import Supernode
+from ..utils.profiling import profiled
 
 
 @dataclass
@@ -22,6 +23,7 @@ class PathTracer:
         self.analyzer = graph_analyzer
         self.supernodes = supernodes
 
+    @profiled('optimization.trace')
     def trace_computation(self, input_token: str, output_logit: str) -> ComputationPath:
         """
         Trace how information flows from input_token to output_logit through supernodes
@@ -40,16 +42,15 @@ class PathTracer:
             # Check if any nodes in this supernode are input features
             for node_id in snode.node_ids:
                 node = self.analyzer.get_node(node_id)
-                if node and node.get('layer', 0) <= 5:
+                if node and self.analyzer.layer_of(node_id) <= 5:
                     input_supernodes.append(snode)
                     break
 
             # Check if any nodes boost the target output
             for node_id in snode.node_ids:
-                for edge in self.analyzer.edges:
-                    if edge['source'] == node_id and output_logit in edge['target']:
-                        output_supernodes.append(snode)
-                        break
+                targets, _ = self.analyzer.successors(node_id)
+                if any(output_logit in self.analyzer.node_ids[t] for t in targets):
+                    output_supernodes.append(snode)
 
         # Build sequence by following influence paths
         sequence = []
@@ -93,15 +94,7 @@ class PathTracer:
 
     def _calculate_influence_between_supernodes(self, source: Supernode, target: Supernode) -> float:
         """Calculate total influence from source supernode to target supernode"""
-        total_influence = 0.0
-
-        for source_node in source.node_ids:
-            for target_node in target.node_ids:
-                for edge in self.analyzer.edges:
-                    if edge['source'] == source_node and edge['target'] == target_node:
-                        total_influence += edge['weight']
-
-        return total_influence
+        return self.analyzer.edge_weight_between(source.node_ids, target.node_ids)
 
     def generate_narrative(self, path: ComputationPath) -> str:
         """
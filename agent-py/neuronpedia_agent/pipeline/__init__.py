@@ -0,0 +1,31 @@
+"""End-to-end cleanup pipelines for single graphs and batches"""
+
+from .cleanup import (
+    CleanupOptions, CleanupResult, build_output, centrality_settings, cleanup_graph, grouping_settings,
+    label_cache_settings, labeling_settings, selection_settings, write_json_atomic, write_output
+)
+from .batch import BatchManifest, BatchSummary, GraphRecord, find_graph_files, run_batch
+from .autotune import AutotuneReport, TuneResult, autotune, pareto_frontier
+
+__all__ = [
+    'CleanupOptions',
+    'CleanupResult',
+    'build_output',
+    'centrality_settings',
+    'cleanup_graph',
+    'grouping_settings',
+    'label_cache_settings',
+    'labeling_settings',
+    'selection_settings',
+    'write_json_atomic',
+    'write_output',
+    'BatchManifest',
+    'BatchSummary',
+    'GraphRecord',
+    'find_graph_files',
+    'run_batch',
+    'AutotuneReport',
+    'TuneResult',
+    'autotune',
+    'pareto_frontier'
+]
@@ -0,0 +1,250 @@
+"""Parameter sweep over strategy × grouping × max_nodes against one shared analysis"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from ..analysis.graph_analyzer import GraphAnalyzer
+from ..analysis.grouping_engine import GroupingEngine, Supernode
+from ..analysis.node_selector import NodeSelector
+from ..embeddings import DEFAULT_EMBEDDING_MODEL, VectorCache, get_embedder, open_vector_cache
+from ..optimization.metrics import MetricsCalculator
+from ..storage import GraphArrays, get_graph
+
+
+STRATEGIES = ('pathway', 'importance', 'balanced', 'optimize')
+GROUPINGS = ('functional', 'semantic', 'layer', 'hybrid')
+
+# Strategies whose selection for N nodes is the first N nodes of a larger selection
+PREFIX_STRATEGIES = ('importance', 'optimize')
+
+
+@dataclass
+class TuneResult:
+    """Scores of one (strategy, grouping, max_nodes) configuration"""
+    strategy: str
+    grouping: str
+    max_nodes: int
+    replacement_score: float
+    completeness_score: float
+    num_supernodes: int
+    passed: bool
+    seconds: float
+    pinned_node_ids: List[str] = field(default_factory=list, repr=False)
+    supernodes: List[Supernode] = field(default_factory=list, repr=False)
+
+    @property
+    def config(self) -> Tuple[str, str, int]:
+        return self.strategy, self.grouping, self.max_nodes
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-friendly scores without the selection itself"""
+        return {
+            'strategy': self.strategy,
+            'grouping': self.grouping,
+            'max_nodes': self.max_nodes,
+            'replacement_score': self.replacement_score,
+            'completeness_score': self.completeness_score,
+            'num_supernodes': self.num_supernodes,
+            'passed': self.passed,
+            'seconds': self.seconds
+        }
+
+
+@dataclass
+class AutotuneReport:
+    """Outcome of a sweep"""
+    results: List[TuneResult]     # Every configuration evaluated, in grid order
+    frontier: List[TuneResult]    # Pareto-optimal results, best combined score first
+    best: Optional[TuneResult]    # Smallest passing configuration, else best combined score
+    num_configs: int              # Size of the grid
+    stopped_early: bool
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'num_configs': self.num_configs,
+            'evaluated': len(self.results),
+            'stopped_early': self.stopped_early,
+            'best': self.best.summary() if self.best else None,
+            'frontier': [r.summary() for r in self.frontier],
+            'results': [r.summary() for r in self.results],
+            'timings': self.timings
+        }
+
+
+class _Memo:
+    """Thread-safe memo: each key is computed once, concurrent callers wait for it"""
+
+    def __init__(self):
+        self._values: Dict[Hashable, Any] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._values:
+                self._values[key] = compute()
+            return self._values[key]
+
+
+def supernode_penalty(num_supernodes: int, ideal_range: Sequence[int]) -> int:
+    """Distance of a supernode count from the ideal range (0 inside it)"""
+    low, high = ideal_range
+    return max(low - num_supernodes, num_supernodes - high, 0)
+
+
+def pareto_frontier(results: List[TuneResult], ideal_range: Sequence[int] = (3, 7)) -> List[TuneResult]:
+    """
+    Results not dominated on (replacement ↑, completeness ↑, supernode-count penalty ↓)
+
+    Among results with identical objectives only the smallest max_nodes is kept.
+    Sorted by replacement + completeness, highest first.
+    """
+    def objectives(r: TuneResult) -> Tuple[float, float, int]:
+        return r.replacement_score, r.completeness_score, -supernode_penalty(r.num_supernodes, ideal_range)
+
+    ordered = sorted(results, key=lambda r: (r.max_nodes, r.config))
+    points = [objectives(r) for r in ordered]
+    frontier = []
+    for i, mine in enumerate(points):
+        # Dominated: another result is at least as good everywhere and better somewhere
+        # (or identical and earlier)
+        dominated = any(
+            all(t >= m for t, m in zip(theirs, mine)) and (theirs != mine or j < i)
+            for j, theirs in enumerate(points) if j != i
+        )
+        if not dominated:
+            frontier.append(ordered[i])
+    frontier.sort(key=lambda r: r.replacement_score + r.completeness_score, reverse=True)
+    return frontier
+
+
+def autotune(graph: Union[str, Path, GraphArrays], strategies: Sequence[str] = STRATEGIES,
+             groupings: Sequence[str] = GROUPINGS, max_nodes_values: Sequence[int] = (10, 20, 30, 40, 50),
+             min_replacement: float = 0.5, min_completeness: float = 0.7,
+             ideal_num_supernodes: Sequence[int] = (3, 7), importance: str = "influence",
+             selection_settings: Optional[Dict[str, Any]] = None, centrality: Optional[Dict] = None,
+             threads: int = 4, early_stop: bool = True, cache: bool = True,
+             embedding_model: Optional[str] = DEFAULT_EMBEDDING_MODEL, embedding_cache: Optional[str] = None,
+             grouping_settings: Optional[Dict[str, Any]] = None,
+             on_result: Optional[Callable[[TuneResult], None]] = None) -> AutotuneReport:
+    """
+    Evaluate the strategy × grouping × max_nodes grid concurrently
+
+    The graph is loaded and analyzed once; node importance (with centrality, if the
+    importance method needs it), the path DAG and the metrics propagation are computed up
+    front and then only read by the worker threads. Selections are memoized per (strategy,
+    max_nodes), so groupings share them (and prefix strategies derive every max_nodes from
+    one run), and scores per selection, since replacement and completeness do not depend
+    on the grouping.
+
+    Configurations run smallest max_nodes first. With early_stop, the first passing
+    result cancels every configuration not yet started.
+
+    - graph: Graph file path or an already loaded GraphArrays
+    - selection_settings: Extra NodeSelector keyword arguments (see cleanup.selection_settings)
+    - centrality: CentralityService keyword arguments (see GraphAnalyzer)
+    - threads: Worker threads sharing the analysis
+    - embedding_model / embedding_cache: Embedder and persistent vector cache for semantic and
+      hybrid grouping (vectors are shared across configurations either way)
+    - grouping_settings: Extra GroupingEngine keyword arguments (see cleanup.grouping_settings)
+    - on_result: Called as each configuration finishes
+
+    Returns: AutotuneReport
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    if not isinstance(graph, GraphArrays):
+        graph = get_graph(graph, cache=cache)
+    timings['load'] = time.perf_counter() - start
+
+    # Shared, read-only analysis
+    start = time.perf_counter()
+    analyzer = GraphAnalyzer.from_arrays(graph, centrality=centrality)
+    metrics = MetricsCalculator(graph, {}, analyzer=analyzer)
+    metrics.influence()
+    analyzer.path_engine.levels()
+    if 'importance' in strategies or 'balanced' in strategies:
+        # Also runs betweenness for importance="centrality"
+        analyzer.compute_node_importance(importance)
+    embedder = get_embedder(embedding_model)
+    vector_cache = open_vector_cache(embedding_cache) if embedding_cache else VectorCache(':memory:')
+    timings['analyze'] = time.perf_counter() - start
+
+    grid = sorted(itertools.product(strategies, groupings, max_nodes_values), key=lambda c: (c[2], c[0], c[1]))
+    largest = max(max_nodes_values)
+    selections = _Memo()
+    scores = _Memo()
+
+    def select(strategy: str, max_nodes: int) -> List[str]:
+        if strategy in PREFIX_STRATEGIES:
+            return selections.get((strategy, largest), lambda: NodeSelector(
+                analyzer, max_nodes=largest, importance=importance, metrics=metrics, **(selection_settings or {})
+            ).select_nodes_for_pinning(strategy))[:max_nodes]
+        return selections.get((strategy, max_nodes), lambda: NodeSelector(
+            analyzer, max_nodes=max_nodes, importance=importance, metrics=metrics, **(selection_settings or {})
+        ).select_nodes_for_pinning(strategy))
+
+    def evaluate(config: Tuple[str, str, int]) -> TuneResult:
+        strategy, grouping, max_nodes = config
+        began = time.perf_counter()
+        pinned = select(strategy, max_nodes)
+        replacement, completeness = scores.get((strategy, max_nodes), lambda: (
+            metrics.compute_replacement_score(pinned), metrics.compute_completeness_score(pinned)
+        ))
+        supernodes = GroupingEngine(analyzer, pinned, embedder=embedder, vector_cache=vector_cache,
+                                    **(grouping_settings or {})).create_supernodes(strategy=grouping)
+        return TuneResult(
+            strategy=strategy,
+            grouping=grouping,
+            max_nodes=max_nodes,
+            replacement_score=replacement,
+            completeness_score=completeness,
+            num_supernodes=len(supernodes),
+            passed=replacement >= min_replacement and completeness >= min_completeness,
+            seconds=time.perf_counter() - began,
+            pinned_node_ids=pinned,
+            supernodes=supernodes
+        )
+
+    start = time.perf_counter()
+    results: List[TuneResult] = []
+    stopped_early = False
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        futures = [pool.submit(evaluate, config) for config in grid]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+            if early_stop and result.passed and not stopped_early:
+                stopped_early = True
+                for pending in futures:
+                    pending.cancel()
+    timings['sweep'] = time.perf_counter() - start
+
+    order = {config: i for i, config in enumerate(grid)}
+    results.sort(key=lambda r: order[r.config])
+    passing = [r for r in results if r.passed]
+    if passing:
+        best = min(passing, key=lambda r: (r.max_nodes, -(r.replacement_score + r.completeness_score)))
+    else:
+        best = max(results, key=lambda r: r.replacement_score + r.completeness_score, default=None)
+
+    return AutotuneReport(
+        results=results,
+        frontier=pareto_frontier(results, ideal_num_supernodes),
+        best=best,
+        num_configs=len(grid),
+        stopped_early=stopped_early,
+        timings=timings
+    )
@@ -0,0 +1,265 @@
+"""Directory-scale cleanup: process-pool fan-out with a resumable manifest"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from ..storage.compression import SUFFIXES, compression_for_path
+from ..storage.output import SIDECAR_SUFFIX
+from .cleanup import CleanupOptions, cleanup_graph, write_output
+
+
+MANIFEST_FILE = 'manifest.jsonl'
+OUTPUT_SUFFIX = '.cleaned.json'
+_OUTPUT_SUFFIXES = (OUTPUT_SUFFIX,) + tuple(OUTPUT_SUFFIX + suffix for suffix in SUFFIXES.values())
+
+
+def find_graph_files(source: Union[str, Path]) -> List[Path]:
+    """
+    Graph files named by a directory (its *.json files, plain or .gz / .zst, recursively)
+    or a glob pattern
+
+    Previous batch outputs (*.cleaned.json, optionally .gz / .zst) and files inside
+    sidecar bundles (<output>.graph/) or .cache directories below the source are never
+    picked up as inputs; the directories above it are not checked.
+    """
+    source = str(source)
+    if os.path.isdir(source):
+        base = Path(source)
+        paths = [p for pattern in ('*.json',) + tuple('*.json' + suffix for suffix in SUFFIXES.values())
+                 for p in glob.glob(os.path.join(source, '**', pattern), recursive=True)]
+    else:
+        # The pattern's leading directories without wildcards
+        base = Path(source)
+        while glob.has_magic(str(base)) and base != base.parent:
+            base = base.parent
+        paths = glob.glob(source, recursive=True)
+    return sorted(
+        Path(p) for p in paths
+        if os.path.isfile(p) and not p.endswith(_OUTPUT_SUFFIXES)
+        and not any(part.endswith(('.cache', SIDECAR_SUFFIX)) for part in _relative_parts(Path(p).parent, base))
+    )
+
+
+def _relative_parts(directory: Path, base: Path) -> Tuple[str, ...]:
+    """Components of directory below base (all of them when it is not below base)"""
+    try:
+        return directory.relative_to(base).parts
+    except ValueError:
+        return directory.parts
+
+
+def _stem(path: Path) -> str:
+    """File name without .json and any compression suffix (graph.json.zst -> graph)"""
+    name = path.name
+    if compression_for_path(name) is not None:
+        name = name[:-len(Path(name).suffix)]
+    return Path(name).stem
+
+
+def output_paths(graph_files: List[Path], output_dir: Path, suffix: str = OUTPUT_SUFFIX) -> Dict[Path, Path]:
+    """Output file per input: <stem><suffix>, with a path hash where stems collide"""
+    stems: Dict[str, int] = {}
+    for path in graph_files:
+        stems[_stem(path)] = stems.get(_stem(path), 0) + 1
+    outputs = {}
+    for path in graph_files:
+        name = _stem(path)
+        if stems[name] > 1:
+            name += '-' + hashlib.sha1(str(path.resolve()).encode('utf-8')).hexdigest()[:8]
+        outputs[path] = output_dir / (name + suffix)
+    return outputs
+
+
+@dataclass
+class GraphRecord:
+    """Manifest entry for one graph"""
+    graph_file: str
+    output: str
+    status: str  # "done" or "failed"
+    size: int = 0
+    mtime_ns: int = 0
+    num_nodes: int = 0
+    num_edges: int = 0
+    seconds: float = 0.0
+    timings: Dict[str, float] = field(default_factory=dict)
+    replacement_score: Optional[float] = None
+    completeness_score: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchManifest:
+    """
+    Append-only JSON-lines log of finished graphs in the output directory
+
+    Each record is flushed and fsynced as it is written, so after a crash the manifest
+    lists exactly the graphs whose outputs were completed; a torn last line is ignored
+    and the next record starts on a line of its own.
+    A graph is skipped on resume when its latest record is "done", its output still
+    exists and the source file's size and mtime are unchanged.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.records: Dict[str, GraphRecord] = {}
+        self._torn = False
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    self._torn = not line.endswith('\n')
+                    try:
+                        record = GraphRecord(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    self.records[record.graph_file] = record
+
+    def is_done(self, graph_file: Path) -> bool:
+        record = self.records.get(str(graph_file))
+        if record is None or record.status != 'done' or not os.path.exists(record.output):
+            return False
+        stat = graph_file.stat()
+        return record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns
+
+    def append(self, record: GraphRecord):
+        self.records[record.graph_file] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(('\n' if self._torn else '') + json.dumps(asdict(record)) + '\n')
+            self._torn = False
+            f.flush()
+            os.fsync(f.fileno())
+
+
+@dataclass
+class BatchSummary:
+    """Aggregate throughput of a batch run"""
+    processed: int
+    failed: int
+    skipped: int
+    wall_seconds: float
+    graph_seconds: float  # Sum of per-graph processing time across workers
+    total_nodes: int
+    total_edges: int
+
+    @property
+    def graphs_per_second(self) -> float:
+        return self.processed / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    @property
+    def edges_per_second(self) -> float:
+        return self.total_edges / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    @property
+    def parallel_speedup(self) -> float:
+        """Per-graph time summed over wall time (≈ number of busy workers)"""
+        return self.graph_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+
+# Labeler shared by all graphs a worker process handles, set by _init_worker
+_worker_labeler = None
+
+
+def _init_worker(labeler_settings: Optional[Dict[str, Any]]):
+    global _worker_labeler
+    if labeler_settings:
+        from ..labeling.auto_labeler import AutoLabeler
+        from ..labeling.label_cache import LabelCache
+
+        settings = dict(labeler_settings)
+        cache_settings = settings.pop('cache', None)
+        _worker_labeler = AutoLabeler(cache=LabelCache(**cache_settings) if cache_settings is not None else None,
+                                      **settings)
+
+
+def _process_graph(graph_file: str, output: str, options: CleanupOptions) -> GraphRecord:
+    """Clean one graph and write its output atomically; failures become failed records"""
+    stat = os.stat(graph_file)
+    record = GraphRecord(graph_file=graph_file, output=output, status='failed',
+                         size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    start = time.perf_counter()
+    try:
+        result = cleanup_graph(graph_file, options, labeler=_worker_labeler)
+        write_start = time.perf_counter()
+        write_output(result, output, options.original, options.compression)
+        result.timings['write'] = time.perf_counter() - write_start
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+        record.seconds = time.perf_counter() - start
+        return record
+
+    record.status = 'done'
+    record.num_nodes = result.num_nodes
+    record.num_edges = result.num_edges
+    record.timings = result.timings
+    record.replacement_score = result.validation.replacement_score
+    record.completeness_score = result.validation.completeness_score
+    record.seconds = time.perf_counter() - start
+    return record
+
+
+def run_batch(graph_files: Iterable[Path], output_dir: Union[str, Path], options: CleanupOptions,
+              processes: int = 1, resume: bool = True, labeler_settings: Optional[Dict[str, Any]] = None,
+              on_record: Optional[Callable[[GraphRecord], None]] = None) -> Tuple[BatchSummary, List[GraphRecord]]:
+    """
+    Clean many graphs in a process pool
+
+    - graph_files: Inputs (see find_graph_files)
+    - output_dir: Receives one <stem>.cleaned.json (plus .gz / .zst when compressed) per
+      graph plus manifest.jsonl
+    - processes: Worker processes (1 runs in-process)
+    - resume: Skip graphs the manifest already records as done
+    - labeler_settings: AutoLabeler keyword arguments (plus optional `cache`, LabelCache keyword
+      arguments) to label supernodes in each worker; None skips labeling
+    - on_record: Called in the parent as each graph finishes
+
+    Each graph is visited once, so workers load graphs without registering them
+    (CleanupOptions.share_graph) and free each one when it is done.
+
+    Returns: (BatchSummary, records of the graphs processed in this run)
+    """
+    options = replace(options, share_graph=False)
+    output_dir = Path(output_dir)
+    graph_files = list(graph_files)
+    outputs = output_paths(graph_files, output_dir, OUTPUT_SUFFIX + SUFFIXES.get(options.compression, ''))
+    manifest = BatchManifest(output_dir / MANIFEST_FILE)
+
+    todo = [path for path in graph_files if not (resume and manifest.is_done(path))]
+    skipped = len(graph_files) - len(todo)
+    records: List[GraphRecord] = []
+
+    def finish(record: GraphRecord):
+        manifest.append(record)
+        records.append(record)
+        if on_record is not None:
+            on_record(record)
+
+    start = time.perf_counter()
+    if processes <= 1:
+        _init_worker(labeler_settings)
+        for path in todo:
+            finish(_process_graph(str(path), str(outputs[path]), options))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(labeler_settings,)) as pool:
+            futures = [pool.submit(_process_graph, str(path), str(outputs[path]), options) for path in todo]
+            for future in as_completed(futures):
+                finish(future.result())
+    wall = time.perf_counter() - start
+
+    done = [r for r in records if r.status == 'done']
+    summary = BatchSummary(
+        processed=len(done),
+        failed=len(records) - len(done),
+        skipped=skipped,
+        wall_seconds=wall,
+        graph_seconds=sum(r.seconds for r in records),
+        total_nodes=sum(r.num_nodes for r in done),
+        total_edges=sum(r.num_edges for r in done)
+    )
+    return summary, records
@@ -0,0 +1,265 @@
+"""Single-graph cleanup pipeline shared by the CLI commands"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from ..analysis.graph_analyzer import GraphAnalyzer
+from ..analysis.grouping_engine import GroupingEngine, Supernode
+from ..analysis.node_selector import NodeSelector
+from ..analysis.pruning import prune_graph
+from ..embeddings import DEFAULT_EMBEDDING_MODEL, get_embedder, open_vector_cache
+from ..labeling.auto_labeler import AutoLabeler
+from ..optimization.metrics import MetricsCalculator, ValidationResult
+from ..storage import GraphArrays, get_graph, write_cleaned_graph
+from ..utils.profiling import span
+
+
+@dataclass
+class CleanupOptions:
+    """Settings for one cleanup run (defaults match cleanup-existing)"""
+    strategy: str = "pathway"
+    max_nodes: int = 30
+    grouping: str = "functional"
+    importance: str = "influence"
+    selection_settings: Dict[str, Any] = field(default_factory=dict)  # Extra NodeSelector arguments
+    centrality: str = "auto"  # Betweenness mode: auto / exact / approximate
+    centrality_samples: int = 256
+    workers: int = 1
+    centrality_settings: Dict[str, Any] = field(default_factory=dict)  # Extra CentralityService arguments
+    cache: bool = True
+    share_graph: bool = True  # Keep the loaded graph in the process-wide registry (storage.get_graph)
+    min_replacement: float = 0.5
+    min_completeness: float = 0.7
+    embedding_model: Optional[str] = DEFAULT_EMBEDDING_MODEL  # Semantic/hybrid grouping ("hashing" = offline)
+    embedding_cache: Optional[str] = None  # Persistent per-feature vector cache path
+    grouping_settings: Dict[str, Any] = field(default_factory=dict)  # Extra GroupingEngine arguments
+    prune: bool = False  # Cumulative-influence pruning before analysis (see prune_graph)
+    node_threshold: float = 0.8
+    edge_threshold: float = 0.98
+    original: str = "reference"  # How the output stores the graph (see storage.write_cleaned_graph)
+    compression: Optional[str] = None  # Output codec: gzip / zstd
+
+
+def grouping_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """GroupingEngine keyword arguments from the `grouping` section of config.yaml"""
+    section = config.get('grouping') or {}
+    semantic = section.get('semantic_clustering') or {}
+    settings = {
+        'min_group_size': section.get('min_group_size'),
+        'max_group_size': section.get('max_group_size'),
+        'target_num_groups': section.get('target_num_groups'),
+        'similarity_threshold': semantic.get('similarity_threshold'),
+        'clustering': semantic.get('clustering')
+    }
+    return {key: value for key, value in settings.items() if value is not None}
+
+
+def selection_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """NodeSelector keyword arguments from the `node_selection` section of config.yaml"""
+    section = config.get('node_selection') or {}
+    pathway = section.get('pathway_strategy') or {}
+    optimize = section.get('optimize_strategy') or {}
+    settings = {
+        'num_target_logits': pathway.get('num_target_logits'),
+        'paths_per_logit': pathway.get('paths_per_logit'),
+        'max_paths_per_logit': pathway.get('max_paths_per_logit'),
+        'replacement_weight': optimize.get('replacement_weight'),
+        'completeness_weight': optimize.get('completeness_weight')
+    }
+    return {key: value for key, value in settings.items() if value is not None}
+
+
+def centrality_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """CentralityService keyword arguments from the `centrality` section of config.yaml"""
+    section = config.get('centrality') or {}
+    keys = ('mode', 'num_samples', 'workers', 'confidence', 'exact_max_nodes')
+    return {key: section[key] for key in keys if section.get(key) is not None}
+
+
+def labeling_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """AutoLabeler keyword arguments from the `labeling` section of config.yaml"""
+    section = config.get('labeling') or {}
+    keys = ('model', 'max_concurrency', 'requests_per_minute', 'tokens_per_minute', 'max_retries')
+    return {key: section[key] for key in keys if section.get(key) is not None}
+
+
+def label_cache_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """LabelCache keyword arguments from the `labeling` section of config.yaml (cache_ttl_days as seconds)"""
+    section = config.get('labeling') or {}
+    settings: Dict[str, Any] = {}
+    if section.get('cache_path'):
+        settings['path'] = Path(section['cache_path']).expanduser()
+    if 'cache_max_entries' in section:
+        # null keeps every label
+        settings['max_entries'] = section['cache_max_entries']
+    if section.get('cache_ttl_days') is not None:
+        settings['ttl'] = section['cache_ttl_days'] * 86400
+    return settings
+
+
+@dataclass
+class CleanupResult:
+    """Outcome of cleaning one graph"""
+    graph_file: str
+    num_nodes: int
+    num_edges: int
+    pinned_node_ids: List[str]
+    supernodes: List[Supernode]
+    validation: ValidationResult
+    timings: Dict[str, float] = field(default_factory=dict)  # Seconds per stage
+    output: Dict[str, Any] = field(default_factory=dict)
+    graph: Optional[GraphArrays] = None  # The graph the cleanup ran on
+    pruned: bool = False  # graph differs from the file at graph_file
+
+
+def cleanup_graph(graph_file: Union[str, Path], options: CleanupOptions, labeler: Optional[AutoLabeler] = None,
+                  log: Optional[Callable[[str], None]] = None) -> CleanupResult:
+    """
+    Run load (→ prune) → analyze → select → group → metrics (→ label) on one graph file
+
+    log: Optional callback for progress messages
+
+    Each stage is timed into CleanupResult.timings and recorded as a span when a
+    profiler is active (see utils.profiling).
+
+    Returns: CleanupResult whose `output` holds the cleanup sections of the document
+    (see write_output)
+    """
+    log = log or (lambda message: None)
+    timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(name: str):
+        start = time.perf_counter()
+        with span(name):
+            yield
+        timings[name] = time.perf_counter() - start
+
+    with stage('load'):
+        graph_data = get_graph(graph_file, cache=options.cache, register=options.share_graph)
+
+    if options.prune:
+        with stage('prune'):
+            num_links = graph_data.num_links
+            graph_data = prune_graph(graph_data, options.node_threshold, options.edge_threshold).graph
+        log(f"Pruned to {graph_data.num_nodes} nodes, {graph_data.num_links} of {num_links} edges")
+
+    with stage('analyze'):
+        analyzer = GraphAnalyzer.from_arrays(graph_data, centrality={
+            **options.centrality_settings,
+            'mode': options.centrality, 'num_samples': options.centrality_samples, 'workers': options.workers
+        })
+    num_nodes = int(graph_data.has_data.sum())
+    log(f"Graph loaded: {num_nodes} nodes, {graph_data.num_links} edges")
+
+    with stage('select'):
+        selector = NodeSelector(analyzer, max_nodes=options.max_nodes, importance=options.importance,
+                                **options.selection_settings)
+        pinned_nodes = selector.select_nodes_for_pinning(strategy=options.strategy)
+    log(f"Selected {len(pinned_nodes)} nodes using {options.strategy} strategy")
+
+    with stage('group'):
+        grouper = GroupingEngine(
+            analyzer, pinned_nodes, embedder=get_embedder(options.embedding_model),
+            vector_cache=open_vector_cache(options.embedding_cache) if options.embedding_cache else None,
+            **options.grouping_settings
+        )
+        supernodes = grouper.create_supernodes(strategy=options.grouping)
+    log(f"Created {len(supernodes)} supernodes using {options.grouping} grouping")
+
+    with stage('metrics'):
+        subgraph = {'pinned_node_ids': pinned_nodes, 'supernodes': supernodes}
+        metrics = MetricsCalculator(graph_data, subgraph, analyzer=analyzer)
+        validation = metrics.validate_subgraph(options.min_replacement, options.min_completeness)
+    log(f"Replacement: {validation.replacement_score:.3f}, completeness: {validation.completeness_score:.3f}")
+
+    if labeler is not None:
+        with stage('label'):
+            node_data = {nid: analyzer.get_node(nid) or {} for snode in supernodes for nid in snode.node_ids}
+            labels = labeler.generate_labels(supernodes, node_data, prompt="", target_logit="")
+        for snode, label in zip(supernodes, labels):
+            snode.label = label
+            log(f"  - {label} ({len(snode.node_ids)} nodes, layers {snode.layer_range[0]}-{snode.layer_range[1]})")
+
+    with stage('output'):
+        output = build_output(pinned_nodes, supernodes, validation)
+
+    return CleanupResult(
+        graph_file=str(graph_file),
+        num_nodes=num_nodes,
+        num_edges=graph_data.num_links,
+        pinned_node_ids=pinned_nodes,
+        supernodes=supernodes,
+        validation=validation,
+        timings=timings,
+        output=output,
+        graph=graph_data,
+        pruned=options.prune
+    )
+
+
+def build_output(pinned_nodes: List[str], supernodes: List[Supernode],
+                 validation: Optional[ValidationResult] = None) -> Dict[str, Any]:
+    """Cleanup sections of the cleaned-graph document; the writer adds original_graph"""
+    output = {
+        'pinned_node_ids': pinned_nodes,
+        'supernodes': [
+            {
+                'label': snode.label,
+                'node_ids': snode.node_ids,
+                'layer_range': snode.layer_range,
+                'functional_role': snode.functional_role,
+                'total_influence': snode.total_influence
+            }
+            for snode in supernodes
+        ]
+    }
+    if validation is not None:
+        output['metrics'] = {
+            'replacement_score': validation.replacement_score,
+            'completeness_score': validation.completeness_score,
+            'passed': validation.passed
+        }
+    return output
+
+
+def write_output(result: CleanupResult, path: Union[str, Path], original: str = 'reference',
+                 compression: Optional[str] = None, indent: Optional[int] = None) -> Path:
+    """
+    Stream a cleanup result to disk atomically (see storage.write_cleaned_graph)
+
+    A pruned graph no longer matches its source file, so 'reference' falls back to
+    a sidecar bundle for it and 'embed' serializes it rather than copying the source.
+    """
+    if original == 'reference' and result.pruned:
+        original = 'sidecar'
+    return write_cleaned_graph(result.output, path, graph=result.graph,
+                               source=None if result.pruned else result.graph_file,
+                               original=original, compression=compression, indent=indent)
+
+
+def write_json_atomic(data: Any, path: Union[str, Path], indent: Optional[int] = 2) -> Path:
+    """
+    Write JSON to a temporary file beside `path` and rename it into place
+
+    Readers (and a resumed batch) see either the previous file or the complete new one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
@@ -0,0 +1,30 @@
+"""Storage modules for loading and persisting attribution graphs"""
+
+from .arrays import GraphArrays, FEATURE_TYPES, EMBEDDING_LAYER
+from .compression import COMPRESSIONS, open_graph
+from .stream import as_graph, load_graph, stream_graph
+from .cache import convert_graph, load_graph_cached, read_cache, write_cache
+from .registry import clear_graphs, get_graph
+from .output import ORIGINAL_MODES, read_cleaned_output, resolve_reference, write_cleaned_graph, write_graph_json
+
+__all__ = [
+    'GraphArrays',
+    'FEATURE_TYPES',
+    'EMBEDDING_LAYER',
+    'COMPRESSIONS',
+    'open_graph',
+    'as_graph',
+    'load_graph',
+    'stream_graph',
+    'convert_graph',
+    'load_graph_cached',
+    'read_cache',
+    'write_cache',
+    'get_graph',
+    'clear_graphs',
+    'ORIGINAL_MODES',
+    'read_cleaned_output',
+    'resolve_reference',
+    'write_cleaned_graph',
+    'write_graph_json'
+]
@@ -0,0 +1,317 @@
+"""Compact column-oriented storage for attribution graph nodes and links"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+# Feature type codes; graphs with other types extend their own table
+FEATURE_TYPES = ('', 'embedding', 'cross layer transcoder', 'mlp reconstruction error', 'logit')
+
+# Layer value used for embedding ('E') nodes
+EMBEDDING_LAYER = -1
+
+
+class GraphArrays:
+    """
+    Attribution graph held as typed arrays instead of per-node / per-link dicts.
+
+    Nodes are addressed by dense index (node_ids[i], index[node_id]); links store
+    source/target node indices. Missing numeric values are -1 (ctx_idx, feature)
+    or NaN (influence, activation, token_prob).
+
+    For scripts written against the raw JSON, graph['nodes'] / graph['links'] /
+    graph.get('metadata') return lazy views that build one small dict per element
+    on access, in the layout the graph was read from ('neuronpedia': node_id/links,
+    'agent': id/edges).
+
+    Columns are treated as immutable once built: derived views (node_rows, degree,
+    adjacency, groups, logit_mask) are computed on first use and cached on the graph,
+    so every consumer sharing the instance (see storage.get_graph) reuses them.
+    """
+
+    __slots__ = (
+        'node_ids', 'index', 'layer', 'ctx_idx', 'feature', 'feature_type', 'feature_types',
+        'influence', 'activation', 'token_prob', 'is_target_logit', 'clerp', 'has_data',
+        'link_source', 'link_target', 'link_weight', 'extra', 'schema', '_views'
+    )
+
+    def __init__(self, node_ids: List[str], index: Dict[str, int], layer: np.ndarray,
+                 ctx_idx: np.ndarray, feature: np.ndarray, feature_type: np.ndarray,
+                 feature_types: Sequence[str], influence: np.ndarray, activation: np.ndarray,
+                 token_prob: np.ndarray, is_target_logit: np.ndarray, clerp: List[str],
+                 has_data: np.ndarray, link_source: np.ndarray, link_target: np.ndarray,
+                 link_weight: np.ndarray, extra: Optional[Dict[str, Any]] = None,
+                 schema: str = 'neuronpedia'):
+        self.node_ids = node_ids
+        self.index = index
+        self.layer = layer
+        self.ctx_idx = ctx_idx
+        self.feature = feature
+        self.feature_type = feature_type
+        self.feature_types = tuple(feature_types)
+        self.influence = influence
+        self.activation = activation
+        self.token_prob = token_prob
+        self.is_target_logit = is_target_logit
+        self.clerp = clerp
+        self.has_data = has_data
+        self.link_source = link_source
+        self.link_target = link_target
+        self.link_weight = link_weight
+        self.extra = extra if extra is not None else {}
+        self.schema = schema
+        self._views: Dict[Any, Any] = {}
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_links(self) -> int:
+        return len(self.link_weight)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.extra.get('metadata', {})
+
+    def type_code(self, feature_type: str) -> int:
+        """Code of a feature type in this graph (-1 if absent)"""
+        try:
+            return self.feature_types.index(feature_type)
+        except ValueError:
+            return -1
+
+    # Cached derived views (read-only: do not modify the returned arrays)
+
+    def _cached(self, key: Any, build: Callable[[], Any]) -> Any:
+        value = self._views.get(key)
+        if value is None:
+            value = self._views[key] = build()
+        return value
+
+    def logit_mask(self) -> np.ndarray:
+        """Boolean mask of logit nodes (feature_type 'logit' or agent-style 'logit_' ids)"""
+        def build():
+            mask = self.feature_type == self.type_code('logit')
+            if self.schema == 'agent':
+                mask |= np.fromiter((nid.startswith('logit_') for nid in self.node_ids),
+                                    dtype=bool, count=self.num_nodes)
+            return mask
+        return self._cached('logit_mask', build)
+
+    @property
+    def node_rows(self) -> np.ndarray:
+        """Indices of the nodes that had an entry in the source, in order"""
+        return self._cached('node_rows', lambda: np.flatnonzero(self.has_data))
+
+    def degree(self, direction: str = 'out', weighted: bool = False) -> np.ndarray:
+        """
+        Per-node link count by source ('out') or target ('in')
+
+        weighted: Sum |weight| instead of counting links
+        """
+        ends = self._link_ends(direction)
+        if weighted:
+            return self._cached(('degree', direction, True), lambda: np.bincount(
+                ends, weights=np.abs(self.link_weight.astype(np.float64)), minlength=self.num_nodes))
+        return self._cached(('degree', direction, False), lambda: np.bincount(ends, minlength=self.num_nodes))
+
+    def adjacency(self, direction: str = 'out') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Links grouped CSR-style by source ('out') or target ('in')
+
+        Returns: (indptr of length num_nodes + 1, link indices); within a row, links are
+        ordered by the node at their other end
+        """
+        def build():
+            ends = self._link_ends(direction)
+            others = self._link_ends('in' if direction == 'out' else 'out')
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(ends, minlength=self.num_nodes), out=indptr[1:])
+            return indptr, np.lexsort((others, ends))
+        return self._cached(('adjacency', direction), build)
+
+    def groups(self, *columns: str) -> Dict[Tuple[int, ...], np.ndarray]:
+        """
+        Indices of the nodes with data, grouped by the values of node columns
+
+        Example: graph.groups('layer', 'ctx_idx') maps (layer, ctx_idx) to node indices
+        (layer codes as in the `layer` column, -1 for embeddings). Keys are sorted.
+        """
+        def build():
+            rows = self.node_rows
+            if not len(rows):
+                return {}
+            keys = [np.asarray(getattr(self, column))[rows].astype(np.int64) for column in columns]
+            order = np.lexsort(keys[::-1])
+            sorted_keys = np.stack([key[order] for key in keys])
+            starts = np.flatnonzero(np.concatenate(([True], (np.diff(sorted_keys, axis=1) != 0).any(axis=0))))
+            bounds = np.append(starts, len(rows))
+            return {
+                tuple(sorted_keys[:, start].tolist()): rows[order[start:stop]]
+                for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+            }
+        return self._cached(('groups',) + columns, build)
+
+    def _link_ends(self, direction: str) -> np.ndarray:
+        if direction not in ('out', 'in'):
+            raise ValueError(f"direction must be 'out' or 'in', got {direction!r}")
+        return self.link_source if direction == 'out' else self.link_target
+
+    def subset(self, nodes: np.ndarray, links: Optional[np.ndarray] = None) -> 'GraphArrays':
+        """
+        Graph restricted to some nodes (boolean mask or indices) and the links between them
+
+        links: Optional boolean mask over links, further limiting the kept links
+
+        Node and link order is preserved; `extra` is shallow-copied.
+        """
+        nodes = np.asarray(nodes)
+        keep = nodes if nodes.dtype == bool else np.isin(np.arange(self.num_nodes), nodes)
+        rows = np.flatnonzero(keep)
+        remap = np.full(self.num_nodes, -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+
+        kept_links = keep[self.link_source] & keep[self.link_target]
+        if links is not None:
+            kept_links &= links
+        node_ids = [self.node_ids[i] for i in rows.tolist()]
+        return GraphArrays(
+            node_ids=node_ids,
+            index={node_id: i for i, node_id in enumerate(node_ids)},
+            layer=self.layer[rows],
+            ctx_idx=self.ctx_idx[rows],
+            feature=self.feature[rows],
+            feature_type=self.feature_type[rows],
+            feature_types=self.feature_types,
+            influence=self.influence[rows],
+            activation=self.activation[rows],
+            token_prob=self.token_prob[rows],
+            is_target_logit=self.is_target_logit[rows],
+            clerp=[self.clerp[i] for i in rows.tolist()],
+            has_data=self.has_data[rows],
+            link_source=remap[self.link_source[kept_links]].astype(np.int32),
+            link_target=remap[self.link_target[kept_links]].astype(np.int32),
+            link_weight=self.link_weight[kept_links],
+            extra=dict(self.extra),
+            schema=self.schema
+        )
+
+    def layer_label(self, i: int) -> str:
+        """Layer of node i as written in Neuronpedia JSON ('E' for embeddings)"""
+        layer = int(self.layer[i])
+        return 'E' if layer == EMBEDDING_LAYER else str(layer)
+
+    def node(self, i: int, schema: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the dict for node i
+
+        schema: Layout of the dict, 'neuronpedia' (node_id, 'E'/str layer, feature, clerp)
+        or 'agent' (id, int layer, feature_index, explanation); default: the source's
+        """
+        layer = int(self.layer[i])
+        ctx_idx = int(self.ctx_idx[i])
+        feature = int(self.feature[i])
+        node = {
+            'ctx_idx': ctx_idx if ctx_idx >= 0 else None,
+            'feature_type': self.feature_types[self.feature_type[i]] or None,
+            'influence': _optional_float(self.influence[i]),
+            'activation': _optional_float(self.activation[i]),
+            'token_prob': _optional_float(self.token_prob[i]),
+            'is_target_logit': bool(self.is_target_logit[i]),
+        }
+        if (schema or self.schema) == 'agent':
+            node['id'] = self.node_ids[i]
+            node['layer'] = layer
+            node['feature_index'] = feature
+            node['explanation'] = self.clerp[i]
+        else:
+            node['node_id'] = self.node_ids[i]
+            node['layer'] = 'E' if layer == EMBEDDING_LAYER else str(layer)
+            node['feature'] = feature
+            node['clerp'] = self.clerp[i]
+        return node
+
+    def link(self, j: int) -> Dict[str, Any]:
+        """Build the dict for link j"""
+        return {
+            'source': self.node_ids[self.link_source[j]],
+            'target': self.node_ids[self.link_target[j]],
+            'weight': float(self.link_weight[j])
+        }
+
+    def to_dict(self, schema: Optional[str] = None) -> Dict[str, Any]:
+        """Materialize the full JSON-style document (costly for large graphs)"""
+        schema = schema or self.schema
+        nodes_key, links_key = ('nodes', 'edges') if schema == 'agent' else ('nodes', 'links')
+        data = dict(self.extra)
+        data[nodes_key] = [self.node(i, schema) for i in self.node_rows.tolist()]
+        data[links_key] = [self.link(j) for j in range(self.num_links)]
+        return data
+
+    # Read-only mapping interface over the JSON layout
+
+    def __getitem__(self, key: str):
+        if key == 'nodes':
+            return _NodeViews(self)
+        if key in ('links', 'edges'):
+            return _LinkViews(self)
+        return self.extra[key]
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in ('nodes', 'links', 'edges') or key in self.extra
+
+
+def _optional_float(value) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class _NodeViews(Sequence):
+    """Lazy sequence of node dicts (only nodes that had an entry in the source)"""
+
+    def __init__(self, graph: GraphArrays):
+        self._graph = graph
+        self._rows = graph.node_rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._graph.node(r) for r in self._rows[i]]
+        return self._graph.node(int(self._rows[i]))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for r in self._rows.tolist():
+            yield self._graph.node(r)
+
+
+class _LinkViews(Sequence):
+    """Lazy sequence of link dicts"""
+
+    def __init__(self, graph: GraphArrays):
+        self._graph = graph
+
+    def __len__(self) -> int:
+        return self._graph.num_links
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return [self._graph.link(k) for k in range(*j.indices(len(self)))]
+        if j < 0:
+            j += len(self)
+        if not 0 <= j < len(self):
+            raise IndexError(j)
+        return self._graph.link(j)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        graph = self._graph
+        node_ids = graph.node_ids
+        for s, t, w in zip(graph.link_source.tolist(), graph.link_target.tolist(), graph.link_weight.tolist()):
+            yield {'source': node_ids[s], 'target': node_ids[t], 'weight': w}
@@ -0,0 +1,197 @@
+"""Columnar on-disk cache of attribution graphs, memory-mapped on load"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+from .arrays import GraphArrays
+from .stream import load_graph
+
+
+CACHE_VERSION = 2
+META_FILE = 'meta.json'
+
+# Bundles of graphs converted without an explicit cache_dir, one per source path
+DEFAULT_CACHE_ROOT = Path.home() / '.cache' / 'neuronpedia_agent' / 'graphs'
+
+# Numeric columns stored as one .npy file each
+_COLUMNS = (
+    'layer', 'ctx_idx', 'feature', 'feature_type', 'influence', 'activation', 'token_prob',
+    'is_target_logit', 'has_data', 'link_source', 'link_target', 'link_weight'
+)
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(source: Union[str, Path]) -> Path:
+    """
+    Cache directory used for a source file: <name>-<hash of its absolute path> under
+    DEFAULT_CACHE_ROOT, so graph directories (possibly read-only) are never written to
+    """
+    source = Path(source).resolve()
+    key = hashlib.sha256(str(source).encode('utf-8')).hexdigest()[:16]
+    return DEFAULT_CACHE_ROOT / f'{source.name}-{key}'
+
+
+def _save_strings(directory: Path, name: str, strings: List[str]):
+    """Store a list of strings as a UTF-8 blob plus an offsets array"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(directory / f'{name}_offsets.npy', offsets)
+    np.save(directory / f'{name}_blob.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+def _load_strings(directory: Path, name: str) -> List[str]:
+    offsets = np.load(directory / f'{name}_offsets.npy').tolist()
+    blob = np.load(directory / f'{name}_blob.npy').tobytes()
+    return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def write_cache(graph: GraphArrays, cache_dir: Union[str, Path], source: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Write a graph as a bundle of .npy columns plus string tables and a JSON sidecar
+
+    source: Description of the file the graph came from (path, size, mtime_ns, sha256),
+    used to detect stale caches. The bundle is written to a temporary directory and
+    moved into place, so readers never see a partial cache.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=cache_dir.name + '.', dir=cache_dir.parent))
+    try:
+        for name in _COLUMNS:
+            np.save(tmp_dir / f'{name}.npy', np.ascontiguousarray(getattr(graph, name)))
+        _save_strings(tmp_dir, 'node_ids', graph.node_ids)
+        _save_strings(tmp_dir, 'clerp', graph.clerp)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'schema': graph.schema,
+            'feature_types': list(graph.feature_types),
+            'num_nodes': graph.num_nodes,
+            'num_links': graph.num_links,
+            'source': source or {},
+            'extra': graph.extra
+        }
+        with open(tmp_dir / META_FILE, 'w') as f:
+            json.dump(meta, f)
+
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return cache_dir
+
+
+def read_cache(cache_dir: Union[str, Path], mmap: bool = True) -> GraphArrays:
+    """Open a cache bundle; numeric columns are memory-mapped read-only when mmap is set"""
+    cache_dir = Path(cache_dir)
+    meta = read_cache_meta(cache_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No graph cache at {cache_dir}")
+
+    mode = 'r' if mmap else None
+    columns = {name: np.load(cache_dir / f'{name}.npy', mmap_mode=mode) for name in _COLUMNS}
+    node_ids = [sys.intern(node_id) for node_id in _load_strings(cache_dir, 'node_ids')]
+
+    return GraphArrays(
+        node_ids=node_ids,
+        index={node_id: i for i, node_id in enumerate(node_ids)},
+        feature_types=meta['feature_types'],
+        clerp=_load_strings(cache_dir, 'clerp'),
+        extra=meta['extra'],
+        schema=meta['schema'],
+        **columns
+    )
+
+
+def read_cache_meta(cache_dir: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Sidecar metadata of a cache bundle (None if missing or from another format version)"""
+    try:
+        with open(Path(cache_dir) / META_FILE) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _source_info(path: Path) -> Dict[str, Any]:
+    stat = path.stat()
+    return {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cached_sha256(path: Union[str, Path]) -> str:
+    """SHA-256 of a source file, read from its cache bundle when size and mtime still match"""
+    path = Path(path)
+    meta = read_cache_meta(default_cache_dir(path))
+    if meta is not None:
+        cached = meta['source']
+        info = _source_info(path)
+        if cached.get('sha256') and cached.get('size') == info['size'] and cached.get('mtime_ns') == info['mtime_ns']:
+            return cached['sha256']
+    return file_sha256(path)
+
+
+def load_graph_cached(path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None,
+                      mmap: bool = True) -> GraphArrays:
+    """
+    Load a graph JSON file through its columnar cache, (re)building the cache when needed
+
+    The cache is trusted when the source size and mtime match; otherwise the source's
+    SHA-256 is compared with the one recorded at conversion time, and the cache is
+    regenerated if the content changed. When the cache cannot be written (read-only or
+    full cache location), the graph parsed from the JSON is returned instead.
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(path)
+    info = _source_info(path)
+    meta = read_cache_meta(cache_dir)
+
+    if meta is not None:
+        cached = meta['source']
+        if cached.get('size') == info['size'] and cached.get('mtime_ns') == info['mtime_ns']:
+            return read_cache(cache_dir, mmap=mmap)
+        info['sha256'] = file_sha256(path)
+        if cached.get('sha256') == info['sha256']:
+            # Same content, new timestamp: refresh the recorded stat
+            meta['source'] = info
+            try:
+                with open(cache_dir / META_FILE, 'w') as f:
+                    json.dump(meta, f)
+            except OSError:
+                pass
+            return read_cache(cache_dir, mmap=mmap)
+
+    graph = load_graph(path)
+    info['sha256'] = info.get('sha256') or file_sha256(path)
+    try:
+        write_cache(graph, cache_dir, source=info)
+    except OSError:
+        return graph
+    return read_cache(cache_dir, mmap=mmap)
+
+
+def convert_graph(path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None,
+                  sha256: Optional[str] = None) -> Path:
+    """Convert a graph JSON file into a columnar cache bundle; returns the cache directory"""
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(path)
+    info = _source_info(path)
+    info['sha256'] = sha256 or file_sha256(path)
+    return write_cache(load_graph(path), cache_dir, source=info)
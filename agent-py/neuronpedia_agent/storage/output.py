@@ -0,0 +1,276 @@
+"""Streaming writer for cleaned-graph documents and resolution of their graph references"""
+
+import io
+import json
+import math
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, TextIO, Union
+import numpy as np
+
+from .arrays import GraphArrays
+from .cache import cached_sha256, default_cache_dir, load_graph_cached, read_cache, read_cache_meta, write_cache
+from .compression import CHUNK_SIZE, compressed_writer, compression_for_path, open_graph
+from .stream import _build_value, _skip_value, iter_events, load_graph
+
+
+# How a cleaned graph stores the graph it was built from
+ORIGINAL_MODES = ('reference', 'embed', 'sidecar', 'none')
+
+ORIGINAL_KEY = 'original_graph'
+
+# Columnar bundle written next to the output in 'sidecar' mode: <output>.graph/
+SIDECAR_SUFFIX = '.graph'
+
+_NODE_CHUNK = 4096
+_LINK_CHUNK = 1 << 16
+
+
+def write_graph_json(graph: GraphArrays, f: TextIO):
+    """
+    Write a graph as one compact JSON object, nodes and links serialized in chunks
+
+    Only what GraphArrays holds is written: node fields it does not keep (jsNodeId,
+    run_idx, reverse_ctx_idx, top_logits, ...) are dropped, and a repeated node id
+    appears once. The output is strict JSON, which ijson requires: non-finite weights
+    are written as null and read back as 0.
+    """
+    nodes_key, links_key = ('nodes', 'edges') if graph.schema == 'agent' else ('nodes', 'links')
+    f.write('{')
+    for key, value in graph.extra.items():
+        f.write(f'{json.dumps(key)}: {json.dumps(value)}, ')
+
+    f.write(f'"{nodes_key}": [')
+    rows = np.flatnonzero(graph.has_data).tolist()
+    for start in range(0, len(rows), _NODE_CHUNK):
+        if start:
+            f.write(', ')
+        f.write(', '.join(json.dumps(graph.node(i)) for i in rows[start:start + _NODE_CHUNK]))
+
+    f.write(f'], "{links_key}": [')
+    node_ids = [json.dumps(node_id) for node_id in graph.node_ids]
+    for start in range(0, graph.num_links, _LINK_CHUNK):
+        end = min(start + _LINK_CHUNK, graph.num_links)
+        weights = graph.link_weight[start:end]
+        # repr is valid JSON for finite floats only
+        number = repr if np.isfinite(weights).all() else _finite_or_null
+        if start:
+            f.write(', ')
+        f.write(', '.join(
+            f'{{"source": {node_ids[s]}, "target": {node_ids[t]}, "weight": {number(w)}}}'
+            for s, t, w in zip(graph.link_source[start:end].tolist(), graph.link_target[start:end].tolist(),
+                               weights.tolist())
+        ))
+    f.write(']}')
+
+
+def _finite_or_null(value: float) -> str:
+    return repr(value) if math.isfinite(value) else 'null'
+
+
+def _is_plain_graph(source: Path) -> bool:
+    """
+    Whether a graph file's (decompressed) bytes are a graph document that can be copied
+    as is, rather than a cleaned output wrapping one in original_graph
+
+    Only a file mentioning the key anywhere has its top-level keys parsed.
+    """
+    marker = json.dumps(ORIGINAL_KEY).encode()
+    with open_graph(source) as f:
+        tail = b''
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return True
+            if marker in tail + chunk:
+                break
+            tail = chunk[-len(marker):]
+
+    with open_graph(source) as f:
+        events = iter_events(f)
+        next(events)
+        for event, key in events:
+            if event == 'end_map' or key == ORIGINAL_KEY:
+                return event == 'end_map'
+            _skip_value(events, next(events)[0])
+    return True
+
+
+def _copy_graph(source: Path, writer: BinaryIO):
+    """Stream a graph file's decompressed bytes into writer"""
+    with open_graph(source) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+
+
+def _relative_path(target: Path, base_dir: Path) -> str:
+    """target relative to base_dir when possible, else absolute"""
+    try:
+        return os.path.relpath(target.resolve(), base_dir.resolve())
+    except ValueError:  # Different drives on Windows
+        return str(target.resolve())
+
+
+def graph_reference(source: Union[str, Path], base_dir: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reference to a graph file: path (relative to base_dir when possible), size and SHA-256
+
+    The hash comes from the source's cache bundle when it is up to date.
+    """
+    source = Path(source)
+    return {
+        '$ref': _relative_path(source, Path(base_dir)),
+        'format': 'json',
+        'size': source.stat().st_size,
+        'sha256': cached_sha256(source)
+    }
+
+
+def write_cleaned_graph(output: Dict[str, Any], path: Union[str, Path], graph: Optional[GraphArrays] = None,
+                        source: Optional[Union[str, Path]] = None, original: str = 'reference',
+                        compression: Optional[str] = None, indent: Optional[int] = None) -> Path:
+    """
+    Stream a cleaned-graph document to a temporary file beside `path` and rename it into place
+
+    - output: Cleanup sections (see pipeline.build_output)
+    - graph: The graph the cleanup ran on (required for 'sidecar', and for 'embed'
+      without a source)
+    - source: Graph file the graph was loaded from (required for 'reference'); leave it
+      out when `graph` no longer matches it (e.g. pruned)
+    - original: How original_graph is stored:
+        'reference': {"$ref", "sha256", "size"} pointing at source; nothing is copied
+        'embed': the source file's JSON, decompressed and copied byte for byte; without
+          a source (or when the source is itself a cleaned output) `graph` serialized in
+          chunks, which is lossy (see write_graph_json)
+        'sidecar': a columnar bundle at <path>.graph/, referenced by name; lossy like a
+          serialized embed, as it holds only the GraphArrays columns
+        'none': left out
+    - compression: 'gzip', 'zstd' or None (default: implied by a .gz / .zst suffix)
+    - indent: Pretty-print the cleanup sections; an embedded graph is always compact
+
+    The document is never materialized as a whole, so memory stays bounded by one
+    chunk of nodes or links plus the graph's own arrays.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if original not in ORIGINAL_MODES:
+        raise ValueError(f"Unknown original mode: {original} (expected one of {', '.join(ORIGINAL_MODES)})")
+    if original == 'reference' and source is None:
+        raise ValueError("original='reference' needs the source graph file")
+    copy = original == 'embed' and source is not None and _is_plain_graph(Path(source))
+    if original in ('embed', 'sidecar') and graph is None and not copy:
+        raise ValueError(f"original='{original}' needs the graph")
+    if compression is None:
+        compression = compression_for_path(path)
+
+    reference = None
+    if original == 'reference':
+        reference = graph_reference(source, path.parent)
+    elif original == 'sidecar':
+        sidecar = write_cache(graph, path.with_name(path.name + SIDECAR_SUFFIX))
+        reference = {'$ref': sidecar.name, 'format': 'columnar',
+                     'num_nodes': graph.num_nodes, 'num_links': graph.num_links}
+
+    # Cleanup sections first, then original_graph spliced in before the closing brace
+    head = json.dumps({key: value for key, value in output.items() if key != ORIGINAL_KEY}, indent=indent)
+    head = head[:-1].rstrip()
+    separator = '\n' + ' ' * indent if indent is not None else ' '
+
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            writer = compressed_writer(raw, compression)
+            f = io.TextIOWrapper(writer, encoding='utf-8')
+            f.write(head)
+            if original != 'none':
+                f.write((',' if len(head) > 1 else '') + separator + f'"{ORIGINAL_KEY}": ')
+                if reference is not None:
+                    f.write(json.dumps(reference))
+                elif copy:
+                    f.flush()
+                    _copy_graph(Path(source), writer)
+                else:
+                    write_graph_json(graph, f)
+            f.write('\n}' if indent is not None else '}')
+            f.detach()
+            if writer is not raw:
+                writer.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def is_reference(value: Any) -> bool:
+    return isinstance(value, dict) and '$ref' in value
+
+
+def resolve_reference(reference: Dict[str, Any], base_dir: Optional[Union[str, Path]] = None,
+                      verify: bool = True) -> GraphArrays:
+    """
+    Load the graph an original_graph reference points at
+
+    - base_dir: Directory relative paths are resolved against (the output's directory)
+    - verify: Check the referenced file's size and SHA-256 against the recorded ones
+
+    An up-to-date columnar cache of the referenced file is used when present; none is
+    created.
+    """
+    target = Path(reference['$ref'])
+    if not target.is_absolute() and base_dir is not None:
+        target = Path(base_dir) / target
+    if reference.get('format') == 'columnar':
+        return read_cache(target)
+
+    if not target.exists():
+        raise FileNotFoundError(f"Referenced graph not found: {target}")
+    if verify:
+        size = target.stat().st_size
+        if 'size' in reference and reference['size'] != size:
+            raise ValueError(f"Referenced graph {target} changed since the output was written "
+                             f"(size {size}, expected {reference['size']})")
+        if 'sha256' in reference and cached_sha256(target) != reference['sha256']:
+            raise ValueError(f"Referenced graph {target} changed since the output was written (SHA-256 mismatch)")
+    if read_cache_meta(default_cache_dir(target)) is not None:
+        return load_graph_cached(target)
+    return load_graph(target)
+
+
+def read_cleaned_output(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Cleanup sections of a cleaned-graph document, without parsing the graph itself
+
+    An embedded original_graph keeps its small sections (metadata, ...) but not its
+    nodes and links; use load_graph(path) for the graph.
+    """
+    with open_graph(path) as f:
+        events = iter_events(f)
+        event, _ = next(events)
+        if event != 'start_map':
+            raise ValueError("Cleaned graph JSON must be an object")
+        output: Dict[str, Any] = {}
+        for event, key in events:
+            if event == 'end_map':
+                break
+            event, value = next(events)
+            if key != ORIGINAL_KEY or event != 'start_map':
+                output[key] = _build_value(events, event, value)
+                continue
+            section: Dict[str, Any] = {}
+            for event, field in events:
+                if event == 'end_map':
+                    break
+                event, value = next(events)
+                if field in ('nodes', 'links', 'edges'):
+                    _skip_value(events, event)
+                else:
+                    section[field] = _build_value(events, event, value)
+            output[key] = section
+    return output
@@ -0,0 +1,59 @@
+"""Process-wide registry of loaded graphs, so each file is parsed and indexed once"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union
+
+from .arrays import GraphArrays
+from .cache import load_graph_cached
+from .stream import load_graph
+
+
+# Graphs kept alive by the registry; older entries are dropped first
+MAX_GRAPHS = 4
+
+_graphs: 'OrderedDict[tuple, GraphArrays]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_graph(path: Union[str, Path], cache: bool = True, register: bool = True) -> GraphArrays:
+    """
+    Shared GraphArrays for a graph file
+
+    Every caller in the process gets the same instance while the file is unchanged
+    (same size and mtime), together with its cached derived views (degrees,
+    adjacency, groups). On a miss the graph is loaded through the columnar cache
+    when `cache` is set, else streamed from the JSON.
+
+    register=False still returns an already registered instance, but a graph loaded
+    by the call is not kept, so it is freed once the caller drops it (for one-pass
+    runs over many graphs, such as batch workers).
+    """
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        graph = _graphs.get(key)
+        if graph is not None:
+            _graphs.move_to_end(key)
+            return graph
+
+    graph = load_graph_cached(path) if cache else load_graph(path)
+    if not register:
+        return graph
+    with _lock:
+        # Another thread may have loaded it meanwhile; keep the first instance
+        graph = _graphs.setdefault(key, graph)
+        _graphs.move_to_end(key)
+        for stale in [k for k in _graphs if k[0] == key[0] and k != key]:
+            del _graphs[stale]
+        while len(_graphs) > MAX_GRAPHS:
+            _graphs.popitem(last=False)
+    return graph
+
+
+def clear_graphs():
+    """Drop every registered graph"""
+    with _lock:
+        _graphs.clear()
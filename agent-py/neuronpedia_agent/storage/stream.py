@@ -0,0 +1,371 @@
+"""Incremental, event-based loader for large attribution graph JSON files"""
+
+import codecs
+import json
+import re
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from .arrays import EMBEDDING_LAYER, FEATURE_TYPES, GraphArrays
+from .compression import open_graph
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional accelerator
+    ijson = None
+
+
+CHUNK_SIZE = 1 << 20
+
+Event = Tuple[str, Any]
+
+_TOKEN = re.compile(r'''
+    [ \t\n\r]*
+    (?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)
+      | (?P<literal>true|false|null|NaN|-?Infinity)
+      | (?P<punct>[{}\[\]:,])
+    )
+''', re.VERBOSE)
+
+# A number ending this close to the end of the buffer may continue in the next chunk
+# ("12" + ".5", "1.5" + "e-3"): at most the '.', 'e' and sign of a cut-off suffix
+_NUMBER_TAIL = 3
+
+_LITERALS = {
+    'true': ('boolean', True), 'false': ('boolean', False), 'null': ('null', None),
+    'NaN': ('number', float('nan')), 'Infinity': ('number', float('inf')),
+    '-Infinity': ('number', float('-inf')),
+}
+
+
+def _basic_parse(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Event]:
+    """
+    Pure-Python tokenizer yielding ijson-style basic_parse events.
+
+    Only used when ijson is not installed; reads the stream in chunks so memory
+    stays bounded by the chunk size plus the longest token.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+    stack: List[bool] = []  # True for maps
+    expect_key = False
+
+    while True:
+        match = _TOKEN.match(buffer, pos)
+        # A token touching the end of the buffer may be cut short; refill first
+        if not eof and (match is None or match.end() == len(buffer) or
+                        (match.lastgroup == 'number' and match.end() > len(buffer) - _NUMBER_TAIL)):
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + decoder.decode(chunk or b'', final=eof)
+            pos = 0
+            continue
+        if match is None:
+            if buffer[pos:].strip():
+                raise ValueError(f"Invalid JSON near: {buffer[pos:pos + 40]!r}")
+            return
+        pos = match.end()
+        kind = match.lastgroup
+        token = match.group(kind)
+
+        if kind == 'punct':
+            if token == '{':
+                stack.append(True)
+                expect_key = True
+                yield 'start_map', None
+            elif token == '}':
+                stack.pop()
+                expect_key = False
+                yield 'end_map', None
+            elif token == '[':
+                stack.append(False)
+                yield 'start_array', None
+            elif token == ']':
+                stack.pop()
+                yield 'end_array', None
+            elif token == ',':
+                expect_key = bool(stack) and stack[-1]
+            else:
+                expect_key = False
+        elif kind == 'string':
+            value = json.loads(token) if '\\' in token else token[1:-1]
+            yield ('map_key' if expect_key else 'string'), value
+        elif kind == 'number':
+            value = int(token) if token.lstrip('-').isdigit() else float(token)
+            yield 'number', value
+        else:
+            yield _LITERALS[token]
+
+
+def iter_events(stream: BinaryIO) -> Iterator[Event]:
+    """basic_parse events from ijson when available, else from the pure-Python tokenizer"""
+    if ijson is not None:
+        return ijson.basic_parse(stream, use_float=True)
+    return _basic_parse(stream)
+
+
+def _build_value(events: Iterator[Event], event: str, value: Any) -> Any:
+    """Assemble one complete JSON value starting at the given event"""
+    if event == 'start_map':
+        result = {}
+        for event, value in events:
+            if event == 'end_map':
+                return result
+            key = value
+            result[key] = _build_value(events, *next(events))
+    if event == 'start_array':
+        result = []
+        for event, value in events:
+            if event == 'end_array':
+                return result
+            result.append(_build_value(events, event, value))
+    return value
+
+
+def _skip_value(events: Iterator[Event], event: str):
+    """Consume a nested value without building it"""
+    if event not in ('start_map', 'start_array'):
+        return
+    depth = 1
+    for event, _ in events:
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+# Node fields kept as columns, keyed by their name in either JSON layout
+_ID, _LAYER, _CTX, _FEATURE, _TYPE, _INFLUENCE, _ACTIVATION, _PROB, _TARGET, _CLERP = range(10)
+_NODE_FIELDS = {
+    'node_id': _ID, 'id': _ID, 'layer': _LAYER, 'ctx_idx': _CTX,
+    'feature': _FEATURE, 'feature_index': _FEATURE, 'feature_type': _TYPE,
+    'influence': _INFLUENCE, 'activation': _ACTIVATION, 'token_prob': _PROB,
+    'is_target_logit': _TARGET, 'clerp': _CLERP, 'explanation': _CLERP,
+}
+_LINK_FIELDS = {'source': 0, 'target': 1, 'weight': 2}
+
+
+def _layer_code(layer) -> int:
+    if layer is None:
+        return 0
+    if layer == 'E' or layer == 'e':
+        return EMBEDDING_LAYER
+    try:
+        return int(layer)
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Columns:
+    """Growable typed columns filled while the stream is parsed"""
+
+    def __init__(self):
+        self.node_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.layer = array('h')
+        self.ctx_idx = array('i')
+        self.feature = array('q')
+        self.feature_type = array('b')
+        self.feature_types = list(FEATURE_TYPES)
+        self.influence = array('f')
+        self.activation = array('f')
+        self.token_prob = array('f')
+        self.is_target_logit = bytearray()
+        self.clerp: List[str] = []
+        self.has_data = bytearray()
+        self.link_source = array('i')
+        self.link_target = array('i')
+        self.link_weight = array('f')
+
+    def intern(self, node_id: str) -> int:
+        idx = self.index.get(node_id)
+        if idx is None:
+            node_id = sys.intern(node_id)
+            idx = len(self.node_ids)
+            self.index[node_id] = idx
+            self.node_ids.append(node_id)
+            self.layer.append(0)
+            self.ctx_idx.append(-1)
+            self.feature.append(-1)
+            self.feature_type.append(0)
+            self.influence.append(np.nan)
+            self.activation.append(np.nan)
+            self.token_prob.append(np.nan)
+            self.is_target_logit.append(0)
+            self.clerp.append('')
+            self.has_data.append(0)
+        return idx
+
+    def add_node(self, record: List[Any]):
+        node_id = record[_ID]
+        if node_id is None:
+            return
+        # A repeated id replaces the earlier entry (keeping its position), as a
+        # {node['node_id']: node} dict over the node list would
+        idx = self.intern(str(node_id))
+        self.has_data[idx] = 1
+        self.layer[idx] = _layer_code(record[_LAYER])
+        self.ctx_idx[idx] = int(record[_CTX]) if record[_CTX] is not None else -1
+        self.feature[idx] = int(record[_FEATURE]) if record[_FEATURE] is not None else -1
+        self.feature_type[idx] = 0
+        if record[_TYPE] is not None:
+            if record[_TYPE] not in self.feature_types:
+                self.feature_types.append(record[_TYPE])
+            self.feature_type[idx] = self.feature_types.index(record[_TYPE])
+        for slot, column in ((_INFLUENCE, self.influence), (_ACTIVATION, self.activation),
+                             (_PROB, self.token_prob)):
+            column[idx] = record[slot] if record[slot] is not None else np.nan
+        self.is_target_logit[idx] = 1 if record[_TARGET] else 0
+        self.clerp[idx] = record[_CLERP] or ''
+
+    def add_link(self, record: List[Any]):
+        self.link_source.append(self.intern(str(record[0])))
+        self.link_target.append(self.intern(str(record[1])))
+        self.link_weight.append(record[2] if record[2] is not None else 0.0)
+
+    def finish(self, extra: Dict[str, Any], schema: str) -> GraphArrays:
+        return GraphArrays(
+            node_ids=self.node_ids,
+            index=self.index,
+            layer=np.frombuffer(self.layer, dtype=np.int16),
+            ctx_idx=np.frombuffer(self.ctx_idx, dtype=np.int32),
+            feature=np.frombuffer(self.feature, dtype=np.int64),
+            feature_type=np.frombuffer(self.feature_type, dtype=np.int8),
+            feature_types=self.feature_types,
+            influence=np.frombuffer(self.influence, dtype=np.float32),
+            activation=np.frombuffer(self.activation, dtype=np.float32),
+            token_prob=np.frombuffer(self.token_prob, dtype=np.float32),
+            is_target_logit=np.frombuffer(bytes(self.is_target_logit), dtype=bool),
+            clerp=self.clerp,
+            has_data=np.frombuffer(bytes(self.has_data), dtype=bool),
+            link_source=np.frombuffer(self.link_source, dtype=np.int32),
+            link_target=np.frombuffer(self.link_target, dtype=np.int32),
+            link_weight=np.frombuffer(self.link_weight, dtype=np.float32),
+            extra=extra,
+            schema=schema
+        )
+
+
+def _read_records(events: Iterator[Event], fields: Dict[str, int], size: int, on_record):
+    """Fill a reused slot list per array element from flat key/value events"""
+    empty = [None] * size
+    for event, value in events:
+        if event == 'end_array':
+            return
+        if event != 'start_map':
+            _skip_value(events, event)
+            continue
+        record = list(empty)
+        for event, value in events:
+            if event == 'end_map':
+                break
+            slot = fields.get(value)
+            event, value = next(events)
+            if event in ('start_map', 'start_array'):
+                _skip_value(events, event)
+            elif slot is not None:
+                record[slot] = value
+        on_record(record)
+
+
+def _read_graph(events: Iterator[Event], columns: _Columns,
+                extra: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Consume one graph object (its start_map already read) into columns and extra
+
+    Returns: (schema, the sections of a nested original_graph object, if any)
+    """
+    schema = 'neuronpedia'
+    original = None
+    for event, key in events:
+        if event == 'end_map':
+            break
+        event, value = next(events)
+        if key == 'nodes' and event == 'start_array':
+            _read_records(events, _NODE_FIELDS, len(set(_NODE_FIELDS.values())), columns.add_node)
+        elif key in ('links', 'edges') and event == 'start_array':
+            if key == 'edges':
+                schema = 'agent'
+            _read_records(events, _LINK_FIELDS, 3, columns.add_link)
+        elif key == 'original_graph' and event == 'start_map':
+            original = {}
+            schema = _read_graph(events, columns, original)[0]
+        else:
+            extra[key] = _build_value(events, event, value)
+    return schema, original
+
+
+def stream_graph(stream: BinaryIO, base_dir: Optional[Union[str, Path]] = None) -> GraphArrays:
+    """
+    Parse a graph JSON document from a binary stream into GraphArrays.
+
+    `nodes` and `links` (or `edges`) elements go straight into typed columns; only
+    the remaining top-level sections (metadata, qParams, ...) are built as objects.
+    Nested values inside nodes (e.g. top_logits) are skipped.
+
+    Cleaned-graph documents (see storage.output) yield the graph they were built
+    from: an embedded original_graph is parsed in place, a reference is loaded from
+    disk, relative to base_dir.
+    """
+    events = iter_events(stream)
+    columns = _Columns()
+    extra: Dict[str, Any] = {}
+
+    event, _ = next(events)
+    if event != 'start_map':
+        raise ValueError("Graph JSON must be an object")
+    schema, original = _read_graph(events, columns, extra)
+
+    if original is not None and '$ref' in original and not columns.node_ids:
+        from .output import resolve_reference
+        return resolve_reference(original, base_dir)
+    if original is not None:
+        return columns.finish(original, schema)
+    return columns.finish(extra, schema)
+
+
+def as_graph(data: Union[GraphArrays, Dict[str, Any]]) -> GraphArrays:
+    """
+    GraphArrays for a graph in any supported form
+
+    A GraphArrays is returned as is; a JSON-style dict in either layout (node_id/links
+    or id/edges) is converted the same way stream_graph converts a file.
+    """
+    if isinstance(data, GraphArrays):
+        return data
+    columns = _Columns()
+    extra: Dict[str, Any] = {}
+    schema = 'neuronpedia'
+    size = len(set(_NODE_FIELDS.values()))
+    for key, value in data.items():
+        if key == 'nodes' and isinstance(value, list):
+            for node in value:
+                record = [None] * size
+                for field, item in node.items():
+                    slot = _NODE_FIELDS.get(field)
+                    if slot is not None and not isinstance(item, (dict, list)):
+                        record[slot] = item
+                columns.add_node(record)
+        elif key in ('links', 'edges') and isinstance(value, list):
+            if key == 'edges':
+                schema = 'agent'
+            for link in value:
+                columns.add_link([link.get('source'), link.get('target'), link.get('weight')])
+        else:
+            extra[key] = value
+    return columns.finish(extra, schema)
+
+
+def load_graph(path: Union[str, Path]) -> GraphArrays:
+    """Stream a graph JSON file (optionally gzip / zstd compressed) from disk into GraphArrays"""
+    with open_graph(path) as f:
+        return stream_graph(f, base_dir=Path(path).parent)
@@ -1,3 +1,6 @@
-"""Utility modules (to be implemented)"""
+"""Utility modules"""
 
-# TODO: Implement visualization and logging utilities
+from .config import DEFAULT_CONFIG_PATH, load_config
+from .profiling import Profiler, add_tokens, profile, profiled, span
+
+__all__ = ['DEFAULT_CONFIG_PATH', 'load_config', 'Profiler', 'add_tokens', 'profile', 'profiled', 'span']
@@ -0,0 +1,23 @@
+"""Loading of the agent's config.yaml"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+import yaml
+
+
+# config.yaml shipped next to main.py
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[2] / 'config.yaml'
+
+
+def load_config(path: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+    """
+    Read config.yaml (the default one when path is None)
+
+    Returns: Config dict ({} if the default file is missing)
+    """
+    if path is None:
+        path = DEFAULT_CONFIG_PATH
+        if not path.exists():
+            return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
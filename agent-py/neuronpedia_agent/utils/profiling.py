@@ -0,0 +1,292 @@
+"""Per-stage spans: wall time, CPU time, peak memory and LLM token usage"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Active profiler; spans are no-ops while this is None
+_active: Optional['Profiler'] = None
+
+
+@dataclass
+class Span:
+    """One completed (or open) stage"""
+    name: str
+    start_ns: int
+    thread: int
+    depth: int
+    args: Dict[str, Any] = field(default_factory=dict)
+    wall_ns: int = 0
+    cpu_ns: int = 0
+    peak_bytes: Optional[int] = None  # Peak traced allocation above the span's starting point
+    input_tokens: int = 0
+    output_tokens: int = 0
+    _cpu_start: int = 0
+    _memory_start: int = 0
+
+
+class Profiler:
+    """
+    Records nested spans while active (see profile / span / profiled)
+
+    - memory: Trace allocations with tracemalloc for per-span peak memory (numpy
+      buffers included); slows allocation-heavy Python code, so wall times under
+      memory profiling run somewhat high
+
+    CPU time is process-wide (time.process_time), so it includes worker threads;
+    work in child processes is not attributed.
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.spans: List[Span] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self._started_tracing = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _fold_peak(self, stack: List[Span]):
+        """Credit the peak since the last reset to every open span, then reset it"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_span in stack:
+            open_span.peak_bytes = max(open_span.peak_bytes or 0, peak - open_span._memory_start)
+        tracemalloc.reset_peak()
+
+    def enter(self, name: str, args: Dict[str, Any]) -> Span:
+        stack = self._stack()
+        span = Span(name=name, start_ns=time.perf_counter_ns() - self._origin_ns, thread=threading.get_ident(),
+                    depth=len(stack), args=args)
+        if self.memory and tracemalloc.is_tracing():
+            self._fold_peak(stack)
+            span._memory_start = tracemalloc.get_traced_memory()[0]
+            span.peak_bytes = 0
+        span._cpu_start = time.process_time_ns()
+        stack.append(span)
+        return span
+
+    def exit(self, span: Span):
+        span.wall_ns = time.perf_counter_ns() - self._origin_ns - span.start_ns
+        span.cpu_ns = time.process_time_ns() - span._cpu_start
+        stack = self._stack()
+        if self.memory and tracemalloc.is_tracing():
+            self._fold_peak(stack)
+        if stack and stack[-1] is span:
+            stack.pop()
+        with self._lock:
+            self.spans.append(span)
+
+    def add_tokens(self, input_tokens: int, output_tokens: int):
+        """Attribute LLM token usage to every open span of the current thread"""
+        for open_span in self._stack():
+            open_span.input_tokens += input_tokens
+            open_span.output_tokens += output_tokens
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace Event Format document (chrome://tracing, Perfetto, speedscope)"""
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'neuronpedia_agent'}}]
+        for span in sorted(self.spans, key=lambda s: (s.start_ns, s.depth)):
+            args = dict(span.args)
+            args['cpu_ms'] = span.cpu_ns / 1e6
+            if span.peak_bytes is not None:
+                args['peak_mb'] = span.peak_bytes / 2 ** 20
+            if span.input_tokens or span.output_tokens:
+                args['input_tokens'] = span.input_tokens
+                args['output_tokens'] = span.output_tokens
+            events.append({
+                'name': span.name, 'cat': span.name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': span.thread,
+                'ts': span.start_ns / 1e3, 'dur': span.wall_ns / 1e3, 'args': args
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Spans aggregated by call path (stage names from the root), in first-start order
+
+        self_seconds excludes time spent in nested spans of the same thread.
+        """
+        child_ns: Dict[int, int] = {}
+        paths: Dict[int, tuple] = {}
+        open_by_thread: Dict[int, List[Span]] = {}
+        for span in sorted(self.spans, key=lambda s: (s.thread, s.start_ns, s.depth)):
+            stack = open_by_thread.setdefault(span.thread, [])
+            while stack and stack[-1].start_ns + stack[-1].wall_ns <= span.start_ns:
+                stack.pop()
+            if stack:
+                child_ns[id(stack[-1])] = child_ns.get(id(stack[-1]), 0) + span.wall_ns
+                paths[id(span)] = paths[id(stack[-1])] + (span.name,)
+            else:
+                paths[id(span)] = (span.name,)
+            stack.append(span)
+
+        rows: Dict[tuple, Dict[str, Any]] = {}
+        for span in sorted(self.spans, key=lambda s: (s.start_ns, s.depth)):
+            path = paths[id(span)]
+            row = rows.setdefault(path, {
+                'name': span.name, 'path': list(path), 'depth': len(path) - 1, 'calls': 0, 'seconds': 0.0,
+                'self_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': None, 'input_tokens': 0, 'output_tokens': 0
+            })
+            row['calls'] += 1
+            row['seconds'] += span.wall_ns / 1e9
+            row['self_seconds'] += (span.wall_ns - child_ns.get(id(span), 0)) / 1e9
+            row['cpu_seconds'] += span.cpu_ns / 1e9
+            if span.peak_bytes is not None:
+                row['peak_bytes'] = max(row['peak_bytes'] or 0, span.peak_bytes)
+            row['input_tokens'] += span.input_tokens
+            row['output_tokens'] += span.output_tokens
+        # Children directly after their parent
+        first = {path: i for i, path in enumerate(rows)}
+        return sorted(rows.values(), key=lambda row: [first[tuple(row['path'][:i + 1])]
+                                                      for i in range(len(row['path']))])
+
+    def format_summary(self) -> str:
+        """Human-readable table of summary()"""
+        rows = self.summary()
+        if not rows:
+            return 'No spans recorded'
+        label = max(len('  ' * row['depth'] + row['name']) for row in rows) + 2
+        lines = ['stage'.ljust(label) + f"{'calls':>6}{'wall s':>10}{'self s':>10}{'cpu s':>10}{'peak MB':>10}{'tokens':>10}"]
+        for row in rows:
+            peak = '-' if row['peak_bytes'] is None else f"{row['peak_bytes'] / 2 ** 20:.1f}"
+            tokens = row['input_tokens'] + row['output_tokens']
+            lines.append(('  ' * row['depth'] + row['name']).ljust(label)
+                         + f"{row['calls']:>6}{row['seconds']:>10.3f}{row['self_seconds']:>10.3f}"
+                         + f"{row['cpu_seconds']:>10.3f}{peak:>10}{tokens or '-':>10}")
+        if resource is not None:
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            scale = 1 if os.uname().sysname == 'Darwin' else 1024
+            lines.append(f"Process max RSS: {max_rss * scale / 2 ** 20:.0f} MB")
+        return '\n'.join(lines)
+
+
+class _NullSpan:
+    """Shared no-op context manager returned while profiling is off"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ('profiler', 'name', 'args', 'span')
+
+    def __init__(self, profiler: Profiler, name: str, args: Dict[str, Any]):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> Span:
+        self.span = self.profiler.enter(self.name, self.args)
+        return self.span
+
+    def __exit__(self, *exc):
+        self.profiler.exit(self.span)
+        return False
+
+
+def span(name: str, **args):
+    """
+    Context manager timing one stage under the active profiler
+
+    Returns a shared no-op object when profiling is off, so instrumented code pays only
+    a global lookup. Keyword arguments are recorded on the trace event.
+    """
+    profiler = _active
+    if profiler is None:
+        return _NULL_SPAN
+    return _ActiveSpan(profiler, name, args)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator form of span (defaults to the function's qualified name)"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+            with _ActiveSpan(profiler, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_tokens(input_tokens: int, output_tokens: int):
+    """Record LLM token usage against the open spans (no-op when profiling is off)"""
+    profiler = _active
+    if profiler is not None:
+        profiler.add_tokens(input_tokens, output_tokens)
+
+
+def active_profiler() -> Optional[Profiler]:
+    return _active
+
+
+@contextmanager
+def profile(enabled: bool = True, memory: bool = True) -> Iterator[Optional[Profiler]]:
+    """
+    Activate a Profiler for the duration of the block (yields None when disabled)
+
+    Example:
+        with profile() as profiler:
+            cleanup_graph(...)
+        profiler.write_trace('trace.json')
+        print(profiler.format_summary())
+    """
+    global _active
+    if not enabled:
+        yield None
+        return
+    previous = _active
+    profiler = Profiler(memory=memory)
+    profiler.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+        profiler.stop()
@@ -0,0 +1,8 @@
+"""Make the neuronpedia_agent package importable when pytest runs from any directory"""
+
+import sys
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parents[1]
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
@@ -0,0 +1,130 @@
+"""Path tracing, node selection and metrics on small hand-built graphs"""
+
+import pytest
+
+from neuronpedia_agent.analysis import prune_graph, threshold_sweep
+from neuronpedia_agent.analysis.graph_analyzer import GraphAnalyzer
+from neuronpedia_agent.analysis.node_selector import NodeSelector
+from neuronpedia_agent.benchmark import synthetic_graph
+from neuronpedia_agent.optimization.greedy import GreedyOptimizer
+from neuronpedia_agent.optimization.metrics import MetricsCalculator
+from neuronpedia_agent.pipeline import selection_settings
+
+
+def _node(node_id, layer, feature_type='cross layer transcoder', **extra):
+    return {'node_id': node_id, 'feature': int(node_id.split('_')[1]), 'layer': layer, 'ctx_idx': 0,
+            'feature_type': feature_type, 'influence': 0.5, 'activation': 1.0, **extra}
+
+
+def _diamond():
+    """
+    Two embeddings feed two parallel mid-layer features that both route through one
+    late feature into the logit:
+
+        E_1 -> 6_10 -> 20_30 -> logit
+        E_2 -> 7_20 -^
+    """
+    nodes = [
+        _node('E_1_0', 'E', 'embedding'), _node('E_2_0', 'E', 'embedding'),
+        _node('6_10_0', '6'), _node('7_20_0', '7'), _node('20_30_0', '20'),
+        _node('27_40_0', '27', 'logit', token_prob=0.9, is_target_logit=True),
+    ]
+    links = [
+        {'source': 'E_1_0', 'target': '6_10_0', 'weight': 1.0},
+        {'source': 'E_2_0', 'target': '7_20_0', 'weight': 1.0},
+        {'source': '6_10_0', 'target': '20_30_0', 'weight': 0.6},
+        {'source': '7_20_0', 'target': '20_30_0', 'weight': 0.4},
+        {'source': '20_30_0', 'target': '27_40_0', 'weight': 1.0},
+    ]
+    return {'nodes': nodes, 'links': links}
+
+
+def test_bottlenecks_from_path_flow():
+    analyzer = GraphAnalyzer(_diamond())
+    paths = analyzer.trace_pathways(['E_1_0', 'E_2_0'], ['27_40_0'], k=5)
+
+    assert [p.nodes for p in paths] == [['E_1_0', '6_10_0', '20_30_0', '27_40_0'],
+                                        ['E_2_0', '7_20_0', '20_30_0', '27_40_0']]
+    # Shares of the logit's path flow: 20_30_0 all of it, 6_10_0 60%, 7_20_0 40%
+    assert paths[0].bottleneck_nodes == ['6_10_0', '20_30_0']
+    assert paths[1].bottleneck_nodes == ['20_30_0']
+    strict = analyzer.trace_pathways(['E_1_0', 'E_2_0'], ['27_40_0'], k=5, bottleneck_share=0.7)
+    assert strict[0].bottleneck_nodes == ['20_30_0']
+
+
+def test_pathway_selection_settings():
+    config = {'node_selection': {'pathway_strategy': {'num_target_logits': 1, 'paths_per_logit': 1,
+                                                      'min_path_influence': 0.05}}}
+    settings = selection_settings(config)
+    assert settings == {'num_target_logits': 1, 'paths_per_logit': 1}
+
+    selector = NodeSelector(GraphAnalyzer(_diamond()), max_nodes=3, **settings)
+    # One path traced: its intermediates carry all the flow, then the rest of the path
+    assert selector.select_nodes_for_pinning('pathway') == ['6_10_0', '20_30_0', 'E_1_0']
+
+
+def _layered(width=3, depth=3):
+    """
+    `depth` fully connected layers of `width` features between `width` embeddings and one
+    logit, so width ** (depth + 1) paths run over only width * (depth + 1) + 1 nodes
+    """
+    layers = [[_node(f'E_{i}_0', 'E', 'embedding') for i in range(width)]]
+    layers += [[_node(f'{6 + d}_{d * width + i}_0', str(6 + d)) for i in range(width)] for d in range(depth)]
+    layers.append([_node('27_99_0', '27', 'logit', token_prob=0.9, is_target_logit=True)])
+    links = [{'source': a['node_id'], 'target': b['node_id'], 'weight': 1.0 + 0.1 * i + 0.01 * j}
+             for upper, lower in zip(layers, layers[1:])
+             for i, a in enumerate(upper) for j, b in enumerate(lower)]
+    return {'nodes': [node for layer in layers for node in layer], 'links': links}
+
+
+def test_pathway_widening_stops_when_paths_add_no_node():
+    analyzer = GraphAnalyzer(_layered())
+    widths = []
+    trace = analyzer.trace_pathways
+    analyzer.trace_pathways = lambda *args, k, **kwargs: widths.append(k) or trace(*args, k=k, **kwargs)
+
+    # 81 paths over 13 nodes; max_nodes is out of reach
+    selected = NodeSelector(analyzer, max_nodes=100, paths_per_logit=1).select_nodes_for_pinning('pathway')
+    assert len(selected) == 13
+    assert widths[-1] < 81
+    assert widths == [1 << i for i in range(len(widths))]
+
+    widths.clear()
+    NodeSelector(analyzer, max_nodes=100, paths_per_logit=1, max_paths_per_logit=4).select_nodes_for_pinning('pathway')
+    assert widths == [1, 2, 4]
+
+
+def test_optimize_weights_reach_greedy():
+    config = {'node_selection': {'optimize_strategy': {'replacement_weight': 1.0, 'completeness_weight': 0.0}}}
+    settings = selection_settings(config)
+    assert settings == {'replacement_weight': 1.0, 'completeness_weight': 0.0}
+
+    analyzer = GraphAnalyzer(_diamond())
+    replacement_only = NodeSelector(analyzer, max_nodes=2, **settings).select_nodes_for_pinning('optimize')
+    metrics = MetricsCalculator({}, {}, analyzer=analyzer)
+    optimizer = GreedyOptimizer(metrics, replacement_weight=1.0, completeness_weight=0.0)
+    assert replacement_only == optimizer.select(2)
+    # Pinning the shared late feature and the stronger branch covers the 60% path
+    assert metrics.compute_replacement_score(replacement_only) > 0.5
+
+
+def test_metrics_views_are_read_only():
+    metrics = MetricsCalculator({}, {}, analyzer=GraphAnalyzer(_diamond()))
+    assert metrics.sources.tolist() == [True, True, False, False, False, False]
+    assert metrics.incoming_weight[4] == pytest.approx(1.0)
+    for array in (metrics.sources, metrics.direct_influence, metrics.incoming_weight):
+        with pytest.raises(ValueError):
+            array[0] = 0
+
+
+def test_sweep_cells_match_prune_graph():
+    graph = synthetic_graph(num_nodes=400, num_edges=4000, seed=4)
+    analyzer = GraphAnalyzer.from_arrays(graph)
+    sweep = threshold_sweep(graph, (0.5, 0.8, 1.0), (0.8, 0.98, 1.0), analyzer=analyzer)
+
+    for i, node_threshold in enumerate(sweep.node_thresholds):
+        for j, edge_threshold in enumerate(sweep.edge_thresholds):
+            pruned = prune_graph(graph, node_threshold, edge_threshold, analyzer=analyzer).graph
+            assert (sweep.num_nodes[i, j], sweep.num_edges[i, j]) == (pruned.num_nodes, pruned.num_links)
+    # For a fixed node threshold, a higher edge threshold keeps a superset of paths
+    assert (sweep.replacement[:, 1:] >= sweep.replacement[:, :-1] - 1e-9).all()
@@ -0,0 +1,211 @@
+"""Pooled Neuronpedia clients against a local mock of the API and S3"""
+
+import asyncio
+import gzip
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from neuronpedia_agent.api import AsyncNeuronpediaClient, NeuronpediaAPIError, NeuronpediaClient
+from neuronpedia_agent.benchmark import synthetic_graph
+from neuronpedia_agent.storage import write_graph_json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class MockNeuronpedia:
+    """
+    Threaded HTTP/1.1 server answering a few API routes plus static "S3" objects
+
+    - GET /api/feature/<model>/<source>/<index>: {"index": index} after `latency` seconds
+    - GET /api/flaky: statuses popped from `script`, then 200
+    - POST /api/graph/subgraph/save: echoes the payload
+    - GET /s3/<name>: bytes from `objects`
+
+    Records requests, the connections they arrived on, API keys seen per path and the
+    peak number of requests in flight.
+    """
+
+    def __init__(self, latency=0.0, script=(), objects=None):
+        self.latency = latency
+        self.script = list(script)
+        self.objects = objects or {}
+        self.requests = 0
+        self.connections = set()
+        self.keys = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _reply(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('content-type', content_type)
+                self.send_header('content-length', str(len(body)))
+                if status == 429:
+                    self.send_header('retry-after', '0')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, payload=None):
+                path = urlparse(self.path).path
+                with mock.lock:
+                    mock.requests += 1
+                    mock.connections.add(self.client_address)
+                    mock.keys[path] = self.headers.get('x-api-key')
+                    mock.in_flight += 1
+                    mock.peak_in_flight = max(mock.peak_in_flight, mock.in_flight)
+                try:
+                    if path.startswith('/api/feature/'):
+                        time.sleep(mock.latency)
+                        self._reply(200, json.dumps({'index': int(path.rsplit('/', 1)[1])}).encode())
+                    elif path == '/api/flaky':
+                        with mock.lock:
+                            status = mock.script.pop(0) if mock.script else 200
+                        self._reply(status, json.dumps({'ok': status == 200}).encode())
+                    elif path == '/api/graph/subgraph/save':
+                        self._reply(200, json.dumps({'saved': payload}).encode())
+                    elif path.startswith('/s3/') and path[4:] in mock.objects:
+                        self._reply(200, mock.objects[path[4:]], 'application/octet-stream')
+                    else:
+                        self._reply(404, b'{"error": "not found"}')
+                finally:
+                    with mock.lock:
+                        mock.in_flight -= 1
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle(json.loads(self.rfile.read(int(self.headers.get('content-length', 0)))))
+
+            def log_message(self, *args):
+                pass
+
+        # The default listen backlog of 5 drops a burst of new pooled connections
+        server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 128, 'daemon_threads': True})
+        self.server = server_class(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.api_url = self.url + '/api'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope='module')
+def graph_bytes():
+    buffer = io.StringIO()
+    write_graph_json(synthetic_graph(num_nodes=300, num_edges=3000, seed=2), buffer)
+    return buffer.getvalue().encode()
+
+
+def test_sync_requests_reuse_one_connection():
+    with MockNeuronpedia() as mock, NeuronpediaClient(base_url=mock.api_url) as client:
+        results = [client.get_feature('m', 'src', i) for i in range(20)]
+    assert [r['index'] for r in results] == list(range(20))
+    assert mock.requests == 20
+    assert len(mock.connections) == 1
+
+
+def test_retries_then_succeeds():
+    with MockNeuronpedia(script=[429, 502, 503]) as mock, \
+            NeuronpediaClient(base_url=mock.api_url, retry_attempts=3, backoff_base=0.01) as client:
+        assert client.get('flaky') == {'ok': True}
+    assert mock.requests == 4
+
+
+def test_retries_exhausted_raises():
+    with MockNeuronpedia(script=[500] * 3) as mock, \
+            NeuronpediaClient(base_url=mock.api_url, retry_attempts=2, backoff_base=0.01) as client:
+        with pytest.raises(NeuronpediaAPIError) as error:
+            client.get('flaky')
+    assert error.value.status_code == 500
+    assert mock.requests == 3
+
+
+def test_client_errors_are_not_retried():
+    with MockNeuronpedia() as mock, NeuronpediaClient(base_url=mock.api_url, backoff_base=0.01) as client:
+        with pytest.raises(NeuronpediaAPIError):
+            client.get('missing')
+    assert mock.requests == 1
+
+
+def test_api_key_only_sent_to_api(graph_bytes):
+    with MockNeuronpedia(objects={'graph.json': graph_bytes}) as mock, \
+            NeuronpediaClient(api_key='secret', base_url=mock.api_url) as client:
+        client.save_subgraph({'slug': 'x'})
+        b''.join(client.iter_download(mock.url + '/s3/graph.json'))
+    assert mock.keys['/api/graph/subgraph/save'] == 'secret'
+    assert mock.keys['/s3/graph.json'] is None
+
+
+@pytest.mark.parametrize('codec', ['plain', 'gzip', 'zstd'])
+def test_download_graph(graph_bytes, codec, tmp_path):
+    if codec == 'zstd' and zstandard is None:
+        pytest.skip('zstandard not installed')
+    body = {'plain': lambda data: data, 'gzip': gzip.compress,
+            'zstd': lambda data: zstandard.ZstdCompressor().compress(data)}[codec](graph_bytes)
+    expected = json.loads(graph_bytes)
+
+    with MockNeuronpedia(objects={'graph': body}) as mock, NeuronpediaClient(base_url=mock.api_url) as client:
+        url = mock.url + '/s3/graph'
+        assert b''.join(client.iter_download(url, chunk_size=4096)) == graph_bytes
+        assert client.download(url, tmp_path / 'raw').read_bytes() == body
+        assert client.download(url, tmp_path / 'plain', decompress=True).read_bytes() == graph_bytes
+
+        graph = client.download_graph(url, dest=tmp_path / 'kept')
+        assert (tmp_path / 'kept').read_bytes() == body
+    assert graph.num_nodes == len(expected['nodes'])
+    assert graph.num_links == len(expected['links'])
+
+
+def test_async_download(graph_bytes, tmp_path):
+    async def run(url):
+        async with AsyncNeuronpediaClient(base_url=url + '/api') as client:
+            return await client.download(url + '/s3/graph', tmp_path / 'graph.json', decompress=True)
+
+    with MockNeuronpedia(objects={'graph': gzip.compress(graph_bytes)}) as mock:
+        assert asyncio.run(run(mock.url)).read_bytes() == graph_bytes
+
+
+def test_async_fan_out_beats_sequential():
+    """100 feature lookups at 20 ms latency each: pooled fan-out against one at a time"""
+    count, latency, connections = 100, 0.02, 16
+
+    with MockNeuronpedia(latency=latency) as mock:
+        with NeuronpediaClient(base_url=mock.api_url) as client:
+            start = time.perf_counter()
+            sequential = [client.get_feature('m', 'src', i) for i in range(count)]
+            sequential_time = time.perf_counter() - start
+
+        async def fan_out():
+            async with AsyncNeuronpediaClient(base_url=mock.api_url, max_connections=connections) as client:
+                return await client.get_features('m', (('src', i) for i in range(count)))
+
+        mock.peak_in_flight = 0
+        start = time.perf_counter()
+        concurrent = asyncio.run(fan_out())
+        concurrent_time = time.perf_counter() - start
+
+    assert concurrent == sequential
+    assert sequential_time >= count * latency
+    assert 1 < mock.peak_in_flight <= connections
+    # Ideally ~7x faster; leave headroom for a loaded machine
+    assert concurrent_time < sequential_time / 2, (concurrent_time, sequential_time)
@@ -0,0 +1,69 @@
+"""Batch input discovery and the resumable manifest"""
+
+import json
+
+from neuronpedia_agent.pipeline.batch import MANIFEST_FILE, BatchManifest, GraphRecord, find_graph_files
+
+
+def _touch(path, text='{}'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_find_graph_files_filters_below_the_source_only(tmp_path):
+    root = tmp_path / '.cache' / 'graphs'
+    graph = _touch(root / 'a.json')
+    nested = _touch(root / 'sub' / 'b.json.gz')
+    _touch(root / 'a.cleaned.json')
+    _touch(root / 'a.cleaned.json.zst')
+    _touch(root / 'out.cleaned.json.graph' / 'meta.json')
+    _touch(root / 'sub' / '.cache' / 'c.json')
+
+    assert find_graph_files(root) == [graph, nested]
+    assert find_graph_files(str(root / '**' / '*.json*')) == [graph, nested]
+
+
+def _record(graph_file, output, status='done'):
+    stat = graph_file.stat()
+    return GraphRecord(graph_file=str(graph_file), output=str(output), status=status,
+                       size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+def test_manifest_resume(tmp_path):
+    graphs = [_touch(tmp_path / f'{name}.json') for name in 'abcd']
+    outputs = [_touch(tmp_path / 'out' / f'{name}.cleaned.json') for name in 'abcd']
+    manifest = BatchManifest(tmp_path / 'out' / MANIFEST_FILE)
+    manifest.append(_record(graphs[0], outputs[0]))
+    manifest.append(_record(graphs[1], outputs[1], status='failed'))
+    manifest.append(_record(graphs[2], outputs[2]))
+    manifest.append(_record(graphs[3], outputs[3]))
+
+    outputs[2].unlink()
+    _touch(graphs[3], '{"nodes": []}')
+
+    resumed = BatchManifest(manifest.path)
+    assert [resumed.is_done(path) for path in graphs] == [True, False, False, False]
+
+    # A later record for the same graph replaces the earlier one
+    resumed.append(_record(graphs[1], outputs[1]))
+    assert BatchManifest(manifest.path).is_done(graphs[1])
+
+
+def test_manifest_torn_last_line(tmp_path):
+    graphs = [_touch(tmp_path / f'{name}.json') for name in 'ab']
+    outputs = [_touch(tmp_path / f'{name}.cleaned.json') for name in 'ab']
+    path = tmp_path / MANIFEST_FILE
+    BatchManifest(path).append(_record(graphs[0], outputs[0]))
+    # Crash in the middle of writing the second record
+    line = json.dumps(vars(_record(graphs[1], outputs[1])))
+    with open(path, 'a') as f:
+        f.write(line[:len(line) // 2])
+
+    manifest = BatchManifest(path)
+    assert manifest.is_done(graphs[0])
+    assert not manifest.is_done(graphs[1])
+
+    manifest.append(_record(graphs[1], outputs[1]))
+    resumed = BatchManifest(path)
+    assert resumed.is_done(graphs[0]) and resumed.is_done(graphs[1])
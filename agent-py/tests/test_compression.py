@@ -0,0 +1,60 @@
+"""Incremental gzip / zstd decoding must not depend on where chunk boundaries fall"""
+
+import gzip
+import io
+
+import pytest
+
+from neuronpedia_agent.storage.compression import DecompressingReader, StreamDecompressor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PARTS = [b'{"nodes": [', b'{"node_id": "0_1_0"}, ' * 50, b'{"node_id": "1_2_0"}]', b', "links": []}']
+
+
+def _compress(codec, part):
+    if codec == 'gzip':
+        return gzip.compress(part)
+    return zstandard.ZstdCompressor().compress(part)
+
+
+def _codecs():
+    return ['gzip', pytest.param('zstd', marks=pytest.mark.skipif(zstandard is None, reason='zstandard not installed'))]
+
+
+@pytest.mark.parametrize('codec', _codecs())
+def test_chunks_ending_on_frame_boundaries(codec):
+    # One member / frame per part, fed one frame per chunk
+    frames = [_compress(codec, part) for part in PARTS]
+    decoder = StreamDecompressor()
+    data = b''.join(decoder.feed(frame) for frame in frames) + decoder.flush()
+    assert decoder.compression == codec
+    assert data == b''.join(PARTS)
+
+
+@pytest.mark.parametrize('codec', _codecs())
+def test_every_chunk_size(codec):
+    body = b''.join(_compress(codec, part) for part in PARTS)
+    for chunk_size in range(1, len(body) + 1, 3):
+        decoder = StreamDecompressor()
+        data = b''.join(decoder.feed(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size))
+        assert data + decoder.flush() == b''.join(PARTS), chunk_size
+
+
+def test_plain_and_short_streams():
+    decoder = StreamDecompressor()
+    assert decoder.feed(b'{') + decoder.flush() == b'{'
+    assert decoder.compression is None
+
+    decoder = StreamDecompressor()
+    assert decoder.feed(b'{"a": ') + decoder.feed(b'1}') + decoder.flush() == b'{"a": 1}'
+
+
+@pytest.mark.parametrize('codec', _codecs())
+def test_reader(codec):
+    body = b''.join(_compress(codec, part) for part in PARTS)
+    reader = DecompressingReader(io.BytesIO(body), chunk_size=7)
+    assert reader.read(5) + reader.read() == b''.join(PARTS)
@@ -0,0 +1,111 @@
+"""Co-occurrence matrices: incremental accumulation, shard merging and partner scores"""
+
+import numpy as np
+import pytest
+
+import neuronpedia_agent.index.cooccurrence as cooccurrence
+from neuronpedia_agent.index import CooccurrenceMatrix, FeatureSet, merge_shards
+
+
+def _features(model, keys, edges=()):
+    """FeatureSet over (layer, feature) keys with (source position, target position, weight) edges"""
+    edges = list(edges)
+    return FeatureSet(
+        model=model,
+        layer=np.array([layer for layer, _ in keys], dtype=np.int64),
+        feature=np.array([feature for _, feature in keys], dtype=np.int64),
+        edge_source=np.array([s for s, _, _ in edges], dtype=np.int64),
+        edge_target=np.array([t for _, t, _ in edges], dtype=np.int64),
+        edge_weight=np.array([w for _, _, w in edges], dtype=np.float64)
+    )
+
+
+def _corpus(num_graphs=12, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for g in range(num_graphs):
+        keys = sorted({(int(layer), int(feature)) for layer, feature in rng.integers(0, 6, size=(8, 2))})
+        edges = [(int(s), int(t), float(w)) for s, t, w in zip(rng.integers(0, len(keys), 5),
+                                                               rng.integers(0, len(keys), 5), rng.normal(size=5))]
+        corpus.append((f'g{g}', _features('gemma' if g % 3 else 'gpt2', keys, edges)))
+    return corpus
+
+
+def _contents(matrix):
+    """Every statistic keyed by feature (model, layer, feature), independent of internal ids"""
+    matrix._flush()
+    keys = matrix._key(np.arange(matrix.num_features))
+    cooc = matrix._cooccurrence.tocoo()
+    influence = matrix._influence.tocoo()
+    influence_t = matrix._influence_t.tocoo()
+    return (
+        {key: int(count) for key, count in zip(keys, matrix._graph_count) if count},
+        {(keys[i], keys[j]): int(v) for i, j, v in zip(cooc.row, cooc.col, cooc.data) if v},
+        {(keys[i], keys[j]): round(float(v), 9) for i, j, v in zip(influence.row, influence.col, influence.data)},
+        {(keys[j], keys[i]): round(float(v), 9) for i, j, v in zip(influence_t.row, influence_t.col, influence_t.data)},
+    )
+
+
+def test_merged_shards_equal_one_pass(tmp_path, monkeypatch):
+    # Flush every few graphs, so the matrices grow between flushes
+    monkeypatch.setattr(cooccurrence, '_FLUSH_ENTRIES', 40)
+    corpus = _corpus()
+
+    whole = CooccurrenceMatrix()
+    for name, features in corpus:
+        whole.add_features(name, features)
+
+    # The second shard meets the models in the opposite order, so its model codes are remapped
+    first, second = CooccurrenceMatrix(), CooccurrenceMatrix()
+    for name, features in corpus[:5]:
+        first.add_features(name, features)
+    for name, features in corpus[5:][::-1]:
+        second.add_features(name, features)
+    assert first.models == ['gpt2', 'gemma'] and second.models == ['gemma', 'gpt2']
+
+    merged = merge_shards([first.save(tmp_path / 'a'), second.save(tmp_path / 'b')])
+    assert sorted(merged.graphs) == sorted(whole.graphs)
+    assert _contents(merged) == _contents(whole)
+    influence, influence_t = _contents(whole)[2:]
+    assert influence == influence_t
+
+    with pytest.raises(ValueError):
+        merged.merge(first)
+
+
+def test_add_after_load(tmp_path):
+    corpus = _corpus(6, seed=1)
+    whole = CooccurrenceMatrix()
+    for name, features in corpus:
+        whole.add_features(name, features)
+
+    partial = CooccurrenceMatrix()
+    for name, features in corpus[:3]:
+        partial.add_features(name, features)
+    # graph_count is a read-only memory map after load
+    resumed = CooccurrenceMatrix.load(partial.save(tmp_path / 'm'))
+    for name, features in corpus:
+        resumed.add_features(name, features)
+    assert resumed.num_graphs == 6
+    assert _contents(resumed) == _contents(whole)
+
+
+def test_partner_scores():
+    matrix = CooccurrenceMatrix()
+    # (1, 1) is in every graph, (2, 2) in half of them, (3, 3) only with (2, 2)
+    for g in range(4):
+        keys = [(1, 1), (4, 4)] + ([(2, 2), (3, 3)] if g % 2 else [])
+        matrix.add_features(f'g{g}', _features('m', keys))
+
+    npmi = {(p.layer, p.feature): p.score for p in matrix.partners('m', 1, 1, score='npmi')}
+    # Present in every graph: independent of everything, except another feature that is too
+    assert npmi == {(4, 4): 1.0, (2, 2): pytest.approx(0.0), (3, 3): pytest.approx(0.0)}
+    assert matrix.partners('m', 2, 2, score='npmi')[0].feature == 3
+    assert matrix.partners('m', 2, 2, score='npmi')[0].score == pytest.approx(1.0)
+
+    jaccard = {(p.layer, p.feature): p.score for p in matrix.partners('m', 2, 2, score='jaccard')}
+    assert jaccard == {(3, 3): 1.0, (1, 1): 0.5, (4, 4): 0.5}
+    top = matrix.partners('m', 1, 1, k=1)
+    assert [(p.layer, p.feature, p.count) for p in top] == [(4, 4, 4)]
+    assert matrix.count(('m', 2, 2), ('m', 3, 3)) == 2 and matrix.graph_count('m', 1, 1) == 4
+    assert matrix.partners('other', 1, 1) == []
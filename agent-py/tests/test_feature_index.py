@@ -0,0 +1,101 @@
+"""SQLite feature index: incremental updates, lookups and multi-feature queries"""
+
+import json
+import os
+
+import pytest
+
+from neuronpedia_agent.index import FeatureIndex
+
+
+def _feature(layer, feature, ctx_idx=0, influence=0.5, node_id=None):
+    return {'node_id': node_id or f'{layer}_{feature}_{ctx_idx}', 'layer': str(layer), 'feature': feature,
+            'ctx_idx': ctx_idx, 'feature_type': 'cross layer transcoder', 'influence': influence,
+            'activation': 1.0}
+
+
+def _write_graph(path, features, model='gemma-2-2b'):
+    nodes = [{'node_id': 'E_1_0', 'layer': 'E', 'feature': 1, 'ctx_idx': 0, 'feature_type': 'embedding'},
+             {'node_id': '27_9_0', 'layer': '27', 'feature': 9, 'ctx_idx': 0, 'feature_type': 'logit'}]
+    graph = {'metadata': {'scan': model, 'slug': path.stem, 'prompt': 'p'},
+             'nodes': nodes + features, 'links': []}
+    path.write_text(json.dumps(graph))
+    return path
+
+
+@pytest.fixture()
+def index(tmp_path):
+    index = FeatureIndex(tmp_path / 'index.sqlite')
+    yield index
+    index.close()
+
+
+def test_only_features_are_indexed(tmp_path, index):
+    path = _write_graph(tmp_path / 'a.json', [_feature(3, 10), _feature(3, 10, ctx_idx=2, influence=0.25)])
+    assert index.add_graph(path, cache=False) == 2
+
+    postings = index.postings(3, 10)
+    assert [(p.ctx_idx, p.influence, p.model) for p in postings] == [(0, 0.5, 'gemma-2-2b'), (2, 0.25, 'gemma-2-2b')]
+    assert index.postings(27, 9) == [] and index.postings(-1, 1) == []
+    assert index.stats() == {'graphs': 1, 'postings': 2, 'features': 1}
+
+
+def test_update_skips_unchanged_and_replaces_changed(tmp_path, index):
+    a = _write_graph(tmp_path / 'a.json', [_feature(3, 10), _feature(4, 11)])
+    b = _write_graph(tmp_path / 'b.json', [_feature(3, 10)])
+    assert index.update([a, b]) == {'indexed': 2, 'skipped': 0, 'failed': 0}
+    assert index.update([a, b]) == {'indexed': 0, 'skipped': 2, 'failed': 0}
+
+    # a no longer has feature 4/11; its old postings must go
+    _write_graph(a, [_feature(3, 10), _feature(5, 12)])
+    os.utime(a, ns=(os.stat(a).st_atime_ns, os.stat(a).st_mtime_ns + 10 ** 9))
+    assert not index.is_current(a)
+    assert index.update([a, b]) == {'indexed': 1, 'skipped': 1, 'failed': 0}
+    assert index.postings(4, 11) == []
+    assert [p.graph for p in index.postings(5, 12)] == [str(a.resolve())]
+    assert len(index) == 2 and len(index.postings(3, 10)) == 2
+
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{"nodes": [')
+    errors = []
+    counts = index.update([broken], on_graph=lambda path, error: errors.append(error))
+    assert counts['failed'] == 1 and errors[0] is not None
+
+    assert index.remove(a) and not index.remove(a)
+    assert index.postings(5, 12) == []
+
+
+def test_repeated_feature_position_keeps_first(tmp_path, index):
+    # Distinct node ids at the same (layer, feature, ctx_idx)
+    path = _write_graph(tmp_path / 'a.json', [_feature(3, 10, influence=0.5, node_id='x'),
+                                             _feature(3, 10, influence=0.9, node_id='y')])
+    index.add_graph(path, cache=False)
+    assert [p.influence for p in index.postings(3, 10)] == [0.5]
+
+
+def test_graphs_sharing(tmp_path, index):
+    a = _write_graph(tmp_path / 'a.json', [_feature(3, 10, influence=0.5), _feature(4, 11), _feature(5, 12)])
+    b = _write_graph(tmp_path / 'b.json', [_feature(3, 10, influence=0.5), _feature(3, 10, ctx_idx=1),
+                                           _feature(4, 11)])
+    c = _write_graph(tmp_path / 'c.json', [_feature(3, 10)])
+    other = _write_graph(tmp_path / 'other.json', [_feature(3, 10), _feature(4, 11), _feature(5, 12)], model='gpt2')
+    index.update([a, b, c, other])
+    name = {str(p.resolve()): p.stem for p in (a, b, c, other)}
+
+    query = [(3, 10), (4, 11), (5, 12)]
+    assert [name[m.graph] for m in index.graphs_sharing(query, model='gemma-2-2b')] == ['a']
+    matches = index.graphs_sharing(query, model='gemma-2-2b', min_shared=2)
+    assert [(name[m.graph], m.shared) for m in matches] == [('a', 3), ('b', 2)]
+    # Influence sums every matching node, including 3/10 at both of b's positions
+    assert [m.influence for m in matches] == [pytest.approx(1.5), pytest.approx(1.5)]
+    assert [name[m.graph] for m in index.graphs_sharing(query, min_shared=3)] == ['a', 'other']
+
+    # Keys naming their own model override the default; an unknown model matches nothing
+    mixed = [('gpt2', 5, 12), (3, 10)]
+    matches = index.graphs_sharing(mixed, model='gemma-2-2b', min_shared=1)
+    # Ties on shared features break on influence (b has 3/10 twice), then path
+    assert [name[m.graph] for m in matches] == ['b', 'a', 'c', 'other']
+    assert matches[-1].features == [(5, 12)]
+    assert [name[m.graph] for m in index.graphs_sharing(mixed, model='gemma-2-2b')] == []
+    assert index.graphs_sharing([('unknown', 3, 10)]) == []
+    assert len(index.graphs_sharing(query, min_shared=1, limit=2)) == 2
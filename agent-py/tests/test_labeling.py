@@ -0,0 +1,163 @@
+"""AutoLabeler against a local stub of the messages endpoint: retries, concurrency and rate limits"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from neuronpedia_agent.analysis.grouping_engine import Supernode
+from neuronpedia_agent.labeling import AutoLabeler, RateLimiter, TokenBucket
+
+MESSAGE = {
+    'id': 'msg_1', 'type': 'message', 'role': 'assistant', 'model': 'stub',
+    'content': [{'type': 'text', 'text': 'Texas detection'}],
+    'stop_reason': 'end_turn', 'stop_sequence': None,
+    'usage': {'input_tokens': 10, 'output_tokens': 3},
+}
+
+
+class StubServer:
+    """
+    Answers POST /v1/messages from a script of status codes (200 once the script runs out)
+
+    Records the number of requests received and the peak number in flight at once.
+    """
+
+    def __init__(self, script=(), delay=0.0, retry_after=None):
+        self.script = list(script)
+        self.delay = delay
+        self.retry_after = retry_after
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('content-length', 0)))
+                with stub.lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                    status = stub.script.pop(0) if stub.script else 200
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+
+                body = json.dumps(MESSAGE if status == 200 else
+                                  {'type': 'error', 'error': {'type': 'api_error', 'message': 'stub'}}).encode()
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(body)))
+                if status == 429 and stub.retry_after is not None:
+                    self.send_header('retry-after', str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _supernodes(count):
+    return [Supernode(label='', node_ids=[f'{i}_1_0'], layer_range=(i, i),
+                      functional_role='input_detector', total_influence=1.0) for i in range(count)]
+
+
+def _labeler(server, **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_max', 0.05)
+    return AutoLabeler(api_key='test', model='stub', base_url=server.url, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def _no_api_key(monkeypatch):
+    monkeypatch.delenv('ANTHROPIC_API_KEY', raising=False)
+    monkeypatch.delenv('ANTHROPIC_AUTH_TOKEN', raising=False)
+
+
+def test_retries_429_and_5xx():
+    with StubServer(script=[429, 500, 503]) as server:
+        labeler = _labeler(server, max_retries=3, max_concurrency=1)
+        labels = labeler.generate_labels(_supernodes(1), {})
+    assert labels == ['Texas detection']
+    assert server.requests == 4
+    assert labeler.usage['retries'] == 3
+    assert labeler.usage['failures'] == 0
+    assert labeler.usage['input_tokens'] == 10
+
+
+def test_fallback_after_retries_exhausted():
+    with StubServer(script=[500] * 3) as server:
+        labeler = _labeler(server, max_retries=2, max_concurrency=1)
+        labels = labeler.generate_labels(_supernodes(1), {})
+    assert labels == ['input_detector (layers 0-0)']
+    assert server.requests == 3
+    assert labeler.usage['failures'] == 1
+
+
+def test_client_errors_are_not_retried():
+    with StubServer(script=[400]) as server:
+        labeler = _labeler(server, max_retries=3)
+        labeler.generate_labels(_supernodes(1), {})
+    assert server.requests == 1
+    assert labeler.usage['retries'] == 0
+
+
+def test_retry_after_is_honored():
+    with StubServer(script=[429], retry_after=0.5) as server:
+        labeler = _labeler(server, max_retries=1)
+        start = time.monotonic()
+        labeler.generate_labels(_supernodes(1), {})
+        elapsed = time.monotonic() - start
+    assert elapsed >= 0.5
+    assert labeler.usage['retries'] == 1
+
+
+def test_max_concurrency():
+    with StubServer(delay=0.05) as server:
+        labeler = _labeler(server, max_concurrency=3)
+        labels = labeler.generate_labels(_supernodes(12), {})
+    assert labels == ['Texas detection'] * 12
+    assert server.requests == 12
+    assert 1 < server.peak_in_flight <= 3
+
+
+def test_requests_per_minute():
+    # 600 rpm: a burst of 600 goes straight through, then one request every 0.1 s
+    limiter = RateLimiter(requests_per_minute=600)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(600 + 5):
+            await limiter.acquire(0)
+        return time.monotonic() - start
+
+    assert 0.4 <= asyncio.run(run()) < 1.5
+
+
+def test_token_bucket_settle():
+    bucket = TokenBucket(rate=100.0, capacity=100.0)
+
+    async def run():
+        await bucket.acquire(100)
+        bucket.adjust(60)  # the request used 40 of the 100 estimated
+        start = time.monotonic()
+        await bucket.acquire(60)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.1
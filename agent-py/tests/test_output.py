@@ -0,0 +1,103 @@
+"""Cleaned-graph writer: how original_graph is stored and read back"""
+
+import gzip
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from neuronpedia_agent.benchmark import synthetic_graph
+from neuronpedia_agent.storage import (
+    as_graph, load_graph, read_cleaned_output, stream_graph, write_cleaned_graph, write_graph_json
+)
+
+EXAMPLE_GRAPH = Path(__file__).resolve().parents[2] / 'graph-analysis' / 'example1' / 'graph_data.json'
+
+OUTPUT = {'pinned_node_ids': ['1_5_0'], 'supernodes': [['A', '1_5_0']]}
+
+
+@pytest.fixture()
+def source(tmp_path):
+    # Fields GraphArrays does not keep and a repeated id, which only a byte copy preserves
+    graph = {'metadata': {'slug': 'test'}, 'nodes': [
+        {'node_id': '1_5_0', 'jsNodeId': '1_5-0', 'layer': '1', 'feature': 5, 'ctx_idx': 0, 'run_idx': 0},
+        {'node_id': '2_6_0', 'jsNodeId': '2_6-0', 'layer': '2', 'feature': 6, 'ctx_idx': 0, 'run_idx': 0},
+        {'node_id': '1_5_0', 'jsNodeId': '1_5-0', 'layer': '1', 'feature': 5, 'ctx_idx': 0, 'run_idx': 1},
+    ], 'links': [{'source': '1_5_0', 'target': '2_6_0', 'weight': 0.5}]}
+    path = tmp_path / 'graph.json.gz'
+    path.write_bytes(gzip.compress(json.dumps(graph, indent=1).encode()))
+    return path, graph
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_embed_copies_the_source(source, tmp_path, compression):
+    path, graph = source
+    output = write_cleaned_graph(OUTPUT, tmp_path / 'cleaned.json', graph=load_graph(path), source=path,
+                                 original='embed', compression=compression)
+    with open(output, 'rb') as f:
+        data = f.read()
+    document = json.loads(gzip.decompress(data) if compression else data)
+    assert document['original_graph'] == graph
+    assert document['pinned_node_ids'] == OUTPUT['pinned_node_ids']
+    assert read_cleaned_output(output)['original_graph'] == {'metadata': {'slug': 'test'}}
+    assert load_graph(output).node_ids == ['1_5_0', '2_6_0']
+
+
+def test_embed_of_a_cleaned_output_is_serialized(source, tmp_path):
+    path, _ = source
+    first = write_cleaned_graph(OUTPUT, tmp_path / 'first.json', source=path, original='reference')
+    second = write_cleaned_graph(OUTPUT, tmp_path / 'second.json', graph=load_graph(first), source=first,
+                                 original='embed')
+    embedded = json.loads(second.read_text())['original_graph']
+    assert [node['node_id'] for node in embedded['nodes']] == ['1_5_0', '2_6_0']
+    assert 'original_graph' not in embedded
+
+
+def test_embed_without_source_serializes_the_graph(tmp_path):
+    graph = synthetic_graph(num_nodes=50, num_edges=200, seed=5)
+    output = write_cleaned_graph(OUTPUT, tmp_path / 'cleaned.json', graph=graph, original='embed')
+    loaded = load_graph(output)
+    assert loaded.node_ids == graph.node_ids
+    assert loaded.num_links == graph.num_links
+
+
+@pytest.mark.skipif(not EXAMPLE_GRAPH.exists(), reason='example graph not present')
+def test_embed_example_graph_is_lossless(tmp_path):
+    output = write_cleaned_graph(OUTPUT, tmp_path / 'cleaned.json.gz', graph=load_graph(EXAMPLE_GRAPH),
+                                 source=EXAMPLE_GRAPH, original='embed')
+    with gzip.open(output) as f:
+        embedded = json.load(f)['original_graph']
+    assert embedded == json.loads(EXAMPLE_GRAPH.read_bytes())
+
+
+def test_write_graph_json_keeps_only_graph_arrays_fields(source):
+    _, graph = source
+    graph['links'].append({'source': '2_6_0', 'target': '1_5_0', 'weight': float('nan')})
+    graph['links'].append({'source': '1_5_0', 'target': '1_5_0', 'weight': float('-inf')})
+    buffer = io.StringIO()
+    write_graph_json(as_graph(graph), buffer)
+    written = json.loads(buffer.getvalue())
+
+    assert written['metadata'] == graph['metadata']
+    # One entry per id, the last one's fields, without the fields GraphArrays drops
+    assert [node['node_id'] for node in written['nodes']] == ['1_5_0', '2_6_0']
+    assert all('jsNodeId' not in node and 'run_idx' not in node for node in written['nodes'])
+    # Strict JSON: non-finite weights become null
+    assert [link['weight'] for link in written['links']] == [0.5, None, None]
+    json.loads(buffer.getvalue(), parse_constant=pytest.fail)
+
+    reread = stream_graph(io.BytesIO(buffer.getvalue().encode()))
+    assert reread.node_ids == ['1_5_0', '2_6_0']
+    assert reread.link_weight.tolist() == [0.5, 0.0, 0.0]
+
+
+def test_write_graph_json_agent_schema():
+    graph = as_graph({'nodes': [{'id': '3_1_0', 'layer': 3, 'feature_index': 1, 'explanation': 'x'},
+                                {'id': '4_2_0', 'layer': 4, 'feature_index': 2}],
+                      'edges': [{'source': '3_1_0', 'target': '4_2_0', 'weight': 1e-30}]})
+    buffer = io.StringIO()
+    write_graph_json(graph, buffer)
+    written = json.loads(buffer.getvalue())
+    assert [node['id'] for node in written['nodes']] == ['3_1_0', '4_2_0']
+    assert written['edges'] == [{'source': '3_1_0', 'target': '4_2_0', 'weight': pytest.approx(1e-30)}]
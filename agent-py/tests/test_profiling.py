@@ -0,0 +1,104 @@
+"""Profiling spans: nesting, self time, token attribution and the Chrome trace"""
+
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from neuronpedia_agent.utils import add_tokens, profile, profiled, span
+from neuronpedia_agent.utils import profiling
+
+
+@profiled('work')
+def _work(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_spans_are_no_ops_without_a_profiler():
+    assert profiling.active_profiler() is None
+    assert span('a') is span('b', size=1)
+    with span('a') as opened:
+        assert opened is None
+    add_tokens(10, 5)
+    assert _work(0) == 0
+    with profile(enabled=False) as profiler:
+        assert profiler is None and profiling.active_profiler() is None
+
+
+def test_summary_paths_and_self_time():
+    with profile(memory=False) as profiler:
+        with span('run', graph='g'):
+            time.sleep(0.02)
+            with span('load'):
+                time.sleep(0.03)
+            _work(0.01)
+            _work(0.01)
+            add_tokens(100, 20)
+        with span('load'):
+            pass
+    assert profiling.active_profiler() is None
+
+    rows = {tuple(row['path']): row for row in profiler.summary()}
+    assert [tuple(row['path']) for row in profiler.summary()] == [('run',), ('run', 'load'), ('run', 'work'), ('load',)]
+    run, work = rows[('run',)], rows[('run', 'work')]
+    assert work['calls'] == 2 and work['depth'] == 1
+    assert run['seconds'] >= 0.07
+    # Self time is the span's wall time minus its direct children's
+    children = rows[('run', 'load')]['seconds'] + work['seconds']
+    assert run['self_seconds'] == pytest.approx(run['seconds'] - children)
+    assert run['self_seconds'] >= 0.02
+    assert work['self_seconds'] == pytest.approx(work['seconds'])
+    # Tokens go to every span open at the time
+    assert (run['input_tokens'], run['output_tokens']) == (100, 20)
+    assert rows[('run', 'load')]['input_tokens'] == 0
+    assert 'run' in profiler.format_summary()
+
+
+def test_threads_get_their_own_stacks():
+    with profile(memory=False) as profiler:
+        with span('main'):
+            worker = threading.Thread(target=_work, args=(0.01,))
+            worker.start()
+            worker.join()
+    # The worker's span does not nest under the main thread's open span
+    assert sorted(tuple(row['path']) for row in profiler.summary()) == [('main',), ('work',)]
+    main = next(row for row in profiler.summary() if row['name'] == 'main')
+    assert main['self_seconds'] == pytest.approx(main['seconds'])
+
+
+def test_peak_memory():
+    with profile() as profiler:
+        with span('outer'):
+            with span('inner'):
+                buffer = np.ones(1 << 20)  # 8 MiB
+                del buffer
+            small = np.ones(10)
+            del small
+    rows = {row['name']: row for row in profiler.summary()}
+    assert rows['inner']['peak_bytes'] >= 8 << 20
+    assert rows['outer']['peak_bytes'] >= rows['inner']['peak_bytes']
+
+
+def test_chrome_trace(tmp_path):
+    with profile(memory=False) as profiler:
+        with span('analysis.run', graph='g'):
+            _work(0.01)
+            add_tokens(3, 4)
+    trace = json.loads(profiler.write_trace(tmp_path / 'trace.json').read_text())
+    assert trace == json.loads(json.dumps(profiler.chrome_trace()))
+
+    meta, *events = trace['traceEvents']
+    assert meta['ph'] == 'M'
+    assert [(e['name'], e['cat'], e['ph']) for e in events] == [('analysis.run', 'analysis', 'X'),
+                                                               ('work', 'work', 'X')]
+    outer, inner = events
+    # Microseconds; the child lies within its parent
+    assert outer['dur'] >= 1e4
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert outer['args']['graph'] == 'g'
+    assert (outer['args']['input_tokens'], outer['args']['output_tokens']) == (3, 4)
+    assert 'input_tokens' not in inner['args'] and 'peak_mb' not in inner['args']
+    assert inner['args']['cpu_ms'] >= 0
@@ -0,0 +1,116 @@
+"""MinHash signatures, LSH bands and the similarity index query / rerank path"""
+
+import numpy as np
+import pytest
+
+from neuronpedia_agent.benchmark import synthetic_graph
+from neuronpedia_agent.index import SimilarityIndex, minhash
+from neuronpedia_agent.index.similarity import _mix, band_hashes, graph_shingles, overlap
+from neuronpedia_agent.storage import write_graph_json
+
+NUM_PERM = 1024
+
+
+def _random_sets(rng, trial):
+    universe = _mix(np.arange(400, dtype=np.uint64) + np.uint64(1000 * trial))
+    a = np.sort(rng.choice(universe, 200, replace=False))
+    shared = rng.choice(a, int(rng.integers(20, 180)), replace=False)
+    b = np.sort(np.concatenate([shared, rng.choice(np.setdiff1d(universe, a), 50, replace=False)]))
+    weights_a, weights_b = rng.exponential(size=len(a)), rng.exponential(size=len(b))
+    return a, weights_a / weights_a.sum(), b, weights_b / weights_b.sum()
+
+
+def _probability_jaccard(a, weights_a, b, weights_b):
+    """The similarity P-MinHash agreement estimates (Moulton & Jiang)"""
+    tokens = np.union1d(a, b)
+    x = np.zeros(len(tokens))
+    y = np.zeros(len(tokens))
+    x[np.searchsorted(tokens, a)] = weights_a
+    y[np.searchsorted(tokens, b)] = weights_b
+    both = (x > 0) & (y > 0)
+    return sum(1.0 / np.maximum(x / x[i], y / y[i]).sum() for i in np.flatnonzero(both))
+
+
+def test_signature_agreement_tracks_exact_similarity():
+    rng = np.random.default_rng(0)
+    tolerance = 4 * np.sqrt(0.25 / NUM_PERM)
+    estimates, weighted = [], []
+    for trial in range(8):
+        a, weights_a, b, weights_b = _random_sets(rng, trial)
+        estimate = np.mean(minhash(a, weights_a, NUM_PERM) == minhash(b, weights_b, NUM_PERM))
+        exact = overlap(a, weights_a, b, weights_b, 'weighted')
+        assert estimate == pytest.approx(_probability_jaccard(a, weights_a, b, weights_b), abs=tolerance)
+        # Probability-Jaccard bounds weighted Jaccard from above, and stays close on these sets
+        assert exact - tolerance <= estimate <= exact + 0.1
+        estimates.append(estimate)
+        weighted.append(exact)
+
+        # Equal weights: ordinary MinHash of the plain Jaccard similarity
+        unweighted = np.mean(minhash(a, np.ones(len(a)), NUM_PERM) == minhash(b, np.ones(len(b)), NUM_PERM))
+        assert unweighted == pytest.approx(overlap(a, weights_a, b, weights_b, 'jaccard'), abs=tolerance)
+    assert np.corrcoef(estimates, weighted)[0, 1] > 0.95
+
+
+def test_signature_edge_cases():
+    tokens = _mix(np.arange(10, dtype=np.uint64))
+    assert not minhash(tokens[:0], np.zeros(0)).any()
+    # Zero-weight tokens never win a slot
+    weights = np.r_[np.zeros(5), np.ones(5)]
+    assert set(minhash(tokens, weights).tolist()) <= set(tokens[5:].tolist())
+
+    signature = minhash(tokens, np.ones(10))
+    other = signature.copy()
+    other[:4] += np.uint64(1)  # differs only in the first band
+    assert (band_hashes(signature)[1:] == band_hashes(other)[1:]).all()
+    assert band_hashes(signature)[0] != band_hashes(other)[0]
+    assert overlap(tokens, np.ones(10), tokens[:5], np.ones(5), 'jaccard') == 0.5
+    assert overlap(tokens, np.full(10, 0.1), tokens[:5], np.full(5, 0.2), 'weighted') == pytest.approx(0.5 / 1.5)
+
+
+@pytest.fixture()
+def corpus(tmp_path):
+    base = synthetic_graph(num_nodes=300, num_edges=3000, seed=1)
+    # A near duplicate (a tenth of the links dropped) and an unrelated graph
+    keep = np.random.default_rng(1).random(base.num_links) > 0.1
+    graphs = {'base': base, 'near': base.subset(np.ones(base.num_nodes, dtype=bool), keep),
+              'other': synthetic_graph(num_nodes=300, num_edges=3000, seed=2)}
+    paths = {}
+    for name, graph in graphs.items():
+        paths[name] = tmp_path / f'{name}.json'
+        with open(paths[name], 'w') as f:
+            write_graph_json(graph, f)
+    index = SimilarityIndex(tmp_path / 'similarity.sqlite')
+    assert index.update(paths.values(), cache=False) == {'indexed': 3, 'skipped': 0, 'failed': 0}
+    yield index, paths, graphs
+    index.close()
+
+
+def test_query_and_rerank(corpus):
+    index, paths, graphs = corpus
+    names = {str(path.resolve()): name for name, path in paths.items()}
+
+    estimated = index.query(paths['base'], rerank=None, cache=False)
+    # The query file itself is excluded; the near duplicate ranks first
+    assert [names[r.graph] for r in estimated][:1] == ['near']
+    assert 'base' not in [names[r.graph] for r in estimated]
+    assert not any(r.exact for r in estimated)
+    near = estimated[0]
+    assert near.score == near.estimate and near.band_matches > 0
+
+    reranked = index.query(paths['base'], rerank='weighted', cache=False)
+    assert reranked[0].graph == near.graph and reranked[0].exact
+    tokens = [graph_shingles(graphs[name]) for name in ('base', 'near')]
+    assert reranked[0].feature_similarity == pytest.approx(overlap(*tokens[0][:2], *tokens[1][:2]), rel=1e-6)
+    assert reranked[0].edge_similarity == pytest.approx(overlap(*tokens[0][2:], *tokens[1][2:]))
+    assert reranked[0].score == pytest.approx((reranked[0].feature_similarity + reranked[0].edge_similarity) / 2)
+    assert reranked[0].edge_similarity == pytest.approx(near.edge_similarity, abs=0.15)
+
+    # Loaded arrays are not excluded: the graph finds itself first
+    itself = index.query(graphs['base'], rerank='jaccard', cache=False)
+    assert names[itself[0].graph] == 'base' and itself[0].score == pytest.approx(1.0)
+
+    assert index.update(paths.values(), cache=False)['skipped'] == 3
+    assert index.remove(paths['near'])
+    assert 'near' not in [names[r.graph] for r in index.query(paths['base'], cache=False)]
+    with pytest.raises(ValueError):
+        index.query(paths['base'], rerank='cosine')
@@ -0,0 +1,86 @@
+"""Pure-Python JSON tokenizer: events must not depend on where chunk boundaries fall"""
+
+import io
+import json
+import math
+from pathlib import Path
+
+import pytest
+
+from neuronpedia_agent.benchmark import synthetic_graph
+from neuronpedia_agent.storage import write_graph_json
+from neuronpedia_agent.storage.stream import _basic_parse, _build_value, stream_graph
+
+EXAMPLE_GRAPH = Path(__file__).resolve().parents[2] / 'graph-analysis' / 'example1' / 'graph_data.json'
+
+
+def _parse(data: bytes, chunk_size: int):
+    events = _basic_parse(io.BytesIO(data), chunk_size)
+    return _build_value(events, *next(events))
+
+
+@pytest.mark.parametrize('text', [
+    '{"a": 12.5}',
+    '{"a": -0.125e-7, "b": [1E+30, 3, -4.0e2], "c": true, "d": null}',
+    '[NaN, Infinity, -Infinity, 1.0, "x\\"y", {"k": false}]',
+])
+def test_every_chunk_boundary(text):
+    data = text.encode()
+    expected = json.loads(text)
+    for chunk_size in range(1, len(data) + 1):
+        assert json.dumps(_parse(data, chunk_size)) == json.dumps(expected), chunk_size
+
+
+def test_graph_at_many_chunk_sizes():
+    graph = synthetic_graph(num_nodes=200, num_edges=2000, seed=1)
+    buffer = io.StringIO()
+    write_graph_json(graph, buffer)
+    data = buffer.getvalue().encode()
+    expected = json.loads(data)
+
+    for chunk_size in list(range(1, 64)) + list(range(4096, 4296, 7)) + [65536]:
+        assert _parse(data, chunk_size) == expected, chunk_size
+
+
+@pytest.mark.skipif(not EXAMPLE_GRAPH.exists(), reason='example graph not present')
+def test_example_graph_chunk_sizes(monkeypatch):
+    import neuronpedia_agent.storage.stream as stream
+
+    monkeypatch.setattr(stream, 'ijson', None)
+    data = EXAMPLE_GRAPH.read_bytes()
+    expected = json.loads(data)
+    for chunk_size in (4096, 4113, 4200, 4295, 65536):
+        monkeypatch.setattr(stream, 'CHUNK_SIZE', chunk_size)
+        monkeypatch.setattr(stream, 'iter_events',
+                            lambda f, size=chunk_size: _basic_parse(f, size))
+        graph = stream_graph(io.BytesIO(data))
+        assert graph.num_links == len(expected['links'])
+        weights = [link['weight'] for link in expected['links']]
+        assert all(math.isclose(a, b, rel_tol=1e-6) for a, b in zip(graph.link_weight.tolist(), weights))
+
+
+def test_repeated_node_id_last_entry_wins(tmp_path):
+    graph = {'nodes': [
+        {'node_id': '1_5_0', 'layer': '1', 'feature': 5, 'ctx_idx': 0, 'influence': 0.1, 'clerp': 'first'},
+        {'node_id': '2_6_0', 'layer': '2', 'feature': 6, 'ctx_idx': 0, 'influence': 0.2},
+        {'node_id': '1_5_0', 'layer': '1', 'feature': 5, 'ctx_idx': 0, 'influence': 0.3},
+    ], 'links': [{'source': '1_5_0', 'target': '2_6_0', 'weight': 1.0}]}
+    loaded = stream_graph(io.BytesIO(json.dumps(graph).encode()))
+
+    assert loaded.node_ids == ['1_5_0', '2_6_0']
+    node = loaded.node(0)
+    assert node['influence'] == pytest.approx(0.3)
+    assert node['clerp'] == ''
+
+
+def test_unregistered_graph_is_not_kept(tmp_path):
+    from neuronpedia_agent.storage import registry
+
+    path = tmp_path / 'graph.json'
+    with open(path, 'w') as f:
+        write_graph_json(synthetic_graph(num_nodes=20, num_edges=50, seed=3), f)
+    registry.clear_graphs()
+    assert registry.get_graph(path, cache=False, register=False) is not registry.get_graph(path, cache=False)
+    shared = registry.get_graph(path, cache=False, register=False)
+    assert shared is registry.get_graph(path, cache=False)
+    registry.clear_graphs()
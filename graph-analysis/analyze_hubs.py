@@ -1,67 +1,52 @@
-import json
-from collections import defaultdict
+import numpy as np
+from graph_loading import get_graph
+
+# Load graph data (memory-mapped columnar cache, rebuilt when the JSON changes)
+data = get_graph('/tmp/neuronpedia_graph_data.json')
+
+# Node degrees (cached on the shared graph)
+out_degree = data.degree('out')
+in_degree = data.degree('in')
+weighted_out = data.degree('out', weighted=True)
+weighted_in = data.degree('in', weighted=True)
+total_degree = in_degree + out_degree
+
+# Find hub nodes (high degree) among nodes that appear in links
+linked = np.flatnonzero(total_degree > 0)
+
+
+def top_nodes(values, k=20):
+    order = np.argsort(-values[linked], kind='stable')[:k]
+    for i in linked[order].tolist():
+        node_info = data.node(i) if data.has_data[i] else {}
+        yield {
+            'node_id': data.node_ids[i],
+            'in_degree': int(in_degree[i]),
+            'out_degree': int(out_degree[i]),
+            'total_degree': int(total_degree[i]),
+            'weighted_in': float(weighted_in[i]),
+            'weighted_out': float(weighted_out[i]),
+            'layer': node_info.get('layer', 'unknown'),
+            'ctx_idx': node_info.get('ctx_idx', -1),
+            'influence': node_info.get('influence')
+        }
 
-# Load graph data
-with open('/tmp/neuronpedia_graph_data.json', 'r') as f:
-    data = json.load(f)
-
-# Calculate node degrees
-in_degree = defaultdict(int)
-out_degree = defaultdict(int)
-weighted_in = defaultdict(float)
-weighted_out = defaultdict(float)
-
-for link in data['links']:
-    source = link['source']
-    target = link['target']
-    weight = abs(link['weight'])
-    
-    out_degree[source] += 1
-    in_degree[target] += 1
-    weighted_out[source] += weight
-    weighted_in[target] += weight
-
-# Create node lookup
-nodes_dict = {n['node_id']: n for n in data['nodes']}
-
-# Find hub nodes (high degree)
-all_nodes = set(list(in_degree.keys()) + list(out_degree.keys()))
-node_degrees = []
-for node_id in all_nodes:
-    total_degree = in_degree[node_id] + out_degree[node_id]
-    node_info = nodes_dict.get(node_id, {})
-    node_degrees.append({
-        'node_id': node_id,
-        'in_degree': in_degree[node_id],
-        'out_degree': out_degree[node_id],
-        'total_degree': total_degree,
-        'weighted_in': weighted_in[node_id],
-        'weighted_out': weighted_out[node_id],
-        'layer': node_info.get('layer', 'unknown'),
-        'ctx_idx': node_info.get('ctx_idx', -1),
-        'influence': node_info.get('influence')
-    })
-
-# Sort by total degree
-node_degrees.sort(key=lambda x: x['total_degree'], reverse=True)
 
 print("Top 20 Hub Nodes (by total degree):")
 print("="*80)
-for i, node in enumerate(node_degrees[:20], 1):
+for i, node in enumerate(top_nodes(total_degree), 1):
     print(f"{i}. {node['node_id']:<20} Layer:{node['layer']:<3} Ctx:{node['ctx_idx']} "
           f"In:{node['in_degree']:<4} Out:{node['out_degree']:<4} "
           f"Total:{node['total_degree']:<4} Influence:{node['influence']}")
 
 print("\n\nTop 20 Nodes by Weighted In-degree:")
 print("="*80)
-node_degrees.sort(key=lambda x: x['weighted_in'], reverse=True)
-for i, node in enumerate(node_degrees[:20], 1):
+for i, node in enumerate(top_nodes(weighted_in), 1):
     print(f"{i}. {node['node_id']:<20} Layer:{node['layer']:<3} Ctx:{node['ctx_idx']} "
           f"WeightedIn:{node['weighted_in']:.2f} Influence:{node['influence']}")
 
 print("\n\nTop 20 Nodes by Weighted Out-degree:")
 print("="*80)
-node_degrees.sort(key=lambda x: x['weighted_out'], reverse=True)
-for i, node in enumerate(node_degrees[:20], 1):
+for i, node in enumerate(top_nodes(weighted_out), 1):
     print(f"{i}. {node['node_id']:<20} Layer:{node['layer']:<3} Ctx:{node['ctx_idx']} "
           f"WeightedOut:{node['weighted_out']:.2f} Influence:{node['influence']}")
@@ -1,21 +1,20 @@
-import json
-from collections import defaultdict
-import statistics
+import numpy as np
+from graph_loading import get_graph
 
-# Load graph data
-with open('/tmp/neuronpedia_graph_data.json', 'r') as f:
-    data = json.load(f)
+# Load graph data (memory-mapped columnar cache, rebuilt when the JSON changes)
+data = get_graph('/tmp/neuronpedia_graph_data.json')
 
 print("=" * 100)
 print("CIRCUIT ANALYSIS: DNA Stands for Deoxyribonucleic")
 print("=" * 100)
 
-# Group nodes by layer and context
-layer_ctx_groups = defaultdict(list)
-for node in data['nodes']:
-    if node['feature_type'] not in ['embedding', 'logit']:
-        key = (node['layer'], node['ctx_idx'])
-        layer_ctx_groups[key].append(node)
+# Group nodes by layer and context (cached on the shared graph)
+skipped_types = [data.type_code('embedding'), data.type_code('logit')]
+layer_ctx_groups = {}
+for (_, ctx_idx), rows in data.groups('layer', 'ctx_idx').items():
+    rows = rows[~np.isin(data.feature_type[rows], skipped_types)]
+    if len(rows):
+        layer_ctx_groups[(data.layer_label(rows[0]), ctx_idx)] = rows
 
 # Calculate statistics for each group
 print("\n1. GROUPING FEATURES INTO SUPERNODES")
@@ -23,22 +22,18 @@ print("=" * 100)
 print("\nProposed Supernode Structure (Layer-Context Groups):\n")
 
 supernode_summary = []
-for (layer, ctx_idx), nodes in sorted(layer_ctx_groups.items()):
-    influences = [n['influence'] for n in nodes if n.get('influence') is not None]
-    activations = [n['activation'] for n in nodes if n.get('activation') is not None]
+for (layer, ctx_idx), rows in sorted(layer_ctx_groups.items()):
+    influences = data.influence[rows][~np.isnan(data.influence[rows])].astype(np.float64)
+    activations = data.activation[rows][~np.isnan(data.activation[rows])].astype(np.float64)
     
-    if influences and activations:
-        avg_influence = statistics.mean(influences)
-        avg_activation = statistics.mean(activations)
-        max_influence = max(influences)
-        
+    if len(influences) and len(activations):
         supernode_summary.append({
             'layer': layer,
             'ctx_idx': ctx_idx,
-            'count': len(nodes),
-            'avg_influence': avg_influence,
-            'max_influence': max_influence,
-            'avg_activation': avg_activation
+            'count': len(rows),
+            'avg_influence': influences.mean(),
+            'max_influence': influences.max(),
+            'avg_activation': activations.mean()
         })
 
 # Print supernodes by layer
@@ -57,30 +52,25 @@ for sn in sorted(supernode_summary, key=lambda x: (int(x['layer']), x['ctx_idx']
 print("\n\n2. MAIN INFORMATION FLOWS (Input → Output)")
 print("=" * 100)
 
-# Track connections between layer groups
-layer_transitions = defaultdict(lambda: {'count': 0, 'total_weight': 0, 'max_weight': 0})
-
-for link in data['links']:
-    source = link['source']
-    target = link['target']
-    weight = abs(link['weight'])
-    
-    # Get layer info
-    if source.startswith('E_'):
-        src_layer = 'E'
-    else:
-        src_layer = source.split('_')[0]
-    
-    if target == '27_6898_6':
-        tgt_layer = '27'
-    else:
-        tgt_layer = target.split('_')[0]
-    
-    if src_layer != tgt_layer:
-        key = (src_layer, tgt_layer)
-        layer_transitions[key]['count'] += 1
-        layer_transitions[key]['total_weight'] += weight
-        layer_transitions[key]['max_weight'] = max(layer_transitions[key]['max_weight'], weight)
+# Track connections between layer groups, using the layer prefix of each node id
+# ('E' for embeddings), aggregated per (source layer, target layer) pair
+layer_names, node_layer = np.unique([node_id.split('_')[0] for node_id in data.node_ids], return_inverse=True)
+weights = np.abs(data.link_weight.astype(np.float64))
+src_layer = node_layer[data.link_source]
+tgt_layer = node_layer[data.link_target]
+crossing = src_layer != tgt_layer
+pair = src_layer[crossing] * len(layer_names) + tgt_layer[crossing]
+pairs, first_seen, pair_index = np.unique(pair, return_index=True, return_inverse=True)
+pair_count = np.bincount(pair_index, minlength=len(pairs))
+pair_weight = np.bincount(pair_index, weights=weights[crossing], minlength=len(pairs))
+pair_max = np.zeros(len(pairs))
+np.maximum.at(pair_max, pair_index, weights[crossing])
+
+layer_transitions = {
+    (layer_names[p // len(layer_names)], layer_names[p % len(layer_names)]):
+        {'count': int(pair_count[k]), 'total_weight': float(pair_weight[k]), 'max_weight': float(pair_max[k])}
+    for k, p in zip(np.argsort(first_seen).tolist(), pairs[np.argsort(first_seen)].tolist())
+}
 
 # Sort by total weight
 sorted_transitions = sorted(layer_transitions.items(), 
@@ -100,20 +90,20 @@ for (src, tgt), stats in sorted_transitions:
 print("\n\n3. CONTEXT POSITION FLOW (Token-level processing)")
 print("=" * 100)
 
-ctx_flow = defaultdict(lambda: {'count': 0, 'total_weight': 0})
-nodes_dict = {n['node_id']: n for n in data['nodes']}
-
-for link in data['links']:
-    source_node = nodes_dict.get(link['source'])
-    target_node = nodes_dict.get(link['target'])
-    
-    if source_node and target_node:
-        src_ctx = source_node.get('ctx_idx', -1)
-        tgt_ctx = target_node.get('ctx_idx', -1)
-        if src_ctx != -1 and tgt_ctx != -1:
-            key = (src_ctx, tgt_ctx)
-            ctx_flow[key]['count'] += 1
-            ctx_flow[key]['total_weight'] += abs(link['weight'])
+# Links between nodes with data, both at a known context position
+src_ctx = data.ctx_idx[data.link_source].astype(np.int64)
+tgt_ctx = data.ctx_idx[data.link_target].astype(np.int64)
+known = (data.has_data[data.link_source] & data.has_data[data.link_target] & (src_ctx != -1) & (tgt_ctx != -1))
+num_ctx = int(max(src_ctx.max(initial=0), tgt_ctx.max(initial=0))) + 1
+pair = src_ctx[known] * num_ctx + tgt_ctx[known]
+pairs, first_seen, pair_index = np.unique(pair, return_index=True, return_inverse=True)
+pair_count = np.bincount(pair_index, minlength=len(pairs))
+pair_weight = np.bincount(pair_index, weights=weights[known], minlength=len(pairs))
+
+ctx_flow = {
+    (p // num_ctx, p % num_ctx): {'count': int(pair_count[k]), 'total_weight': float(pair_weight[k])}
+    for k, p in zip(np.argsort(first_seen).tolist(), pairs[np.argsort(first_seen)].tolist())
+}
 
 print("\nToken-to-Token Flow (by edge count):\n")
 for (src, tgt), stats in sorted(ctx_flow.items(), key=lambda x: x[1]['count'], reverse=True)[:20]:
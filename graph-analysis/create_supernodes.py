@@ -10,21 +10,26 @@ Usage:
     python create_supernodes.py <graph_data.json> [--send]
 
 Arguments:
-    graph_data.json    Path to downloaded Neuronpedia graph JSON
+    graph_data.json    Path to downloaded Neuronpedia graph JSON (may be .gz / .zst compressed)
     --send            Optional: Send configuration to API (requires valid key)
 """
 
 import json
 import sys
-import requests
 from collections import defaultdict
 from typing import Dict, List, Tuple, Any
+import numpy as np
+from graph_loading import GraphArrays, NeuronpediaClient, get_graph, nodes_by_layer_ctx
 
 
-def load_graph_data(filepath: str) -> dict:
-    """Load graph data from JSON file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+def load_graph_data(filepath: str) -> GraphArrays:
+    """
+    Stream graph data from a JSON file (plain, gzip or zstd) into compact arrays.
+
+    The result keeps dict-style access (data['nodes'], data['links'], data.get('metadata'))
+    and is shared by every caller in the process.
+    """
+    return get_graph(filepath)
 
 
 def calculate_supernode_stats(nodes: List[dict]) -> Tuple[float, float]:
@@ -38,22 +43,16 @@ def calculate_supernode_stats(nodes: List[dict]) -> Tuple[float, float]:
     return avg_influence, avg_activation
 
 
-def group_nodes_by_layer_context(graph_data: dict) -> Dict[Tuple[str, int], List[dict]]:
+def group_nodes_by_layer_context(graph_data: GraphArrays) -> Dict[Tuple[str, int], List[dict]]:
     """
     Group nodes by (layer, context_position) pairs.
 
+    Only transcoder features are grouped (not embeddings or logits).
+
     Returns:
         Dictionary mapping (layer, ctx_idx) -> list of nodes
     """
-    grouped = defaultdict(list)
-
-    for node in graph_data['nodes']:
-        # Only group transcoder features (not embeddings or logits)
-        if node.get('feature_type') == 'cross layer transcoder':
-            key = (str(node['layer']), node['ctx_idx'])
-            grouped[key].append(node)
-
-    return grouped
+    return nodes_by_layer_ctx(graph_data, 'cross layer transcoder')
 
 
 def create_supernode_definitions(grouped_nodes: Dict[Tuple[str, int], List[dict]],
@@ -110,47 +109,39 @@ def create_supernode_definitions(grouped_nodes: Dict[Tuple[str, int], List[dict]
     return supernodes
 
 
-def identify_key_nodes(graph_data: dict) -> Dict[str, List[str]]:
+def identify_key_nodes(graph_data: GraphArrays) -> Dict[str, List[str]]:
     """
     Identify key nodes to pin in the visualization.
 
     Returns:
         Dictionary with 'pinned' list of node IDs
     """
-    nodes = graph_data['nodes']
-
-    # Calculate in-degree
-    in_degree = defaultdict(int)
-    for link in graph_data['links']:
-        in_degree[link['target']] += 1
+    rows = graph_data.node_rows
+    feature_type = graph_data.feature_type[rows]
+    transcoders = rows[feature_type == graph_data.type_code('cross layer transcoder')]
 
     pinned_ids = []
 
     # 1. Highest in-degree hub (integration point)
-    hub_nodes = [(n['node_id'], in_degree[n['node_id']])
-                 for n in nodes if n.get('feature_type') == 'cross layer transcoder']
-    if hub_nodes:
-        top_hub = max(hub_nodes, key=lambda x: x[1])
-        pinned_ids.append(top_hub[0])
+    if len(transcoders):
+        in_degree = graph_data.degree('in')[transcoders]
+        pinned_ids.append(graph_data.node_ids[transcoders[np.argmax(in_degree)]])
 
     # 2. Highest influence in early layer (important feature)
-    early_nodes = [n for n in nodes
-                   if n.get('feature_type') == 'cross layer transcoder'
-                   and n.get('layer') in ['0', '1', '2']
-                   and n.get('influence') is not None]
-    if early_nodes:
-        top_influence = max(early_nodes, key=lambda n: n['influence'])
-        pinned_ids.append(top_influence['node_id'])
+    early = transcoders[(graph_data.layer[transcoders] >= 0) & (graph_data.layer[transcoders] <= 2)
+                        & ~np.isnan(graph_data.influence[transcoders])]
+    if len(early):
+        pinned_ids.append(graph_data.node_ids[early[np.argmax(graph_data.influence[early])]])
 
     # 3. Output logit (target)
-    output_nodes = [n for n in nodes if n.get('feature_type') == 'logit']
-    if output_nodes:
-        pinned_ids.append(output_nodes[0]['node_id'])
+    output_nodes = rows[feature_type == graph_data.type_code('logit')]
+    if len(output_nodes):
+        pinned_ids.append(graph_data.node_ids[output_nodes[0]])
 
     return {"pinned": pinned_ids}
 
 
-def create_subgraph_payload(graph_data: dict, metadata: dict) -> dict:
+def create_subgraph_payload(graph_data: GraphArrays, metadata: dict) -> dict:
     """
     Create complete payload for /api/graph/subgraph/save endpoint.
 
@@ -191,17 +182,8 @@ def send_to_api(payload: dict, api_key: str) -> dict:
     Returns:
         API response as dictionary
     """
-    url = "https://www.neuronpedia.org/api/graph/subgraph/save"
-
-    headers = {
-        "x-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-
-    return response.json()
+    with NeuronpediaClient.from_config(api_key=api_key) as client:
+        return client.save_subgraph(payload)
 
 
 def print_summary(payload: dict, grouped_nodes: Dict):
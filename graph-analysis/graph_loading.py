@@ -0,0 +1,48 @@
+"""
+Shared graph loading for the graph-analysis scripts.
+
+Makes the neuronpedia_agent package in ../agent-py importable and re-exports its
+streaming loader, so every script reads graphs into the same compact arrays
+instead of json.load-ing every node and link dict, and its pooled API client.
+Cleaned outputs from agent-py load as the graph they were built from, whether it is
+embedded, referenced by path and hash, or stored as a columnar sidecar.
+
+get_graph returns one shared GraphArrays per file and process; its cached views
+(degree, adjacency, groups) replace the per-script node_id -> node dictionaries.
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+_AGENT_DIR = Path(__file__).resolve().parent.parent / 'agent-py'
+if str(_AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(_AGENT_DIR))
+
+from neuronpedia_agent.api import NeuronpediaAPIError, NeuronpediaClient  # noqa: E402
+from neuronpedia_agent.storage import (  # noqa: E402
+    EMBEDDING_LAYER, GraphArrays, as_graph, convert_graph, get_graph, load_graph, load_graph_cached, read_cleaned_output,
+    stream_graph
+)
+
+__all__ = [
+    'EMBEDDING_LAYER', 'GraphArrays', 'NeuronpediaAPIError', 'NeuronpediaClient', 'as_graph', 'convert_graph', 'get_graph',
+    'load_graph', 'load_graph_cached', 'nodes_by_layer_ctx', 'read_cleaned_output', 'stream_graph'
+]
+
+
+def nodes_by_layer_ctx(graph: GraphArrays,
+                       feature_type: str = 'cross layer transcoder') -> Dict[Tuple[str, int], List[dict]]:
+    """
+    Node dicts of one feature type keyed by (layer as in the JSON, ctx_idx)
+
+    Built from the graph's cached (layer, ctx_idx) groups; only the selected nodes
+    are materialized as dicts.
+    """
+    code = graph.type_code(feature_type)
+    grouped = {}
+    for (_, ctx_idx), rows in graph.groups('layer', 'ctx_idx').items():
+        rows = rows[graph.feature_type[rows] == code]
+        if len(rows):
+            grouped[(graph.layer_label(rows[0]), ctx_idx)] = [graph.node(i) for i in rows.tolist()]
+    return grouped
@@ -9,34 +9,25 @@ Usage:
     python validate_hypotheses.py <graph_data.json>
 """
 
-import json
 import sys
-from collections import defaultdict
 from typing import Dict, List, Tuple
+import numpy as np
+from graph_loading import GraphArrays, get_graph, nodes_by_layer_ctx
 
 
-def load_graph_data(filepath: str) -> dict:
-    """Load graph data from JSON file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+def load_graph_data(filepath: str) -> GraphArrays:
+    """
+    Stream graph data from a JSON file (plain, gzip or zstd) into compact arrays.
 
-
-def organize_nodes_by_layer_ctx(nodes: List[dict]) -> Dict[Tuple[str, int], List[dict]]:
-    """Organize nodes by (layer, context_position) pairs."""
-    organized = defaultdict(list)
-    for node in nodes:
-        if node['feature_type'] == 'cross layer transcoder':
-            key = (str(node['layer']), node['ctx_idx'])
-            organized[key].append(node)
-    return organized
+    The result keeps dict-style access (data['nodes'], data['links'], data.get('metadata'))
+    and is shared by every caller in the process.
+    """
+    return get_graph(filepath)
 
 
-def calculate_in_degree(links: List[dict]) -> Dict[str, int]:
-    """Calculate in-degree for each node."""
-    in_degree = defaultdict(int)
-    for link in links:
-        in_degree[link['target']] += 1
-    return in_degree
+def organize_nodes_by_layer_ctx(data: GraphArrays) -> Dict[Tuple[str, int], List[dict]]:
+    """Organize transcoder nodes by (layer, context_position) pairs."""
+    return nodes_by_layer_ctx(data, 'cross layer transcoder')
 
 
 def sample_domain_features(nodes_by_layer_ctx: dict, ctx_pos: int,
@@ -51,31 +42,33 @@ def sample_domain_features(nodes_by_layer_ctx: dict, ctx_pos: int,
     return features[:n]
 
 
-def sample_hub_features(nodes_by_layer_ctx: dict, in_degree: dict,
+def sample_hub_features(data: GraphArrays, nodes_by_layer_ctx: dict,
                        layer: str, ctx_pos: int, n: int = 5) -> List[Tuple[dict, int]]:
     """Sample hub nodes with highest in-degree."""
     nodes = nodes_by_layer_ctx.get((layer, ctx_pos), [])
+    in_degree = data.degree('in')
     nodes_with_degree = []
     for node in nodes:
         if node.get('influence') is not None:
-            degree = in_degree[node['node_id']]
+            degree = int(in_degree[data.index[node['node_id']]])
             nodes_with_degree.append((node, degree))
 
     nodes_with_degree.sort(key=lambda x: x[1], reverse=True)
     return nodes_with_degree[:n]
 
 
-def sample_output_features(nodes: List[dict], links: List[dict],
-                           output_node: str, layer: str, ctx_pos: int,
+def sample_output_features(data: GraphArrays, output_node: str, layer: str, ctx_pos: int,
                            n: int = 5) -> List[Tuple[dict, float]]:
     """Sample features with strongest connections to output logit."""
-    output_edges = []
-    for link in links:
-        if link['target'] == output_node:
-            src = next((n for n in nodes if n['node_id'] == link['source']), None)
-            if (src and src.get('layer') == layer and
-                src.get('ctx_idx') == ctx_pos and src.get('influence') is not None):
-                output_edges.append((src, abs(link['weight'])))
+    indptr, link_ids = data.adjacency('in')
+    target = data.index[output_node]
+    # Incoming links of the output node, in file order
+    link_ids = np.sort(link_ids[indptr[target]:indptr[target + 1]])
+    sources = data.link_source[link_ids]
+    keep = (data.has_data[sources] & (data.layer[sources] == int(layer)) &
+            (data.ctx_idx[sources] == ctx_pos) & ~np.isnan(data.influence[sources]))
+    output_edges = [(data.node(src), abs(weight))
+                    for src, weight in zip(sources[keep].tolist(), data.link_weight[link_ids[keep]].tolist())]
 
     output_edges.sort(key=lambda x: x[1], reverse=True)
     return output_edges[:n]
@@ -118,8 +111,7 @@ def main(graph_path: str):
 
     # Load and organize data
     data = load_graph_data(graph_path)
-    nodes_by_layer_ctx = organize_nodes_by_layer_ctx(data['nodes'])
-    in_degree = calculate_in_degree(data['links'])
+    nodes_by_layer_ctx = organize_nodes_by_layer_ctx(data)
 
     # Extract metadata
     metadata = data.get('metadata', {})
@@ -164,7 +156,7 @@ def main(graph_path: str):
     all_features.update(f['feature'] for f in h3_features)
 
     # HYPOTHESIS 4: Integration Hubs
-    h4_features = sample_hub_features(nodes_by_layer_ctx, in_degree, '23', 6, n=5)
+    h4_features = sample_hub_features(data, nodes_by_layer_ctx, '23', 6, n=5)
     print_hypothesis_results(
         "Integration Hub Features",
         h4_features,
@@ -175,9 +167,10 @@ def main(graph_path: str):
 
     # HYPOTHESIS 5: Output Features
     # Try to find output node
-    output_node = next((n['node_id'] for n in data['nodes'] if n.get('feature_type') == 'logit'), None)
+    logits = data.node_rows[data.feature_type[data.node_rows] == data.type_code('logit')]
+    output_node = data.node_ids[logits[0]] if len(logits) else None
     if output_node:
-        h5_features = sample_output_features(data['nodes'], data['links'], output_node, '25', 6, n=5)
+        h5_features = sample_output_features(data, output_node, '25', 6, n=5)
         print_hypothesis_results(
             "Token-Specific Boosting Features",
             h5_features,